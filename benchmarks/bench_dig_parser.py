@@ -0,0 +1,105 @@
+"""
+Micro-benchmark of the `dig` output parser against the previous
+implementation (decode the whole output, strip quotes with regexp, split
+every line). Run from the repository root:
+
+    python benchmarks/bench_dig_parser.py --lines 5000 --repeat 20
+"""
+import argparse
+import asyncio
+import re
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src'))
+
+from dig_parser import DigOutputParser, rdata_content  # noqa: E402
+
+HEADER = (
+    b'\n; <<>> DiG 9.18 <<>> +noall +answer +comments example.com\n'
+    b';; global options: +cmd\n;; Got answer:\n'
+    b';; ->>HEADER<<- opcode: QUERY, status: NOERROR, id: 4242\n'
+    b';; flags: qr rd ra; QUERY: 1, ANSWER: 1, AUTHORITY: 0, ADDITIONAL: 1\n'
+    b'\n;; ANSWER SECTION:\n'
+)
+LINES = (
+    b'example.com.\t\t300\tIN\tTXT\t"v=spf1 include:_spf.example.com '
+    b'ip4:192.0.2.0/24 " "ip6:2001:db8::/32 ~all"\n',
+    b'example.com.\t\t300\tIN\tTXT\t"google-site-verification='
+    b'aBcDeFgHiJkLmNoPqRsTuVwXyZ0123456789abcdefg"\n',
+    b'_sip._tcp.example.com.\t3600\tIN\tSRV\t10 60 5060 sip.example.com.\n',
+    b'example.com.\t\t60\tIN\tA\t192.0.2.1\n',
+)
+
+
+def make_output(lines: int) -> bytes:
+    return HEADER + b''.join(LINES[index % len(LINES)]
+                             for index in range(lines))
+
+
+def legacy_parse(stdout: bytes) -> list:
+    """Previous implementation (without the comment lines it crashed on)."""
+    output = []
+    temp_output = stdout.decode('utf-8')
+    temp_output = re.sub('"', '', temp_output)
+    for result in temp_output.splitlines():
+        if not result or result.startswith(';'):
+            continue
+        query = result.split(maxsplit=4)
+        output.append({'ttl': query[1], 'content': query[4]})
+    return output
+
+
+def parse(stdout: bytes) -> list:
+    parser = DigOutputParser('utf-8')
+    parser.feed_data(stdout)
+    return [{'ttl': str(answer.ttl),
+             'content': rdata_content(answer.rdata)}
+            for answer in parser.answers]
+
+
+def stream_parse(stdout: bytes, chunk_size: int = 4096) -> list:
+    """The parser reading the pipe, data arrives in chunks."""
+    async def run():
+        stream = asyncio.StreamReader()
+        for offset in range(0, len(stdout), chunk_size):
+            stream.feed_data(stdout[offset:offset + chunk_size])
+        stream.feed_eof()
+        parser = await DigOutputParser('utf-8').read(stream)
+        return [{'ttl': str(answer.ttl),
+                 'content': rdata_content(answer.rdata)}
+                for answer in parser.answers]
+    return asyncio.run(run())
+
+
+def peak_memory(func, stdout: bytes) -> int:
+    tracemalloc.start()
+    func(stdout)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    arguments = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    arguments.add_argument('--lines', type=int, default=5000)
+    arguments.add_argument('--repeat', type=int, default=20)
+    options = arguments.parse_args()
+
+    stdout = make_output(options.lines)
+    print(f'{options.lines} answer lines, {len(stdout)} bytes')
+    print(f'{"parser":<10}{"best, ms":>12}{"per line, us":>15}'
+          f'{"peak memory, KiB":>19}')
+    for name, func in (('legacy', legacy_parse), ('parser', parse),
+                       ('stream', stream_parse)):
+        best = min(timeit.repeat(lambda: func(stdout), number=1,
+                                 repeat=options.repeat))
+        print(f'{name:<10}{best * 1000:>12.2f}'
+              f'{best / options.lines * 1e6:>15.2f}'
+              f'{peak_memory(func, stdout) / 1024:>19.0f}')
+
+
+if __name__ == '__main__':
+    main()
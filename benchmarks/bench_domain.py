@@ -0,0 +1,77 @@
+"""
+Micro-benchmark of the domain normalization against the previous
+implementation (`re.search` of the uncompiled pattern and `idna.encode` of
+every domain, `idna.decode` for the output). Run from the repository root:
+
+    python benchmarks/bench_domain.py --domains 10000 --repeat 5
+"""
+import argparse
+import re
+import sys
+import timeit
+from pathlib import Path
+
+import idna
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src'))
+
+from wd import Domain  # noqa: E402
+
+INPUTS = (
+    'https://www.example{}.com/path?query=1',
+    'EXAMPLE{}.ORG',
+    'mail.example{}.co.uk A',
+    'пример{}.рф',
+)
+
+
+def make_inputs(domains: int, distinct: int) -> list:
+    return [INPUTS[index % len(INPUTS)].format(index % distinct)
+            for index in range(domains)]
+
+
+def legacy_normalize(input_site: str) -> str:
+    """Previous implementation of the `Domain.domain` setter and of the IDN
+    decoding of the output."""
+    domain = re.search(Domain.DOMAIN_REGEXP, input_site.lower())
+    try:
+        domain = idna.encode(domain.group()).decode()
+    except idna.core.InvalidCodepoint:
+        domain = domain.group()
+    try:
+        idna.decode(domain)
+    except idna.core.InvalidCodepoint:
+        pass
+    return domain
+
+
+def normalize(input_site: str) -> str:
+    domain = Domain(input_site)
+    Domain.domain_decode(domain.domain)
+    return domain.domain
+
+
+def main() -> None:
+    arguments = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    arguments.add_argument('--domains', type=int, default=10000)
+    arguments.add_argument('--distinct', type=int, default=1000,
+                           help='Amount of distinct domains of the inputs.')
+    arguments.add_argument('--repeat', type=int, default=5)
+    options = arguments.parse_args()
+    inputs = make_inputs(options.domains, options.distinct)
+
+    assert [legacy_normalize(site) for site in inputs] == [
+        normalize(site) for site in inputs]
+    cases = {
+        'legacy': lambda: [legacy_normalize(site) for site in inputs],
+        'Domain': lambda: [normalize(site) for site in inputs],
+        'from_many': lambda: Domain.from_many(inputs),
+    }
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=1, repeat=options.repeat))
+        print(f'{name:<10} {best * 1000:>9.2f} ms  '
+              f'{best / len(inputs) * 1e6:>7.2f} us/domain')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Micro-benchmark of the serialization of the dig and whois API responses:
+the previous way (no response model, `jsonable_encoder` and the standard
+`json` module) against the response models with orjson and msgpack. Run from
+the repository root:
+
+    python benchmarks/bench_serialization.py --servers 4 --repeat 5
+"""
+import argparse
+import asyncio
+import datetime
+import sys
+import time
+from pathlib import Path
+from typing import Union
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src'))
+
+from wd_api.responses import APIResponse, _accepts_msgpack  # noqa: E402
+from wd_api.schemas import (DigOutput, DigRecordsOutput,  # noqa: E402
+                            Message, WhoisOutput)
+
+RECORDS = {
+    'A': ['192.0.2.1', '192.0.2.2'],
+    'AAAA': ['2001:db8::1'],
+    'CNAME': [],
+    'MX': ['10 mx1.example.net.', '20 mx2.example.net.'],
+    'NS': ['ns1.example.net.', 'ns2.example.net.'],
+    'TXT': ['"v=spf1 include:_spf.example.net ~all"',
+            '"google-site-verification=0123456789abcdef"'],
+    'SOA': ['ns1.example.net. hostmaster.example.net. 2023010101 7200 '
+            '3600 1209600 300'],
+    'CAA': ['0 issue "letsencrypt.org"'],
+}
+
+
+def dig_output(servers: int) -> dict:
+    """Output of `Domain.dig` of the ALL preset."""
+    names = [f'192.0.2.{index}' for index in range(servers)]
+    return {
+        'domain': 'example.com',
+        'records': list(RECORDS),
+        'result': True,
+        'data': {
+            record: {
+                name: [{'ttl': '300', 'content': content}
+                       for content in contents]
+                for name in names
+            }
+            for record, contents in RECORDS.items()
+        },
+        'servers': {
+            record: {
+                name: {'status': 'NOERROR', 'time': 12.34, 'timeout': False,
+                       'cached': True}
+                for name in names
+            }
+            for record in RECORDS
+        },
+        'skipped': []
+    }
+
+
+def whois_output() -> dict:
+    """Output of `Domain.whois_json`."""
+    return {
+        'name': 'example.com', 'tld': 'com',
+        'registrar': 'Example Registrar, Inc.', 'registrant_country': 'US',
+        'creation_date': 946684800, 'expiration_date': 1893456000,
+        'last_updated': datetime.datetime(2023, 1, 1),
+        'status': 'clientTransferProhibited',
+        'statuses': ['clientDeleteProhibited', 'clientTransferProhibited'],
+        'dnssec': False,
+        'name_servers': ['ns1.example.net', 'ns2.example.net'],
+        'registrant': None, 'emails': ['abuse@example.net'],
+        'source': 'rdap', 'result': True, 'name_IDN': None, 'is_active': True
+    }
+
+
+async def legacy(content: dict, field) -> bytes:
+    return JSONResponse(await serialize_response(
+        response_content=content)).body
+
+
+async def orjson(content: dict, field) -> bytes:
+    return APIResponse(await serialize_response(
+        field=field, response_content=content)).body
+
+
+async def msgpack(content: dict, field) -> bytes:
+    token = _accepts_msgpack.set(True)
+    try:
+        return APIResponse(await serialize_response(
+            field=field, response_content=content)).body
+    finally:
+        _accepts_msgpack.reset(token)
+
+
+async def measure(case, content: dict, field, repeat: int,
+                  number: int) -> float:
+    """Best time of one serialization (sec)."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            await case(content, field)
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+async def main() -> None:
+    arguments = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    arguments.add_argument('--servers', type=int, default=4,
+                           help='Amount of DNS-servers of the dig output.')
+    arguments.add_argument('--number', type=int, default=1000)
+    arguments.add_argument('--repeat', type=int, default=5)
+    options = arguments.parse_args()
+
+    outputs = {
+        'dig': (dig_output(options.servers), create_response_field(
+            'dig', Union[DigOutput, DigRecordsOutput, Message])),
+        'whois': (whois_output(), create_response_field(
+            'whois', Union[WhoisOutput, Message])),
+    }
+    for name, (content, field) in outputs.items():
+        for case in (legacy, orjson, msgpack):
+            best = await measure(case, content, field, options.repeat,
+                                 options.number)
+            size = len(await case(content, field))
+            print(f'{name:<6} {case.__name__:<8} {best * 1e6:>8.1f} us'
+                  f'  {size:>6} bytes')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+Startup benchmark of the API and bot entry points by `python -X importtime`:
+every entry point is imported by the fresh interpreter several times, the
+best import time and the heaviest imports are printed. Exits with error if
+the import time is over the budget or any of the lazily imported modules
+(backends which are loaded on the first use) is imported at startup. Run from
+the repository root:
+
+    python benchmarks/bench_startup.py --repeat 5 --budget-api 300
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+
+# Entry point: modules which must not be imported at its startup.
+ENTRY_POINTS: Dict[str, Tuple[str, ...]] = {
+    'wd_api.main': ('httpx', 'whois', 'idna', 'telegram'),
+    # idna is imported by httpx of python-telegram-bot.
+    'wd_telegram_bot': ('whois', 'fastapi', 'uvicorn'),
+}
+
+IMPORT_TIME_REGEXP = re.compile(
+    r'import time:\s+(\d+) \|\s+(\d+) \| *(\S+)')
+
+
+def import_times(module: str) -> List[Tuple[str, int, int]]:
+    """(module, self time, cumulative time) in us of every import made by
+    the import of the module by the fresh interpreter."""
+    environment = dict(os.environ, BOT_MODE='polling')
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SRC_DIR, env=environment, capture_output=True, text=True,
+        check=True)
+    return [
+        (match[3], int(match[1]), int(match[2]))
+        for match in IMPORT_TIME_REGEXP.finditer(process.stderr)
+    ]
+
+
+def main() -> None:
+    arguments = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    arguments.add_argument('--repeat', type=int, default=5)
+    arguments.add_argument('--top', type=int, default=10,
+                           help='Amount of the heaviest imports to print.')
+    arguments.add_argument('--budget-api', type=float, default=300,
+                           help='Max import time of the API (ms).')
+    arguments.add_argument('--budget-bot', type=float, default=300,
+                           help='Max import time of the bot (ms).')
+    options = arguments.parse_args()
+    budgets = {'wd_api.main': options.budget_api,
+               'wd_telegram_bot': options.budget_bot}
+
+    failures = []
+    for module, lazy_modules in ENTRY_POINTS.items():
+        runs = [import_times(module) for _ in range(options.repeat)]
+        best = min(runs, key=lambda times: times[-1][2])
+        total = best[-1][2] / 1000
+        print(f'{module:<16} {total:>8.1f} ms  (budget '
+              f'{budgets[module]:.0f} ms)')
+        for name, _, cumulative in sorted(
+                best, key=lambda item: -item[2])[1:options.top + 1]:
+            print(f'    {name:<40} {cumulative / 1000:>8.1f} ms')
+
+        if total > budgets[module]:
+            failures.append(f'{module}: {total:.1f} ms is over the budget')
+        imported = {name for name, _, _ in best}
+        eager = [name for name in lazy_modules if name in imported]
+        if eager:
+            failures.append(f'{module}: imports {", ".join(eager)} at start')
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
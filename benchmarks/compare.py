@@ -0,0 +1,42 @@
+"""
+Compare two results of `benchmarks/run.py`:
+
+    python benchmarks/compare.py before.json after.json
+"""
+import argparse
+import json
+from pathlib import Path
+
+METRICS = ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_rss_mb')
+
+
+def change(old: float, new: float) -> str:
+    if not old:
+        return 'n/a'
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def main() -> None:
+    arguments = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    arguments.add_argument('before')
+    arguments.add_argument('after')
+    options = arguments.parse_args()
+
+    before, after = (
+        {result['scenario']: result
+         for result in json.loads(Path(path).read_text())['results']}
+        for path in (options.before, options.after)
+    )
+    print(f'{"scenario":<10}{"metric":<16}{"before":>12}{"after":>12}'
+          f'{"change":>10}')
+    for scenario, new in after.items():
+        old = before.get(scenario)
+        if old is None:
+            continue
+        for metric in METRICS:
+            print(f'{scenario:<10}{metric:<16}{old[metric]:>12}'
+                  f'{new[metric]:>12}{change(old[metric], new[metric]):>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""
+Benchmark of the dig and whois engines and the API against local stand-in
+servers. Every scenario is run with the given concurrency, the latency
+percentiles, throughput and RSS are printed and saved as JSON, so the runs
+may be compared with `benchmarks/compare.py`.
+
+    python benchmarks/run.py --requests 2000 --concurrency 50 -o before.json
+"""
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+SCENARIOS = ('dig', 'dig-all', 'ptr', 'dnssec', 'whois', 'rdap', 'api-dig',
+             'api-whois')
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of the sorted values."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1,
+                       round(percent / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def rss() -> int:
+    """Current resident set size of the process in bytes."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return max_rss()
+
+
+def max_rss() -> int:
+    """Peak resident set size of the process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+async def measure(name: str, call: Callable[[int], Awaitable[bool]],
+                  requests: int, concurrency: int, warmup: int) -> dict:
+    """Run `call(index)` `requests` times by `concurrency` workers, `call`
+    returns False if the request has failed."""
+    for index in range(warmup):
+        await call(requests + index)
+
+    latencies: List[float] = []
+    errors = 0
+    indexes = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for index in indexes:
+            started = time.perf_counter()
+            try:
+                success = await call(index)
+            except Exception:
+                success = False
+            latencies.append(time.perf_counter() - started)
+            errors += not success
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'scenario': name,
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(requests / elapsed, 1),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'rss_mb': round(rss() / 2 ** 20, 1),
+        'max_rss_mb': round(max_rss() / 2 ** 20, 1),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=SRC_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(options: argparse.Namespace) -> dict:
+    from wd import Domain
+    from ptr import check_ptr
+    from dnssec import validate
+    from standins import trust_anchor
+
+    server = f'{options.host}#{options.dns_port}'
+
+    def domain_name(scenario: str, index: int) -> str:
+        # Scenarios don't share domains, so they don't hit the caches filled
+        # by the previous scenarios.
+        if options.domains:
+            index %= options.domains
+        return f'bench-{scenario}-{index}.com'
+
+    async def dig(index: int) -> bool:
+        output = await Domain(domain_name('dig', index)).dig(
+            options.record, [server], backend=options.backend)
+        return all(status['status'] == 'NOERROR'
+                   for status in output['servers'].values())
+
+    async def dig_all(index: int) -> bool:
+        output = await Domain(domain_name('dig-all', index)).dig(
+            'ALL', [server], backend=options.backend)
+        return all(status['status'] == 'NOERROR'
+                   for statuses in output['servers'].values()
+                   for status in statuses.values())
+
+    async def ptr(index: int) -> bool:
+        if options.domains:
+            index %= options.domains
+        output = await check_ptr(
+            ipaddress.ip_address('10.0.0.0') + index, [server])
+        return output['ptr'] == ['host.example.net.']
+
+    async def dnssec(index: int) -> bool:
+        # Names of the signed stand-in zone: every one is validated from the
+        # root down to the signed proof of its absence.
+        if options.domains:
+            index %= options.domains
+        output = await validate(f'bench-dnssec-{index}.signed.test',
+                                (options.record,), [server],
+                                trust_anchors=[trust_anchor()])
+        return output['status'] == 'validated'
+
+    async def whois(index: int) -> bool:
+        return (await Domain(domain_name('whois', index)).whois_json(
+            source='whois'))['result']
+
+    async def rdap(index: int) -> bool:
+        output = await Domain(domain_name('rdap', index)).whois_json(
+            source='rdap')
+        return output['result'] and output['source'] == 'rdap'
+
+    calls = {'dig': dig, 'dig-all': dig_all, 'ptr': ptr, 'dnssec': dnssec,
+             'whois': whois, 'rdap': rdap}
+
+    if any(scenario.startswith('api-') for scenario in options.scenarios):
+        import httpx
+        if options.url:
+            client = httpx.AsyncClient(base_url=options.url,
+                                       timeout=options.timeout)
+        else:
+            from wd_api.main import app
+            client = httpx.AsyncClient(app=app, base_url='http://bench',
+                                       timeout=options.timeout)
+
+        async def api_dig(index: int) -> bool:
+            response = await client.post('/api/v1/dig', json={
+                'domain': domain_name('api-dig', index),
+                'record': options.record, 'dns': [server],
+                'backend': options.backend})
+            return response.status_code == 200
+
+        async def api_whois(index: int) -> bool:
+            response = await client.post('/api/v1/whois', json={
+                'domain': domain_name('api-whois', index),
+                'source': options.whois_source})
+            return (response.status_code == 200
+                    and response.json().get('result', False))
+
+        calls.update({'api-dig': api_dig, 'api-whois': api_whois})
+
+    results = []
+    for scenario in options.scenarios:
+        result = await measure(scenario, calls[scenario], options.requests,
+                               options.concurrency, options.warmup)
+        results.append(result)
+        print(f'{scenario:<10} {result["throughput_rps"]:>9} rps  '
+              f'p50 {result["p50_ms"]:>8} ms  p95 {result["p95_ms"]:>8} ms  '
+              f'p99 {result["p99_ms"]:>8} ms  errors {result["errors"]:>5}  '
+              f'rss {result["rss_mb"]:>6} MiB', file=sys.stderr)
+
+    return {
+        'started_at': datetime.datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {
+            'requests': options.requests,
+            'concurrency': options.concurrency,
+            'warmup': options.warmup,
+            'domains': options.domains,
+            'record': options.record,
+            'backend': options.backend,
+            'whois_backend': options.whois_backend,
+            'whois_source': options.whois_source,
+            'url': options.url,
+        },
+        'results': results,
+    }
+
+
+def main() -> None:
+    arguments = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    arguments.add_argument('scenarios', nargs='*', metavar='SCENARIO',
+                           help=f'Scenarios to run: {", ".join(SCENARIOS)}, '
+                                f'all by default.')
+    arguments.add_argument('-n', '--requests', type=int, default=1000)
+    arguments.add_argument('-c', '--concurrency', type=int, default=50)
+    arguments.add_argument('--warmup', type=int, default=20)
+    arguments.add_argument('--domains', type=int, default=0,
+                           help='Amount of distinct domains, 0 - every '
+                                'request is for the new domain (no cache '
+                                'hits).')
+    arguments.add_argument('--record', default='A')
+    arguments.add_argument('--backend', default='native')
+    arguments.add_argument('--whois-backend', default='native')
+    arguments.add_argument('--whois-source', default='whois',
+                           help='Source of the api-whois scenario.')
+    arguments.add_argument('--whois-server-interval', default='0',
+                           help='Min interval between the connections to '
+                                'the WHOIS-server of the native backend, '
+                                'sec.')
+    arguments.add_argument('--whois-server-concurrency', default='100')
+    arguments.add_argument('--url', help='Benchmark the running API instead '
+                                         'of the in-process application.')
+    arguments.add_argument('--timeout', type=float, default=30)
+    arguments.add_argument('--host', default='127.0.0.1')
+    arguments.add_argument('--dns-port', type=int, default=5353)
+    arguments.add_argument('--whois-port', type=int, default=43)
+    arguments.add_argument('--rdap-port', type=int, default=8080)
+    arguments.add_argument('--dns-delay', type=float, default=0,
+                           help='Delay of the stand-in DNS answers, sec.')
+    arguments.add_argument('--whois-delay', type=float, default=0,
+                           help='Delay of the stand-in WHOIS and RDAP '
+                                'answers, sec.')
+    arguments.add_argument('--whois-cache-path', default='',
+                           help='SQLite whois cache, empty - memory only.')
+    arguments.add_argument('-o', '--output', help='Save results to the file.')
+    options = arguments.parse_args()
+    unknown = set(options.scenarios) - set(SCENARIOS)
+    if unknown:
+        arguments.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+    options.scenarios = options.scenarios or list(SCENARIOS)
+
+    os.environ['WHOIS_CACHE_PATH'] = options.whois_cache_path
+    os.environ['WHOIS_BACKEND'] = options.whois_backend
+    os.environ['WHOIS_SERVER'] = f'{options.host}:{options.whois_port}'
+    os.environ['WHOIS_SERVER_INTERVAL'] = options.whois_server_interval
+    os.environ['WHOIS_SERVER_CONCURRENCY'] = options.whois_server_concurrency
+    rdap_bootstrap = str(
+        Path(tempfile.mkdtemp(prefix='wd-bench-')) / 'rdap_dns.json')
+    os.environ['RDAP_BOOTSTRAP_PATH'] = rdap_bootstrap
+    # Imported after the settings are set: they are read at import.
+    from standins import (install_whois_shim, start_standins,
+                          write_rdap_bootstrap)
+    write_rdap_bootstrap(rdap_bootstrap, options.host, options.rdap_port)
+    standins = start_standins(options.host, options.dns_port,
+                              options.whois_port, options.dns_delay,
+                              options.whois_delay, options.rdap_port)
+    install_whois_shim(options.host, options.whois_port)
+    try:
+        report = asyncio.run(run(options))
+    finally:
+        standins.terminate()
+
+    output = json.dumps(report, indent=2)
+    if options.output:
+        Path(options.output).write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
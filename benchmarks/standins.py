@@ -0,0 +1,606 @@
+"""
+Local stand-ins for the DNS and WHOIS servers with canned responses, so the
+benchmarks are reproducible and don't depend on the network.
+
+DNS stand-in answers every name over UDP and TCP: names starting with `nx`
+are NXDOMAIN, names containing `slow` are never answered over UDP. The root
+and `test.` zones are signed (with RRSIG and NSEC records for the queries
+with the DO flag): `signed.test.` is validated, `bogus.test.` has the wrong
+signature of its keys and `insecure.test.` is the delegation without DS
+records. The keys are the same on every start, the trust anchor of the
+stand-in root is printed by `--trust-anchor`.
+WHOIS and RDAP stand-ins answer every domain with the registry-like record,
+domains starting with `nx` are not registered.
+
+Run them alone:
+    python benchmarks/standins.py --dns-port 5353 --whois-port 4343 \
+        --rdap-port 8080
+"""
+import argparse
+import asyncio
+import datetime
+import functools
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import stat
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import (
+    decode_dss_signature)
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src'))
+
+from dnssec import (DNSKEY_FIXED, DS_FIXED, RRSIG_FIXED,  # noqa: E402
+                    key_tag, name_wire, rrset_signed_data, to_name)
+from resolver import (HEADER, QUESTION_FIXED, RECORD_TYPES,  # noqa: E402
+                      RR_FIXED, encode_name, read_name)
+
+FLAGS_RESPONSE: int = 0x8180
+FLAG_TC: int = 0x0200
+UDP_MAX_SIZE: int = 1232
+NAME_POINTER: bytes = b'\xc0\x0c'
+
+
+SOA_RDATA: bytes = (
+    encode_name('ns1.example.net.') + encode_name('host.example.net.')
+    + struct.pack('!IIIII', 2024010101, 7200, 3600, 1209600, 300)
+)
+
+
+def _soa(ttl: int = 900) -> bytes:
+    return encode_name('example.net.') + RR_FIXED.pack(
+        RECORD_TYPES['SOA'], 1, ttl, len(SOA_RDATA)) + SOA_RDATA
+
+
+def _txt(*strings: bytes) -> bytes:
+    return b''.join(bytes([len(string)]) + string for string in strings)
+
+
+CANNED = {
+    'A': (bytes([192, 0, 2, 1]), bytes([192, 0, 2, 2])),
+    'AAAA': (bytes.fromhex('20010db8000000000000000000000001'),),
+    'MX': (struct.pack('!H', 10) + encode_name('mx1.example.net.'),
+           struct.pack('!H', 20) + encode_name('mx2.example.net.')),
+    'NS': (encode_name('ns1.example.net.'), encode_name('ns2.example.net.')),
+    'PTR': (encode_name('host.example.net.'),),
+    'TXT': (_txt(b'v=spf1 include:_spf.example.net ', b'~all'),
+            _txt(b'site-verification=' + b'x' * 43)),
+    'CAA': (b'\x00\x05issueletsencrypt.org',),
+    'SOA': (SOA_RDATA,),
+}
+
+
+# Signed stand-in zones
+
+
+class SigningKey:
+    """Key of the signed stand-in zone (the only one, so its flags are of
+    the key signing key)."""
+
+    def __init__(self, algorithm: int, public: bytes,
+                 sign: Callable[[bytes], bytes]) -> None:
+        self.algorithm = algorithm
+        self.dnskey = DNSKEY_FIXED.pack(257, 3, algorithm) + public
+        self.sign = sign
+
+    def ds(self, owner: str) -> bytes:
+        """DS rdata of the key with SHA-256 digest."""
+        return DS_FIXED.pack(key_tag(self.dnskey), self.algorithm, 2) + (
+            hashlib.sha256(name_wire(to_name(owner)) + self.dnskey).digest())
+
+
+def _is_prime(number: int, rng: random.Random, rounds: int = 20) -> bool:
+    """Miller-Rabin test."""
+    if number < 4:
+        return number in (2, 3)
+    exponent, shift = number - 1, 0
+    while not exponent & 1:
+        exponent >>= 1
+        shift += 1
+    for _ in range(rounds):
+        value = pow(rng.randrange(2, number - 1), exponent, number)
+        if value in (1, number - 1):
+            continue
+        for _ in range(shift - 1):
+            value = pow(value, 2, number)
+            if value == number - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def rsa_key(seed: str, bits: int = 1024) -> SigningKey:
+    """RSASHA256 key generated from the seed."""
+    rng = random.Random(seed)
+    exponent = 65537
+
+    def prime() -> int:
+        while True:
+            candidate = rng.getrandbits(bits // 2) | 3 << (bits // 2 - 2) | 1
+            if (_is_prime(candidate, rng)
+                    and math.gcd(exponent, candidate - 1) == 1):
+                return candidate
+
+    first, second = prime(), prime()
+    modulus = first * second
+    private = pow(exponent, -1, (first - 1) * (second - 1))
+    key = rsa.RSAPrivateNumbers(
+        first, second, private, rsa.rsa_crt_dmp1(private, first),
+        rsa.rsa_crt_dmq1(private, second), rsa.rsa_crt_iqmp(first, second),
+        rsa.RSAPublicNumbers(exponent, modulus)).private_key()
+
+    def sign(data: bytes) -> bytes:
+        return key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+
+    public = (b'\x03' + exponent.to_bytes(3, 'big')
+              + modulus.to_bytes(bits // 8, 'big'))
+    return SigningKey(8, public, sign)
+
+
+def ecdsa_key(seed: str) -> SigningKey:
+    """ECDSAP256SHA256 key generated from the seed."""
+    curve = ec.SECP256R1()
+    # The private value is in [1, n - 1], n of P-256 is above 2 ** 255.
+    key = ec.derive_private_key(int.from_bytes(
+        hashlib.sha256(seed.encode()).digest(), 'big') % 2 ** 255 + 1, curve)
+    point = key.public_key().public_numbers()
+
+    def sign(data: bytes) -> bytes:
+        r, s = decode_dss_signature(key.sign(data, ec.ECDSA(hashes.SHA256())))
+        return r.to_bytes(32, 'big') + s.to_bytes(32, 'big')
+
+    return SigningKey(13, point.x.to_bytes(32, 'big')
+                      + point.y.to_bytes(32, 'big'), sign)
+
+
+def ed25519_key(seed: str) -> SigningKey:
+    """ED25519 key generated from the seed (RFC 8032)."""
+    key = ed25519.Ed25519PrivateKey.from_private_bytes(
+        hashlib.sha256(seed.encode()).digest())
+    public = key.public_key().public_bytes(
+        serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    return SigningKey(15, public, key.sign)
+
+
+@functools.lru_cache(maxsize=None)
+def signing_keys() -> Dict[str, SigningKey]:
+    """Keys of the signed zones."""
+    return {
+        '.': rsa_key('.'),
+        'test.': ecdsa_key('test.'),
+        'signed.test.': ed25519_key('signed.test.'),
+        'bogus.test.': ed25519_key('bogus.test.'),
+    }
+
+
+def trust_anchor() -> str:
+    """DS record of the stand-in root key for DNSSEC_TRUST_ANCHORS."""
+    ds = signing_keys()['.'].ds('.')
+    tag, algorithm, digest_type = DS_FIXED.unpack_from(ds)
+    return (f'{tag} {algorithm} {digest_type} '
+            f'{ds[DS_FIXED.size:].hex().upper()}')
+
+
+# Zones without DS records in the parent, their records are canned.
+UNSIGNED_ZONES: Tuple[str, ...] = ('insecure.test.',)
+
+# NSEC chains of the signed zones: owners in canonical order and their types.
+NSEC_CHAINS: Dict[str, Tuple[Tuple[str, Tuple[str, ...]], ...]] = {
+    '.': (('.', ('NS', 'SOA', 'RRSIG', 'NSEC', 'DNSKEY')),
+          ('test.', ('NS', 'DS', 'RRSIG', 'NSEC'))),
+    'test.': (('test.', ('NS', 'SOA', 'RRSIG', 'NSEC', 'DNSKEY')),
+              ('bogus.test.', ('NS', 'DS', 'RRSIG', 'NSEC')),
+              ('insecure.test.', ('NS', 'RRSIG', 'NSEC')),
+              ('signed.test.', ('NS', 'DS', 'RRSIG', 'NSEC'))),
+    'signed.test.': (
+        ('signed.test.', ('A', 'NS', 'SOA', 'RRSIG', 'NSEC', 'DNSKEY')),
+        ('www.signed.test.', ('A', 'RRSIG', 'NSEC'))),
+    'bogus.test.': (
+        ('bogus.test.', ('A', 'NS', 'SOA', 'RRSIG', 'NSEC', 'DNSKEY')),),
+}
+SIGNED_TTL: int = 300
+
+
+def _type_bitmap(types: Tuple[str, ...]) -> bytes:
+    """NSEC type bitmap of the types of the first window."""
+    bitmap = bytearray(32)
+    for record in types:
+        rtype = RECORD_TYPES[record]
+        bitmap[rtype // 8] |= 0x80 >> rtype % 8
+    bitmap = bytes(bitmap).rstrip(b'\x00')
+    return bytes([0, len(bitmap)]) + bitmap
+
+
+def _rr(owner: str, rtype: int, rdata: bytes) -> bytes:
+    return encode_name(owner) + RR_FIXED.pack(
+        rtype, 1, SIGNED_TTL, len(rdata)) + rdata
+
+
+@functools.lru_cache(maxsize=None)
+def signed_zones() -> Dict[Tuple[str, str, int], Tuple[List[bytes], bytes]]:
+    """RRsets of the signed zones: (zone, owner, type) -> (rdata of the
+    records, RRSIG rdata). Signatures are valid for a week from now."""
+    keys = signing_keys()
+    rrsets = {}
+
+    def add(zone: str, owner: str, record: str, *rdatas: bytes) -> None:
+        rrsets[(zone, owner, RECORD_TYPES[record])] = list(rdatas)
+
+    for zone, key in keys.items():
+        add(zone, zone, 'DNSKEY', key.dnskey)
+        add(zone, zone, 'SOA', SOA_RDATA)
+    add('.', 'test.', 'DS', keys['test.'].ds('test.'))
+    for child in ('signed.test.', 'bogus.test.'):
+        add('test.', child, 'DS', keys[child].ds(child))
+    for owner, zone in (('signed.test.', 'signed.test.'),
+                        ('www.signed.test.', 'signed.test.'),
+                        ('bogus.test.', 'bogus.test.')):
+        add(zone, owner, 'A', *CANNED['A'])
+    for zone, chain in NSEC_CHAINS.items():
+        for index, (owner, types) in enumerate(chain):
+            next_owner = chain[(index + 1) % len(chain)][0]
+            add(zone, owner, 'NSEC', encode_name(next_owner)
+                + _type_bitmap(types))
+
+    now = int(time.time())
+    signed = {}
+    for (zone, owner, rtype), rdatas in rrsets.items():
+        key = keys[zone]
+        head = RRSIG_FIXED.pack(
+            rtype, key.algorithm, len(to_name(owner)), SIGNED_TTL,
+            now + 7 * 24 * 3600, now - 3600, key_tag(key.dnskey)
+        ) + name_wire(to_name(zone))
+        signature = key.sign(rrset_signed_data(
+            head, to_name(owner), rtype, SIGNED_TTL, rdatas))
+        if zone == 'bogus.test.' and rtype == RECORD_TYPES['DNSKEY']:
+            signature = signature[:-1] + bytes([signature[-1] ^ 1])
+        signed[(zone, owner, rtype)] = (rdatas, head + signature)
+    return signed
+
+
+def _is_under(name: str, zone: str) -> bool:
+    return zone == '.' or name == zone or name.endswith('.' + zone)
+
+
+def signed_answer(name: str, rtype: int, dnssec: bool
+                  ) -> Optional[Tuple[int, List[bytes], List[bytes]]]:
+    """(rcode, answers, authority) of the name of the signed zones, None if
+    the name is not in them. RRSIG and NSEC records are sent only if
+    `dnssec`."""
+    if name != '.' and not _is_under(name, 'test.'):
+        return None
+    is_ds = rtype == RECORD_TYPES['DS']
+    for zone in UNSIGNED_ZONES:
+        if _is_under(name, zone) and not (is_ds and name == zone):
+            return None
+    # DS records are in the parent zone.
+    zone = max((zone for zone in NSEC_CHAINS if _is_under(name, zone)
+                and not (is_ds and name == zone and zone != '.')),
+               key=lambda zone: len(to_name(zone)))
+    zones = signed_zones()
+
+    def rrset(owner: str, owner_type: int) -> List[bytes]:
+        rdatas, rrsig = zones[(zone, owner, owner_type)]
+        records = [_rr(owner, owner_type, rdata) for rdata in rdatas]
+        if dnssec:
+            records.append(_rr(owner, RECORD_TYPES['RRSIG'], rrsig))
+        return records
+
+    if (zone, name, rtype) in zones:
+        return 0, rrset(name, rtype), []
+
+    authority = [_rr(zone, RECORD_TYPES['SOA'], SOA_RDATA)]
+    chain = [owner for owner, _ in NSEC_CHAINS[zone]]
+    if name in chain:
+        rcode, owner = 0, name
+    else:
+        # The NSEC record which covers the name in the canonical order.
+        key = to_name(name)[::-1]
+        rcode, owner = 3, chain[-1]
+        for current, following in zip(chain, chain[1:]):
+            if (to_name(current)[::-1] < key < to_name(following)[::-1]):
+                owner = current
+                break
+    if dnssec:
+        authority.extend(rrset(owner, RECORD_TYPES['NSEC']))
+    return rcode, [], authority
+
+
+def dns_answer(query: bytes, tcp: bool = False) -> Optional[bytes]:
+    """Canned DNS response to the query, None if it should be dropped."""
+    query_id, _, _, _, _, additional = HEADER.unpack_from(query)
+    name, offset = read_name(query, HEADER.size)
+    rtype, _ = QUESTION_FIXED.unpack_from(query, offset)
+    question = query[HEADER.size:offset + QUESTION_FIXED.size]
+    if 'slow' in name and not tcp:
+        return None
+    # DO flag in the TTL field of the OPT record right after the question.
+    opt = HEADER.size + len(question)
+    dnssec = bool(additional and len(query) >= opt + RR_FIXED.size + 1
+                  and query[opt + 7] & 0x80)
+
+    answers, authority, rcode = [], [], 0
+    signed = signed_answer(name.lower(), rtype, dnssec)
+    if signed is not None:
+        rcode, answers, authority = signed
+    elif name.startswith('nx'):
+        rcode = 3
+        authority.append(_soa())
+    else:
+        record = next((key for key, value in RECORD_TYPES.items()
+                       if value == rtype), None)
+        for rdata in CANNED.get(record, ()):
+            answers.append(NAME_POINTER + RR_FIXED.pack(
+                rtype, 1, 300, len(rdata)) + rdata)
+        if not answers:
+            authority.append(_soa())
+
+    flags = FLAGS_RESPONSE | rcode
+    response = HEADER.pack(query_id, flags, 1, len(answers), len(authority),
+                           0) + question + b''.join(answers + authority)
+    if not tcp and len(response) > UDP_MAX_SIZE:
+        response = HEADER.pack(
+            query_id, flags | FLAG_TC, 1, 0, 0, 0) + question
+    return response
+
+
+class _DNSProtocol(asyncio.DatagramProtocol):
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        response = dns_answer(data)
+        if response is None:
+            return
+        if self.delay:
+            asyncio.get_running_loop().call_later(
+                self.delay, self.transport.sendto, response, addr)
+        else:
+            self.transport.sendto(response, addr)
+
+
+async def _dns_tcp(reader: asyncio.StreamReader,
+                   writer: asyncio.StreamWriter) -> None:
+    try:
+        length, = struct.unpack('!H', await reader.readexactly(2))
+        response = dns_answer(await reader.readexactly(length), tcp=True)
+        writer.write(struct.pack('!H', len(response)) + response)
+        await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def whois_answer(domain: str) -> bytes:
+    """Canned registry-like WHOIS record of the domain."""
+    if domain.startswith('nx'):
+        return f'No match for "{domain.upper()}".\r\n'.encode()
+    now = datetime.datetime.utcnow()
+    expires = now + datetime.timedelta(days=365)
+    return (
+        f'   Domain Name: {domain.upper()}\r\n'
+        f'   Registry Domain ID: 1234567_DOMAIN_COM-VRSN\r\n'
+        f'   Registrar WHOIS Server: whois.example.net\r\n'
+        f'   Updated Date: 2023-01-01T00:00:00Z\r\n'
+        f'   Creation Date: 2000-01-01T00:00:00Z\r\n'
+        f'   Registry Expiry Date: {expires:%Y-%m-%dT%H:%M:%SZ}\r\n'
+        f'   Registrar: Example Registrar, Inc.\r\n'
+        f'   Domain Status: clientTransferProhibited '
+        f'https://icann.org/epp#clientTransferProhibited\r\n'
+        f'   Name Server: NS1.EXAMPLE.NET\r\n'
+        f'   Name Server: NS2.EXAMPLE.NET\r\n'
+        f'   DNSSEC: unsigned\r\n'
+        f'>>> Last update of whois database: {now:%Y-%m-%dT%H:%M:%SZ} <<<\r\n'
+    ).encode()
+
+
+def _whois_handler(delay: float):
+    async def handle(reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        try:
+            domain = (await reader.readline()).decode(errors='replace')
+            if delay:
+                await asyncio.sleep(delay)
+            writer.write(whois_answer(domain.strip().lower()))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+def rdap_answer(domain: str) -> Optional[dict]:
+    """Canned registry-like RDAP domain object, None if not registered."""
+    if domain.startswith('nx'):
+        return None
+    now = datetime.datetime.utcnow()
+    expires = now + datetime.timedelta(days=365)
+    return {
+        'objectClassName': 'domain',
+        'ldhName': domain.upper(),
+        'status': ['client transfer prohibited'],
+        'events': [
+            {'eventAction': 'registration',
+             'eventDate': '2000-01-01T00:00:00Z'},
+            {'eventAction': 'expiration',
+             'eventDate': f'{expires:%Y-%m-%dT%H:%M:%SZ}'},
+            {'eventAction': 'last changed',
+             'eventDate': '2023-01-01T00:00:00Z'},
+        ],
+        'entities': [{
+            'objectClassName': 'entity',
+            'roles': ['registrar'],
+            'vcardArray': ['vcard', [['version', {}, 'text', '4.0'],
+                                     ['fn', {}, 'text',
+                                      'Example Registrar, Inc.']]],
+        }],
+        'nameservers': [
+            {'objectClassName': 'nameserver', 'ldhName': 'NS1.EXAMPLE.NET'},
+            {'objectClassName': 'nameserver', 'ldhName': 'NS2.EXAMPLE.NET'},
+        ],
+        'secureDNS': {'delegationSigned': False},
+    }
+
+
+def _rdap_handler(delay: float):
+    async def handle(reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        # Connections are kept alive until the client closes them.
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()).strip():
+                    pass
+                path = request_line.split()[1].decode()
+                domain = path.rsplit('/', 1)[-1].lower()
+                if delay:
+                    await asyncio.sleep(delay)
+                record = rdap_answer(domain)
+                body = json.dumps(record or {'errorCode': 404}).encode()
+                status = '200 OK' if record else '404 Not Found'
+                writer.write(
+                    f'HTTP/1.1 {status}\r\n'
+                    f'Content-Type: application/rdap+json\r\n'
+                    f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+                await writer.drain()
+        except (ConnectionError, IndexError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+async def serve(host: str, dns_port: int, whois_port: int,
+                dns_delay: float = 0, whois_delay: float = 0,
+                ready=None, rdap_port: int = 0) -> None:
+    """Serve the stand-ins until cancelled, RDAP one if `rdap_port` is
+    set."""
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _DNSProtocol(dns_delay), local_addr=(host, dns_port))
+    servers = [
+        await asyncio.start_server(_dns_tcp, host, dns_port),
+        await asyncio.start_server(
+            _whois_handler(whois_delay), host, whois_port),
+    ]
+    if rdap_port:
+        servers.append(await asyncio.start_server(
+            _rdap_handler(whois_delay), host, rdap_port))
+    if ready is not None:
+        ready.set()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        transport.close()
+        for server in servers:
+            server.close()
+
+
+def _run(*args) -> None:
+    try:
+        asyncio.run(serve(*args))
+    except KeyboardInterrupt:
+        pass
+
+
+def start_standins(host: str = '127.0.0.1', dns_port: int = 5353,
+                   whois_port: int = 43, dns_delay: float = 0,
+                   whois_delay: float = 0,
+                   rdap_port: int = 0) -> multiprocessing.Process:
+    """Start the stand-ins in the separate process, so they don't share the
+    event loop and the CPU time with the benchmarked code."""
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(
+        target=_run, daemon=True,
+        args=(host, dns_port, whois_port, dns_delay, whois_delay, ready,
+              rdap_port))
+    process.start()
+    if not ready.wait(10):
+        process.terminate()
+        raise RuntimeError('Stand-in servers have not started')
+    return process
+
+
+WHOIS_SHIM = '''#!{python}
+"""`whois DOMAIN [-h HOST]` which asks the WHOIS stand-in."""
+import socket
+import sys
+
+with socket.create_connection(({host!r}, {port})) as connection:
+    connection.sendall(sys.argv[1].encode() + b'\\r\\n')
+    while True:
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        sys.stdout.buffer.write(chunk)
+'''
+
+
+def install_whois_shim(host: str, port: int) -> Tuple[str, str]:
+    """The `whois` library (`subprocess` whois backend) runs the `whois`
+    program, so the program which asks the stand-in is put first to PATH.
+    Returns (directory, old PATH)."""
+    directory = tempfile.mkdtemp(prefix='wd-bench-')
+    path = Path(directory) / 'whois'
+    path.write_text(WHOIS_SHIM.format(python=sys.executable, host=host,
+                                      port=port))
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    old_path = os.environ.get('PATH', '')
+    os.environ['PATH'] = directory + os.pathsep + old_path
+    return directory, old_path
+
+
+def write_rdap_bootstrap(path: str, host: str, port: int) -> None:
+    """IANA-like RDAP bootstrap file which points `com` to the RDAP
+    stand-in."""
+    Path(path).write_text(json.dumps({
+        'version': '1.0',
+        'services': [[['com'], [f'http://{host}:{port}/']]],
+    }))
+
+
+def main() -> None:
+    arguments = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    arguments.add_argument('--host', default='127.0.0.1')
+    arguments.add_argument('--dns-port', type=int, default=5353)
+    arguments.add_argument('--whois-port', type=int, default=43)
+    arguments.add_argument('--rdap-port', type=int, default=8080)
+    arguments.add_argument('--dns-delay', type=float, default=0,
+                           help='Delay of the DNS answers, sec.')
+    arguments.add_argument('--whois-delay', type=float, default=0,
+                           help='Delay of the WHOIS and RDAP answers, sec.')
+    arguments.add_argument('--trust-anchor', action='store_true',
+                           help='Print the trust anchor of the signed zones '
+                                'and exit.')
+    options = arguments.parse_args()
+    if options.trust_anchor:
+        print(trust_anchor())
+        return
+    print(f'DNS: {options.host}#{options.dns_port}, '
+          f'WHOIS: {options.host}:{options.whois_port}, '
+          f'RDAP: http://{options.host}:{options.rdap_port}/')
+    _run(options.host, options.dns_port, options.whois_port,
+         options.dns_delay, options.whois_delay, None, options.rdap_port)
+
+
+if __name__ == '__main__':
+    main()
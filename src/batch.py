@@ -0,0 +1,172 @@
+import asyncio
+import datetime
+import json
+from typing import (Any, AsyncIterable, AsyncIterator, Awaitable, BinaryIO,
+                    Callable, Dict, Iterable, Iterator, Optional, Sequence,
+                    Tuple, Union)
+
+from constants import BATCH_CONCURRENCY, DNS_SERVERS, WHOIS_WORKERS
+from exceptions import BadDomain, WhoisBusy, WhoisTimeout
+from wd import Domain
+from whois_cache import WHOIS_ERRORS
+
+_limiters: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = {}
+
+
+def global_limiter(name: str, value: int) -> asyncio.Semaphore:
+    """Semaphore shared by all the batches of the current event loop."""
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(name)
+    if limiter is None or limiter[0] is not loop:
+        limiter = _limiters[name] = (loop, asyncio.Semaphore(value))
+    return limiter[1]
+
+
+class _WorkerError:
+    """Wraps the exception raised in the worker of `bounded_map`."""
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+
+
+async def bounded_map(
+        func: Callable[[Any], Awaitable[Any]],
+        items: Union[Iterable, AsyncIterable],
+        concurrency: int,
+        limiter: Optional[asyncio.Semaphore] = None
+) -> AsyncIterator[Any]:
+    """
+    Apply the coroutine function to every item with at most `concurrency`
+    calls at once and yield the results in order of completion.
+    Items are pulled from the (async) iterable lazily and at most
+    `concurrency` results are buffered, so the memory usage doesn't depend on
+    the amount of items.
+    """
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    done = object()
+    pull_lock = asyncio.Lock()
+
+    if isinstance(items, AsyncIterable):
+        iterator = items.__aiter__()
+
+        async def pull():
+            async with pull_lock:
+                return await iterator.__anext__()
+    else:
+        iterator = iter(items)
+
+        async def pull():
+            try:
+                return next(iterator)
+            except StopIteration:
+                raise StopAsyncIteration from None
+
+    async def worker():
+        try:
+            while True:
+                try:
+                    item = await pull()
+                except StopAsyncIteration:
+                    break
+                if limiter is None:
+                    result = await func(item)
+                else:
+                    async with limiter:
+                        result = await func(item)
+                await results.put(result)
+        except Exception as error:
+            await results.put(_WorkerError(error))
+        await results.put(done)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    try:
+        running = len(workers)
+        while running:
+            result = await results.get()
+            if result is done:
+                running -= 1
+            elif isinstance(result, _WorkerError):
+                raise result.error
+            else:
+                yield result
+    finally:
+        for task in workers:
+            task.cancel()
+
+
+def _bad_domain(raw_domain: str) -> dict:
+    return {'domain': raw_domain, 'result': False, 'message': 'Bad domain'}
+
+
+async def check_domain(raw_domain: Union[str, Domain],
+                       records: Sequence[str],
+                       dns: Sequence[str] = DNS_SERVERS,
+                       whois: bool = False, force: bool = False) -> dict:
+    """Dig the records and, optionally, whois the domain concurrently.
+    Dig results are grouped by record."""
+    if isinstance(raw_domain, Domain):
+        domain = raw_domain
+    else:
+        try:
+            domain = Domain(raw_domain)
+        except BadDomain:
+            return _bad_domain(raw_domain)
+
+    output = {'domain': domain.domain, 'result': True}
+
+    async def whois_task():
+        # Batches don't take more whois workers than there are, so the queue
+        # of the whois pool is left for interactive requests.
+        try:
+            async with global_limiter('whois', WHOIS_WORKERS):
+                return await domain.whois_json(force)
+        except (*WHOIS_ERRORS, WhoisBusy, WhoisTimeout) as error:
+            return {'message': str(error), 'result': False}
+
+    tasks = [domain.dig(list(records), dns, force=force)]
+    if whois:
+        tasks.append(whois_task())
+    results = await asyncio.gather(*tasks)
+    output['dig'] = results[0]
+    if whois:
+        output['whois'] = results[1]
+    return output
+
+
+async def run_batch(domains: Union[Iterable[str], AsyncIterable[str]],
+                    records: Sequence[str], dns: Sequence[str] = DNS_SERVERS,
+                    whois: bool = False, force: bool = False
+                    ) -> AsyncIterator[dict]:
+    """Check all the domains, at most BATCH_CONCURRENCY domains of all the
+    running batches are checked at once. Yields results as they complete.
+    Lists of domains are normalized at once and checked without duplicates,
+    bad domains are yielded first."""
+    if isinstance(domains, (list, tuple)):
+        domains, bad = Domain.from_many(domains)
+        for raw_domain in bad:
+            yield _bad_domain(raw_domain)
+    async for result in bounded_map(
+            lambda domain: check_domain(domain, records, dns, whois, force),
+            domains, BATCH_CONCURRENCY,
+            global_limiter('domains', BATCH_CONCURRENCY)
+    ):
+        yield result
+
+
+def read_lines(file: BinaryIO) -> Iterator[str]:
+    """Read domains from the file lazily, skips empty and comment lines."""
+    for line in file:
+        line = line.decode(errors='replace').strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f'Unexpected type {type(value)}')
+
+
+def to_ndjson(result: dict) -> str:
+    """Serialize result as one line of NDJSON."""
+    return json.dumps(result, ensure_ascii=False, default=_json_default) + '\n'
@@ -0,0 +1,326 @@
+import abc
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from constants import CACHE_BACKEND, CACHE_PATH, DIG_CACHE_SIZE
+from metrics import register_cache
+
+# Max time (sec) to wait for the SQLite file locked by another process. The
+# cache is used on the event loop, so the longer lock makes the lookup a miss
+# and the value is not stored.
+SQLITE_BUSY_TIMEOUT: float = 0.05
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one in-flight
+    coroutine, every caller gets the result of this coroutine."""
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable,
+                 factory: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if (future is None
+                or future.get_loop() is not asyncio.get_running_loop()):
+            future = asyncio.ensure_future(factory())
+            self._calls[key] = future
+
+            def forget(done: asyncio.Future) -> None:
+                if self._calls.get(key) is done:
+                    del self._calls[key]
+
+            future.add_done_callback(forget)
+        else:
+            self.coalesced += 1
+        # The shared call must not be cancelled by one of the waiters.
+        return await asyncio.shield(future)
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+class CacheBackend(abc.ABC):
+    """
+    Interface of the caches: at most `max_size` entries, the least recently
+    used ones are evicted, every entry expires after its own TTL.
+    Lookups of missing keys in the process are collapsed by the
+    `SingleFlight`. Counters are of the current process.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.single_flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @abc.abstractmethod
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        pass
+
+    @abc.abstractmethod
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Get the value without touching counters and LRU order."""
+
+    @abc.abstractmethod
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        pass
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    async def fetch(
+            self, key: Hashable,
+            factory: Callable[[], Awaitable[Tuple[Any, float]]],
+            force: bool = False
+    ) -> Any:
+        """Get the value from the cache, or await the `factory` which returns
+        the value with its TTL and put the value to the cache.
+        `force` - ignore the cached value and refresh it."""
+        if not force:
+            missing = object()
+            value = self.get(key, missing)
+            if value is not missing:
+                return value
+
+        async def fetch_and_set():
+            value, ttl = await factory()
+            self.set(key, value, ttl)
+            return value
+
+        return await self.single_flight.do(key, fetch_and_set)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'coalesced': self.single_flight.coalesced,
+            'in_flight': len(self.single_flight),
+        }
+
+
+class TTLCache(CacheBackend):
+    """Bounded in-memory LRU cache of the process."""
+
+    def __init__(self, max_size: int) -> None:
+        super().__init__(max_size)
+        self._data: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Get the value without touching counters and LRU order."""
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return default
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        if self.max_size <= 0 or ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache in the SQLite file shared by all the processes on the host, the
+    value fetched by one process is served to all. The file is in WAL mode,
+    so readers don't wait for the writer.
+    Keys and values are stored as JSON (tuples come back as lists), `dumps`
+    and `loads` may be given for other types.
+    Queries don't wait for the lock longer than SQLITE_BUSY_TIMEOUT, `busy`
+    counts the skipped ones.
+    """
+    # Share of `max_size` evicted over the excess.
+    EVICTION_SLACK: float = 0.01
+
+    def __init__(self, path: str, max_size: int, table: str = 'cache',
+                 dumps: Callable[[Any], str] = json.dumps,
+                 loads: Callable[[str], Any] = json.loads) -> None:
+        super().__init__(max_size)
+        self.path = path
+        self.table = table
+        self.dumps = dumps
+        self.loads = loads
+        self.busy = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        # Rows in the table, counted by `_evict` and kept up by the inserts
+        # of this process.
+        self._size: Optional[int] = None
+        self._slack = int(max_size * self.EVICTION_SLACK)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT,
+                                 check_same_thread=False,
+                                 isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                f'key TEXT PRIMARY KEY, expires_at REAL, used_at REAL, '
+                f'value TEXT)'
+            )
+            db.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_used_at '
+                       f'ON {self.table} (used_at)')
+            db.execute(f'DELETE FROM {self.table} WHERE expires_at <= ?',
+                       (time.time(),))
+            self._db = db
+        return self._db
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        return key if isinstance(key, str) else json.dumps(key)
+
+    def _execute(self, sql: str, parameters: tuple = ()
+                 ) -> Optional[sqlite3.Cursor]:
+        """Execute the query under `_lock`, None if the file is locked."""
+        try:
+            return self._connect().execute(sql, parameters)
+        except sqlite3.OperationalError:
+            self.busy += 1
+            return None
+
+    def _lookup(self, key: Hashable, touch: bool) -> Tuple[bool, Any]:
+        """(found, value) of the not expired entry."""
+        key = self._key(key)
+        now = time.time()
+        with self._lock:
+            cursor = self._execute(
+                f'SELECT expires_at, value FROM {self.table} WHERE key = ?',
+                (key,))
+            row = None if cursor is None else cursor.fetchone()
+            if row is None:
+                return False, None
+            if row[0] <= now:
+                if touch and self._execute(
+                        f'DELETE FROM {self.table} WHERE key = ?',
+                        (key,)) is not None:
+                    self.expirations += 1
+                return False, None
+            if touch:
+                self._execute(
+                    f'UPDATE {self.table} SET used_at = ? WHERE key = ?',
+                    (now, key))
+        return True, self.loads(row[1])
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        found, value = self._lookup(key, touch=True)
+        if not found:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        found, value = self._lookup(key, touch=False)
+        return value if found else default
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        if self.max_size <= 0 or ttl <= 0:
+            return
+        now = time.time()
+        value = self.dumps(value)
+        with self._lock:
+            if self._execute(
+                    f'INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)',
+                    (self._key(key), now + ttl, now, value)) is None:
+                return
+            # Replaced rows are counted as inserted, so the rows are
+            # counted again sooner than needed, never later.
+            if self._size is not None:
+                self._size += 1
+            if self._size is None or self._size > self.max_size:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Count the rows and evict the least recently used ones down to
+        `max_size` less `EVICTION_SLACK`, so the rows are counted once per
+        that many inserts, not on every insert."""
+        cursor = self._execute(f'SELECT COUNT(*) FROM {self.table}')
+        if cursor is None:
+            return
+        size = cursor.fetchone()[0]
+        if size > self.max_size:
+            cursor = self._execute(
+                f'DELETE FROM {self.table} WHERE key IN ('
+                f'SELECT key FROM {self.table} ORDER BY used_at LIMIT ?)',
+                (size - self.max_size + self._slack,))
+            if cursor is None:
+                return
+            size -= cursor.rowcount
+            self.evictions += cursor.rowcount
+        self._size = size
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._execute(f'DELETE FROM {self.table}') is not None:
+                self._size = 0
+
+    def __len__(self) -> int:
+        """Count of the not expired entries, the approximate count of the
+        rows if the file is locked."""
+        with self._lock:
+            cursor = self._execute(
+                f'SELECT COUNT(*) FROM {self.table} WHERE expires_at > ?',
+                (time.time(),))
+            if cursor is None:
+                return self._size or 0
+            return cursor.fetchone()[0]
+
+
+def create_cache(name: str, max_size: int, backend: str = CACHE_BACKEND,
+                 path: str = CACHE_PATH) -> CacheBackend:
+    """Cache of the CACHE_BACKEND, `name` is the table of the shared one."""
+    if backend == 'sqlite' and path and max_size > 0:
+        return SQLiteCache(path, max_size, table=name)
+    return TTLCache(max_size)
+
+
+dig_cache = create_cache('dig', DIG_CACHE_SIZE)
+register_cache('dig', dig_cache.stats)
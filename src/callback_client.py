@@ -0,0 +1,56 @@
+"""
+HTTP client of the watchlist callback URLs. The host of the callback URL is
+resolved once per connection: the addresses are checked and the connection
+is made to the checked ones, so the host can't be resolved to an internal
+address between the check and the request (DNS rebinding). TLS is verified
+by the host name of the URL as usual. The module is imported only by the
+notifications, so httpx doesn't slow down the startup.
+"""
+from typing import Awaitable, Callable, List, Optional
+
+import httpcore
+import httpx
+from httpcore.backends.auto import AutoBackend
+from httpcore.backends.base import AsyncNetworkBackend, AsyncNetworkStream
+
+# Resolves the host and port to the checked addresses, raises if the host
+# mustn't be connected to.
+Resolve = Callable[[str, int], Awaitable[List[str]]]
+
+
+class CheckedBackend(AsyncNetworkBackend):
+    """Network backend of httpcore which connects only to the addresses
+    returned by `resolve`."""
+
+    def __init__(self, resolve: Resolve) -> None:
+        self.resolve = resolve
+        self._backend = AutoBackend()
+
+    async def connect_tcp(self, host: str, port: int,
+                          timeout: Optional[float] = None,
+                          local_address: Optional[str] = None
+                          ) -> AsyncNetworkStream:
+        error = None
+        for address in await self.resolve(host, port):
+            try:
+                return await self._backend.connect_tcp(
+                    address, port, timeout=timeout,
+                    local_address=local_address)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as last:
+                error = last
+        raise error or httpcore.ConnectError(f'{host} has no addresses')
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+def create_client(resolve: Resolve, timeout: float) -> httpx.AsyncClient:
+    """Client which connects only to the addresses of `resolve`. Proxies of
+    the environment are not used: the proxy would resolve the host by
+    itself."""
+    transport = httpx.AsyncHTTPTransport(trust_env=False)
+    # httpx 0.23 doesn't take the network backend of httpcore, so it is set
+    # on the connection pool of the transport.
+    transport._pool._network_backend = CheckedBackend(resolve)
+    return httpx.AsyncClient(transport=transport, timeout=timeout,
+                             trust_env=False)
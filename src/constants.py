@@ -1,9 +1,19 @@
 import os
-from typing import Tuple
+from pathlib import Path
+from typing import Optional, Tuple
 
-from dotenv import load_dotenv
+BASE_DIR = Path(__file__).parent
 
-load_dotenv()
+# Settings are read from the environment, the `.env` file of the project (or
+# of its parents) is loaded only if there is one: containers get the settings
+# from the environment and don't pay for importing python-dotenv.
+ENV_FILE: Optional[Path] = next(
+    (path / '.env' for path in (BASE_DIR, *BASE_DIR.parents)
+     if (path / '.env').is_file()), None)
+if ENV_FILE is not None:
+    from dotenv import load_dotenv
+
+    load_dotenv(ENV_FILE)
 
 # WD Constants
 
@@ -17,18 +27,333 @@ ALLOWED_RECORDS: Tuple[str] = tuple(os.getenv(
 
 DEFAULT_TYPE: str = os.getenv('DEFAULT_TYPE', default='A')
 
+# Preset to dig all the COMMON_RECORDS at once.
+DIG_ALL_PRESET: str = 'ALL'
+
+COMMON_RECORDS: Tuple[str, ...] = tuple(
+    record for record in os.getenv(
+        'COMMON_RECORDS', default='A AAAA CNAME MX NS TXT SOA CAA').split()
+    if record in ALLOWED_RECORDS
+)
+
+# Pseudo record (and the bot button) to validate DNSSEC of the domain.
+DNSSEC_PRESET: str = 'DNSSEC'
+
 RECORDS_ON_KEYBOARD: Tuple[str, ...] = (
-    'A', 'AAAA', 'CNAME', 'TXT', 'MX', 'SOA'
+    'A', 'AAAA', 'CNAME', 'TXT', 'MX', 'SOA', DIG_ALL_PRESET, DNSSEC_PRESET
 )
 
 DIG_TIMEOUT: int = 3
 
+# `native` - in-process asyncio DNS client, `subprocess` - the `dig` program.
+DIG_BACKENDS: Tuple[str, ...] = ('native', 'subprocess')
+
+DIG_BACKEND: str = os.getenv('DIG_BACKEND', default='native')
+
+DNS_PORT: int = 53
+
+DNS_UDP_PAYLOAD_SIZE: int = 1232
+
+# How many times the UDP query is sent during DIG_TIMEOUT.
+DNS_UDP_TRIES: int = 3
+
+# Max shared UDP sockets to the DNS-servers, the servers are arbitrary in
+# API requests, so the sockets of the least recently used ones are closed.
+DNS_MAX_UPSTREAMS: int = 256
+
 SHELL_OUTPUT_ENCODING: str = 'utf-8'
 
+# Weight of the new value in EWMA of DNS-server latency and failure rate.
+DNS_HEALTH_ALPHA: float = 0.3
+
+# DNS-server is skipped for DNS_BREAKER_COOLDOWN seconds after
+# DNS_BREAKER_FAILURES failed queries in a row.
+DNS_BREAKER_FAILURES: int = int(os.getenv('DNS_BREAKER_FAILURES', default=3))
+DNS_BREAKER_COOLDOWN: int = int(os.getenv('DNS_BREAKER_COOLDOWN', default=30))
+
+# In the `fastest` dig mode the next DNS-server is queried if the previous one
+# doesn't answer during DNS_HEDGE_FACTOR * its average latency, but not less
+# than DNS_HEDGE_MIN_DELAY seconds.
+DNS_HEDGE_FACTOR: float = 2.0
+DNS_HEDGE_MIN_DELAY: float = 0.05
+
+# Public resolvers queried by the propagation check (`host` or `host#port`),
+# empty - the built-in list.
+PROPAGATION_SERVERS: Tuple[str, ...] = tuple((
+    os.getenv('PROPAGATION_SERVERS') or (
+        '8.8.8.8 8.8.4.4 1.1.1.1 1.0.0.1 9.9.9.9 149.112.112.112 '
+        '208.67.222.222 208.67.220.220 94.140.14.14 94.140.15.15 '
+        '185.228.168.9 185.228.169.9 76.76.2.0 76.76.10.0 4.2.2.1 4.2.2.2 '
+        '8.26.56.26 8.20.247.20 77.88.8.8 77.88.8.1 84.200.69.80 '
+        '74.82.42.42 185.222.222.222 45.11.45.11 194.242.2.2 '
+        '101.101.101.101 223.5.5.5 223.6.6.6 119.29.29.29 114.114.114.114'
+    )
+).split())
+
+# Max amount of resolvers queried by the propagation check at the same time.
+PROPAGATION_CONCURRENCY: int = int(
+    os.getenv('PROPAGATION_CONCURRENCY', default=50))
+
+# Max amount of resolvers of one propagation check requested by API.
+PROPAGATION_MAX_SERVERS: int = 500
+
+# The bot updates the propagation check message not more often (sec).
+PROPAGATION_EDIT_INTERVAL: float = 2.0
+
+# Where the dig answers are cached: `memory` - in the process, `sqlite` - in
+# the SQLite file CACHE_PATH shared by all the processes (API workers and the
+# telegram bot) on the host.
+CACHE_BACKENDS: Tuple[str, ...] = ('memory', 'sqlite')
+CACHE_BACKEND: str = os.getenv('CACHE_BACKEND', default='memory')
+CACHE_PATH: str = os.getenv(
+    'CACHE_PATH', default=str(BASE_DIR / 'data' / 'cache.sqlite3'))
+
+# Max amount of memoized punycode encodings and decodings of the IDNs.
+IDNA_CACHE_SIZE: int = 4096
+
+# Max amount of cached (domain, record, DNS-server) answers, 0 - disabled.
+DIG_CACHE_SIZE: int = int(os.getenv('DIG_CACHE_SIZE', default=10000))
+
+# Answers are cached according to their TTL, but no longer than this (sec).
+DIG_CACHE_MAX_TTL: int = int(os.getenv('DIG_CACHE_MAX_TTL', default=3600))
+
+# TTL for empty answers when the DNS-server doesn't send SOA record (sec).
+DIG_CACHE_NEGATIVE_TTL: int = int(
+    os.getenv('DIG_CACHE_NEGATIVE_TTL', default=60))
+
+# Whois results are fresh during this time (sec), then queried again.
+WHOIS_CACHE_TTL: int = int(os.getenv('WHOIS_CACHE_TTL', default=21600))
+
+# How long (sec) after WHOIS_CACHE_TTL the stale result can be served if the
+# whois query fails (registrar rate limit, network problems).
+WHOIS_CACHE_MAX_STALE: int = int(
+    os.getenv('WHOIS_CACHE_MAX_STALE', default=86400))
+
+# Max amount of whois results in memory.
+WHOIS_CACHE_SIZE: int = int(os.getenv('WHOIS_CACHE_SIZE', default=1000))
+
+# SQLite file for whois results shared by all the processes, empty - keep
+# results only in memory.
+WHOIS_CACHE_PATH: str = os.getenv(
+    'WHOIS_CACHE_PATH', default=str(BASE_DIR / 'data' / 'whois.sqlite3'))
+
+# Max amount of whois results in the SQLite file.
+WHOIS_CACHE_DISK_SIZE: int = int(
+    os.getenv('WHOIS_CACHE_DISK_SIZE', default=100000))
+
+# Max amount of whois queries running at once.
+WHOIS_WORKERS: int = int(os.getenv('WHOIS_WORKERS', default=8))
+
+# Max amount of whois queries waiting for a free worker, further queries are
+# rejected at once.
+WHOIS_QUEUE_SIZE: int = int(os.getenv('WHOIS_QUEUE_SIZE', default=32))
+
+# Max time (sec) to wait for the whois query result.
+WHOIS_TIMEOUT: int = int(os.getenv('WHOIS_TIMEOUT', default=20))
+
+# `native` - in-process asyncio WHOIS client, `subprocess` - the `whois`
+# library which runs the `whois` program.
+WHOIS_BACKENDS: Tuple[str, ...] = ('native', 'subprocess')
+
+WHOIS_BACKEND: str = os.getenv('WHOIS_BACKEND', default='native')
+
+WHOIS_PORT: int = 43
+
+# WHOIS-server (`host` or `host:port`) for all the queries instead of the
+# server of the TLD, referrals are not followed then. Empty - disabled.
+WHOIS_SERVER: str = os.getenv('WHOIS_SERVER', default='')
+
+# File of the TLD -> WHOIS-server map learned from IANA, empty - keep the map
+# only in memory.
+WHOIS_SERVERS_PATH: str = os.getenv(
+    'WHOIS_SERVERS_PATH',
+    default=str(BASE_DIR / 'data' / 'whois_servers.json'))
+
+# How long (sec) the WHOIS-server of the TLD is used before asking IANA again.
+WHOIS_SERVERS_TTL: int = int(
+    os.getenv('WHOIS_SERVERS_TTL', default=7 * 24 * 3600))
+
+# Max amount of referrals from the registry to the registrar WHOIS-server.
+WHOIS_MAX_REFERRALS: int = 1
+
+# Max amount of connections to one WHOIS-server at once and min interval
+# (sec) between the connections, registries ban frequent clients.
+WHOIS_SERVER_CONCURRENCY: int = int(
+    os.getenv('WHOIS_SERVER_CONCURRENCY', default=4))
+WHOIS_SERVER_INTERVAL: float = float(
+    os.getenv('WHOIS_SERVER_INTERVAL', default=0.1))
+
+# Max size of the WHOIS response (bytes).
+WHOIS_MAX_RESPONSE_SIZE: int = 2 ** 20
+
+# Source of the domain registration data: `rdap` - RDAP, WHOIS is the
+# fallback if the TLD has no RDAP-server or it fails, `whois` - WHOIS only.
+WHOIS_SOURCES: Tuple[str, ...] = ('rdap', 'whois')
+
+WHOIS_SOURCE: str = os.getenv('WHOIS_SOURCE', default='rdap')
+
+# IANA bootstrap file of the RDAP-servers of the TLDs and its local copy.
+RDAP_BOOTSTRAP_URL: str = 'https://data.iana.org/rdap/dns.json'
+RDAP_BOOTSTRAP_PATH: str = os.getenv(
+    'RDAP_BOOTSTRAP_PATH', default=str(BASE_DIR / 'data' / 'rdap_dns.json'))
+
+# How long (sec) the bootstrap file is used before downloading it again.
+RDAP_BOOTSTRAP_TTL: int = 24 * 3600
+
+# How long (sec) to wait before the next download of the bootstrap file after
+# the failed one, RDAP queries fall back to WHOIS at once meanwhile.
+RDAP_BOOTSTRAP_RETRY: int = 300
+
+# Max time (sec) to wait for the RDAP-server response.
+RDAP_TIMEOUT: int = int(os.getenv('RDAP_TIMEOUT', default=10))
+
+# Max amount of kept alive connections to one RDAP-server.
+RDAP_MAX_CONNECTIONS: int = int(os.getenv('RDAP_MAX_CONNECTIONS', default=10))
+
+# Max amount of domains checked at once by all the batch requests.
+BATCH_CONCURRENCY: int = int(os.getenv('BATCH_CONCURRENCY', default=50))
+
+# Max amount of domains of one batch API request and max size (bytes) of the
+# uploaded batch file.
+BATCH_MAX_DOMAINS: int = int(os.getenv('BATCH_MAX_DOMAINS', default=10000))
+BATCH_MAX_FILE_SIZE: int = int(
+    os.getenv('BATCH_MAX_FILE_SIZE', default=10 * 1024 * 1024))
+
+# Max amount of PTR queries of all the reverse DNS sweeps running at once.
+PTR_CONCURRENCY: int = int(os.getenv('PTR_CONCURRENCY', default=100))
+
+# Max amount of addresses of the network swept by API and by the bot.
+PTR_MAX_ADDRESSES: int = int(os.getenv('PTR_MAX_ADDRESSES', default=65536))
+PTR_BOT_MAX_ADDRESSES: int = 256
+
+# DS records of the root zone keys (KSK-2017 and KSK-2024) in presentation
+# format separated by `;`, the DNSSEC chain of trust starts from them.
+DNSSEC_TRUST_ANCHORS: Tuple[str, ...] = tuple(
+    anchor.strip() for anchor in (
+        os.getenv('DNSSEC_TRUST_ANCHORS')
+        or '20326 8 2 E06D44B80B8F1D39A95C0B0D7C65D08458E880409BBC683457104'
+           '237C7F8EC8D; 38696 8 2 683D2D0ACB8C9B712A1948B27F741219298D0A45'
+           '0D612C483AF444A4C0FB2B16'
+    ).split(';') if anchor.strip())
+
+# Max amount of validated zones (their keys or proofs of unsigned
+# delegations) kept until their TTL expires, 0 - disabled.
+DNSSEC_CACHE_SIZE: int = int(os.getenv('DNSSEC_CACHE_SIZE', default=10000))
+
+# SQLite file of the watched domains.
+WATCHLIST_PATH: str = os.getenv(
+    'WATCHLIST_PATH', default=str(BASE_DIR / 'data' / 'watchlist.sqlite3'))
+
+# Whether the process (API, telegram bot) checks the watched domains. Many
+# processes may check them at once, every domain is checked by one of them.
+WATCHLIST_SCHEDULER: bool = os.getenv(
+    'WATCHLIST_SCHEDULER', default='true').lower() in ('true', '1', 'yes')
+
+# How often (sec) the due domains are looked for, max amount of them checked
+# by one sweep, max amount of them checked at once and min interval (sec)
+# between the checks of one worker.
+WATCHLIST_SWEEP_INTERVAL: int = 60
+WATCHLIST_BATCH_SIZE: int = int(os.getenv('WATCHLIST_BATCH_SIZE', default=50))
+WATCHLIST_CONCURRENCY: int = int(
+    os.getenv('WATCHLIST_CONCURRENCY', default=2))
+WATCHLIST_QUERY_INTERVAL: float = float(
+    os.getenv('WATCHLIST_QUERY_INTERVAL', default=1))
+
+# The domain is taken by the process for this time (sec) to check it.
+WATCHLIST_LEASE: int = 600
+
+# (days before expiration, check interval in sec): the domain is checked the
+# more often the closer its expiration is.
+WATCHLIST_INTERVALS: Tuple[Tuple[int, int], ...] = (
+    (90, 7 * 24 * 3600),
+    (30, 3 * 24 * 3600),
+    (7, 24 * 3600),
+    (0, 6 * 3600),
+)
+# Check interval of the domains with unknown expiration date (sec) and of
+# the domains which check has failed.
+WATCHLIST_UNKNOWN_INTERVAL: int = 24 * 3600
+WATCHLIST_RETRY_INTERVAL: int = 3600
+
+# Notify the watchers when this amount of days before expiration is left.
+WATCHLIST_NOTIFY_DAYS: Tuple[int, ...] = (30, 7, 1)
+
+# Max amount of domains watched by one chat or callback URL.
+WATCHLIST_MAX_WATCHES: int = int(
+    os.getenv('WATCHLIST_MAX_WATCHES', default=100))
+
+# Callback URLs of the private, loopback and other non-public addresses are
+# refused unless it is allowed (local development).
+WATCHLIST_ALLOW_PRIVATE_CALLBACKS: bool = os.getenv(
+    'WATCHLIST_ALLOW_PRIVATE_CALLBACKS', default='false'
+).lower() in ('true', '1', 'yes')
+
+# Port of the metrics server of the telegram bot, 0 - disabled.
+METRICS_PORT: int = int(os.getenv('METRICS_PORT', default=0))
+
+# Tracing of the bot updates and API requests: `json` - finished requests
+# with their spans are written to TRACING_JSON_FILE (one JSON per line),
+# `otlp` - sent to the OpenTelemetry collector by OTLP/HTTP, empty - not
+# exported.
+TRACING_EXPORTERS: Tuple[str, ...] = ('json', 'otlp')
+TRACING_EXPORTER: str = os.getenv('TRACING_EXPORTER', default='')
+TRACING_JSON_FILE: str = os.getenv(
+    'TRACING_JSON_FILE', default=str(BASE_DIR / 'logs' / 'traces.ndjson'))
+TRACING_OTLP_ENDPOINT: str = os.getenv(
+    'TRACING_OTLP_ENDPOINT', default='http://localhost:4318/v1/traces')
+TRACING_SERVICE_NAME: str = os.getenv('TRACING_SERVICE_NAME',
+                                      default='whois-and-dig')
+
+# Part of the requests which are exported.
+TRACING_SAMPLE_RATE: float = float(
+    os.getenv('TRACING_SAMPLE_RATE', default=1))
+
+# Requests slower than this (sec) are logged with all their spans, 0 - not
+# logged, and the part of the slow requests which are logged.
+TRACING_SLOW_THRESHOLD: float = float(
+    os.getenv('TRACING_SLOW_THRESHOLD', default=5))
+TRACING_SLOW_SAMPLE_RATE: float = float(
+    os.getenv('TRACING_SLOW_SAMPLE_RATE', default=1))
+
+# Spans of one request over this amount are dropped (batches, sweeps).
+TRACING_MAX_SPANS: int = 1000
+
 # Telegram bot constants
 
 TOKEN: str = os.getenv('TOKEN')
 
-# Max callback_data len is 64 bytes (len of domain + ' CNAME' should be <= 64).
+# Max callback_data len is 64 bytes (domain + ' DNSSEC' should be <= 64).
 # https://core.telegram.org/bots/api#inlinekeyboardbutton
-MAX_DOMAIN_LEN_TO_BUTTONS: int = 58
+MAX_DOMAIN_LEN_TO_BUTTONS: int = 57
+
+# https://core.telegram.org/bots/api#sendmessage
+TG_MESSAGE_MAX_LENGTH: int = 4096
+
+# How the bot gets updates: `polling` - asks Telegram for them, `webhook` -
+# Telegram sends them to BOT_WEBHOOK_URL.
+BOT_MODES: Tuple[str, ...] = ('polling', 'webhook')
+BOT_MODE: str = os.getenv('BOT_MODE', default='polling')
+
+# Public URL of the webhook (it ends with BOT_WEBHOOK_PATH, if the webhook is
+# served by the API) and the secret token which Telegram sends with updates.
+BOT_WEBHOOK_URL: str = os.getenv('BOT_WEBHOOK_URL', default='')
+BOT_WEBHOOK_PATH: str = '/telegram/webhook'
+BOT_WEBHOOK_SECRET: str = os.getenv('BOT_WEBHOOK_SECRET', default='')
+
+# Address of the webhook server of the bot started alone.
+BOT_WEBHOOK_HOST: str = os.getenv('BOT_WEBHOOK_HOST', default='0.0.0.0')
+BOT_WEBHOOK_PORT: int = int(os.getenv('BOT_WEBHOOK_PORT', default=8443))
+
+# Max amount of updates processed at once, 0 - one by one.
+BOT_CONCURRENT_UPDATES: int = int(
+    os.getenv('BOT_CONCURRENT_UPDATES', default=32))
+
+# Requests (messages and buttons) per second of one chat and max burst of
+# them, 0 - no limit.
+BOT_RATE_LIMIT: float = float(os.getenv('BOT_RATE_LIMIT', default=0.5))
+BOT_RATE_BURST: int = int(os.getenv('BOT_RATE_BURST', default=5))
+
+# Dig messages sent by the bot are remembered during this time (sec), so the
+# message isn't edited if the new text is the same.
+BOT_SENT_MESSAGES_SIZE: int = 10000
+BOT_SENT_MESSAGES_TTL: int = 24 * 3600
@@ -0,0 +1,125 @@
+import asyncio
+import re
+from typing import List, Optional
+
+from constants import SHELL_OUTPUT_ENCODING
+from resolver import RCODE_VALUES, ResourceRecord
+
+STATUS_REGEXP = re.compile(r'status: (\w+)')
+# Quoted <character-string> or bare token of the rdata presentation form.
+TOKEN_REGEXP = re.compile(r'"((?:[^"\\]|\\.)*)"|(\S+)')
+ESCAPE_REGEXP = re.compile(r'\\(\d{3}|.)')
+
+
+def _unescape_char(match: re.Match) -> str:
+    escaped = match.group(1)
+    return chr(int(escaped)) if len(escaped) == 3 else escaped
+
+
+def unescape(text: str) -> str:
+    """Unescape `\\X` and `\\DDD` of the presentation form, the escaped
+    bytes are decoded as UTF-8."""
+    if '\\' not in text:
+        return text
+    text = ESCAPE_REGEXP.sub(_unescape_char, text)
+    try:
+        return text.encode('latin-1').decode('utf-8', errors='replace')
+    except UnicodeEncodeError:
+        return text
+
+
+def rdata_content(rdata: str) -> str:
+    """Human-readable value of the rdata: quotes are removed from the
+    <character-string>s, the strings are separated by space."""
+    if '"' not in rdata:
+        return rdata
+    if '\\' not in rdata:
+        # Without escapes the strings can't contain quotes, so odd parts
+        # are the strings if even parts are spaces between them.
+        parts = rdata.split('"')
+        if not ''.join(parts[::2]).strip():
+            return ' '.join(parts[1::2])
+    tokens = [
+        unescape(quoted) if quoted is not None else bare
+        for quoted, bare in (match.groups()
+                             for match in TOKEN_REGEXP.finditer(rdata))
+    ]
+    return ' '.join(tokens)
+
+
+class DigOutputParser:
+    """
+    Incremental parser of the `dig +noall +answer +authority +comments`
+    output. Blocks of lines are fed as they are read from the pipe, record
+    lines are parsed to `ResourceRecord` of the answer or the authority
+    section (by the section comment, answer if there is none) and the status
+    of the response is taken from the header comment. Comments, empty and
+    malformed lines are skipped.
+    """
+    __slots__ = ('encoding', 'rcode', 'answers', 'authority', 'skipped',
+                 '_section')
+    CHUNK_SIZE: int = 2 ** 16
+
+    def __init__(self, encoding: str = SHELL_OUTPUT_ENCODING) -> None:
+        self.encoding = encoding
+        self.rcode = 0
+        self.answers: List[ResourceRecord] = []
+        self.authority: List[ResourceRecord] = []
+        self.skipped = 0
+        self._section = self.answers
+
+    def feed(self, line: bytes) -> Optional[ResourceRecord]:
+        """Parse one line of the output, returns the record if it is the
+        record line."""
+        section = self._section
+        count = len(section)
+        self.feed_data(line)
+        return section[-1] if len(section) > count else None
+
+    def feed_data(self, data: bytes) -> None:
+        """Parse the block of complete lines. The block is decoded and split
+        at once, the per-line method calls made the parser twice as slow as
+        the parsing of the whole output."""
+        append = self._section.append
+        skipped = 0
+        for line in data.decode(self.encoding).splitlines():
+            if line[:1] == ';':
+                if line.startswith(';; ->>HEADER<<-'):
+                    status = STATUS_REGEXP.search(line)
+                    if status:
+                        self.rcode = RCODE_VALUES.get(
+                            status.group(1), self.rcode)
+                elif line.startswith(';; ANSWER SECTION:'):
+                    self._section = self.answers
+                    append = self.answers.append
+                elif line.startswith(';; AUTHORITY SECTION:'):
+                    self._section = self.authority
+                    append = self.authority.append
+                continue
+            fields = line.split(None, 4)
+            if len(fields) == 5:
+                name, ttl, rclass, rtype, rdata = fields
+                if ttl.isdigit():
+                    append(ResourceRecord(name, int(ttl), rclass, rtype,
+                                          rdata.rstrip()))
+                    continue
+            if fields:
+                skipped += 1
+        self.skipped += skipped
+
+    async def read(self, stream: asyncio.StreamReader) -> 'DigOutputParser':
+        """Feed the complete lines of the stream as the chunks arrive."""
+        tail = b''
+        while True:
+            chunk = await stream.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            end = chunk.rfind(b'\n') + 1
+            if not end:
+                tail += chunk
+                continue
+            self.feed_data(tail + chunk[:end])
+            tail = chunk[end:]
+        if tail:
+            self.feed_data(tail)
+        return self
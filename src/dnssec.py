@@ -0,0 +1,731 @@
+"""
+DNSSEC validation of the domain by its chain of trust. DNSKEY and DS records
+of all the zones from the root to the domain are fetched concurrently (with
+RRSIG, NSEC and NSEC3 records) through the DNS-servers, the signatures are
+verified by `cryptography` from the root trust anchors down to the records
+of the domain. Every zone of the chain is `validated`, `insecure` (delegation
+without DS records, or only unsupported algorithms), `bogus` (missing or
+wrong signatures, keys which don't match the DS records) or `indeterminate`
+(the DNS-servers didn't answer or answered with an error). Malformed
+RRSIG, NSEC and NSEC3 records prove nothing, so their RRsets are bogus.
+Validated keys and proofs of the unsigned delegations are cached by their
+TTL, so the next domains of the same zones need only their own records.
+
+Simplifications: the proofs of nonexistence check the NSEC/NSEC3 record
+which matches or covers the name, without the wildcard and closest encloser
+proofs; CNAME targets are not followed.
+"""
+import asyncio
+import base64
+import binascii
+import functools
+import hashlib
+import struct
+import time
+from typing import (Callable, Dict, Iterable, List, NamedTuple, Optional,
+                    Sequence, Set, Tuple)
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import (
+    encode_dss_signature)
+
+import messages
+from cache import create_cache
+from constants import (DEFAULT_TYPE, DIG_CACHE_MAX_TTL, DNS_SERVERS,
+                       DNSSEC_CACHE_SIZE, DNSSEC_TRUST_ANCHORS)
+from exceptions import DNSQueryError
+from health import upstreams
+from metrics import register_cache
+from resolver import (HEADER, MAX_COMPRESSION_POINTERS, QUESTION_FIXED,
+                      RCODE_VALUES, RCODES, RECORD_TYPES, RR_FIXED,
+                      parse_server, resolver)
+
+VALIDATED: str = 'validated'
+INSECURE: str = 'insecure'
+BOGUS: str = 'bogus'
+INDETERMINATE: str = 'indeterminate'
+
+# Results of the steps of the chain which are not zones: the name is not a
+# zone cut, the name doesn't exist.
+_NOT_CUT: str = 'not cut'
+_NXDOMAIN: str = 'nxdomain'
+
+# What the NSEC or NSEC3 record proves about the name.
+_NODATA: str = 'nodata'
+_DELEGATION: str = 'delegation'
+_OPT_OUT: str = 'opt-out'
+
+CLASS_IN: int = 1
+TYPE_NS: int = RECORD_TYPES['NS']
+TYPE_CNAME: int = RECORD_TYPES['CNAME']
+TYPE_SOA: int = RECORD_TYPES['SOA']
+TYPE_DS: int = RECORD_TYPES['DS']
+TYPE_RRSIG: int = RECORD_TYPES['RRSIG']
+TYPE_NSEC: int = RECORD_TYPES['NSEC']
+TYPE_DNSKEY: int = RECORD_TYPES['DNSKEY']
+TYPE_NSEC3: int = RECORD_TYPES['NSEC3']
+
+# Flag of the DNSKEY which signs the zone records.
+DNSKEY_ZONE_FLAG: int = 0x0100
+DNSKEY_PROTOCOL: int = 3
+NSEC3_OPT_OUT_FLAG: int = 0x01
+NSEC3_SHA1: int = 1
+# NSEC3 records with more iterations are ignored (RFC 9276).
+NSEC3_MAX_ITERATIONS: int = 150
+
+# Fixed part of RRSIG rdata: type covered, algorithm, labels, original TTL,
+# expiration, inception and key tag.
+RRSIG_FIXED = struct.Struct('!HBBIIIH')
+# Key tag, algorithm and digest type.
+DS_FIXED = struct.Struct('!HBB')
+# Flags, protocol and algorithm.
+DNSKEY_FIXED = struct.Struct('!HBB')
+
+# Types which embedded names are decompressed and lowercased in the
+# canonical form (RFC 4034 section 6.2): offsets of the names in rdata.
+_RDATA_NAMES: Dict[int, Tuple[int, int]] = {
+    RECORD_TYPES['NS']: (0, 1), RECORD_TYPES['CNAME']: (0, 1),
+    RECORD_TYPES['PTR']: (0, 1), RECORD_TYPES['DNAME']: (0, 1),
+    RECORD_TYPES['MX']: (2, 1), RECORD_TYPES['SRV']: (6, 1),
+    RECORD_TYPES['SOA']: (0, 2), TYPE_RRSIG: (RRSIG_FIXED.size, 1),
+}
+
+_B32HEX_TO_B32 = bytes.maketrans(b'0123456789abcdefghijklmnopqrstuv',
+                                 b'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567')
+
+# Domain name as lowercase labels from the leftmost one, the root is ().
+Name = Tuple[bytes, ...]
+
+# Errors of reading the malformed rdata.
+RDATA_ERRORS = (struct.error, IndexError, DNSQueryError)
+
+dnssec_cache = create_cache('dnssec', DNSSEC_CACHE_SIZE)
+register_cache('dnssec', dnssec_cache.stats)
+
+
+class Record(NamedTuple):
+    """Resource record with rdata in the canonical wire form."""
+    name: Name
+    rtype: int
+    ttl: int
+    rdata: bytes
+
+
+def to_name(domain: str) -> Name:
+    """Name of the ASCII (punycode) domain."""
+    return tuple(label.encode('ascii').lower()
+                 for label in domain.rstrip('.').split('.') if label)
+
+
+def name_text(name: Name) -> str:
+    return '.'.join(
+        label.decode('ascii', 'backslashreplace') for label in name) + '.'
+
+
+def name_wire(name: Name) -> bytes:
+    return b''.join(bytes([len(label)]) + label for label in name) + b'\x00'
+
+
+def _is_subdomain(name: Name, zone: Name) -> bool:
+    return len(name) >= len(zone) and name[len(name) - len(zone):] == zone
+
+
+def _canonical_key(name: Name) -> Name:
+    """Sort key of the canonical order of the names (RFC 4034 section
+    6.1)."""
+    return name[::-1]
+
+
+def _covers(owner, next_owner, value) -> bool:
+    """Whether the value is between the owner and the next owner of NSEC or
+    NSEC3 record, the last record of the zone wraps to the first one."""
+    if owner < next_owner:
+        return owner < value < next_owner
+    return value > owner or value < next_owner
+
+
+# Signature algorithms
+
+
+def _ecdsa_verify(curve: ec.EllipticCurve,
+                  hash_algorithm: hashes.HashAlgorithm, key: bytes,
+                  signature: bytes, data: bytes) -> bool:
+    """ECDSA signature (r and s) of DNSSEC (RFC 6605), the key is x and y
+    of the public point."""
+    size = (curve.key_size + 7) // 8
+    if len(key) != 2 * size or len(signature) != 2 * size:
+        return False
+    try:
+        public = ec.EllipticCurvePublicKey.from_encoded_point(
+            curve, b'\x04' + key)
+        public.verify(encode_dss_signature(
+            int.from_bytes(signature[:size], 'big'),
+            int.from_bytes(signature[size:], 'big')),
+            data, ec.ECDSA(hash_algorithm))
+    except (ValueError, InvalidSignature):
+        return False
+    return True
+
+
+def _rsa_verify(hash_algorithm: hashes.HashAlgorithm, key: bytes,
+                signature: bytes, data: bytes) -> bool:
+    """RSA PKCS#1 v1.5 signature, the key is exponent length, exponent and
+    modulus (RFC 3110)."""
+    if len(key) < 3:
+        return False
+    if key[0]:
+        exponent_start, exponent_end = 1, 1 + key[0]
+    else:
+        exponent_start = 3
+        exponent_end = 3 + int.from_bytes(key[1:3], 'big')
+    exponent = int.from_bytes(key[exponent_start:exponent_end], 'big')
+    modulus = int.from_bytes(key[exponent_end:], 'big')
+    try:
+        public = rsa.RSAPublicNumbers(exponent, modulus).public_key()
+        public.verify(signature, data, padding.PKCS1v15(), hash_algorithm)
+    except (ValueError, InvalidSignature):
+        return False
+    return True
+
+
+def _ed25519_verify(key: bytes, signature: bytes, data: bytes) -> bool:
+    try:
+        ed25519.Ed25519PublicKey.from_public_bytes(key).verify(
+            signature, data)
+    except (ValueError, InvalidSignature):
+        return False
+    return True
+
+
+# Verifiers of the DNSSEC algorithms: (key, signature, data) -> valid.
+ALGORITHMS: Dict[int, Callable[[bytes, bytes, bytes], bool]] = {
+    5: functools.partial(_rsa_verify, hashes.SHA1()),
+    7: functools.partial(_rsa_verify, hashes.SHA1()),
+    8: functools.partial(_rsa_verify, hashes.SHA256()),
+    10: functools.partial(_rsa_verify, hashes.SHA512()),
+    13: functools.partial(_ecdsa_verify, ec.SECP256R1(), hashes.SHA256()),
+    14: functools.partial(_ecdsa_verify, ec.SECP384R1(), hashes.SHA384()),
+    15: _ed25519_verify,
+}
+
+# DS digest types.
+DIGESTS: Dict[int, str] = {1: 'sha1', 2: 'sha256', 4: 'sha384'}
+
+
+# Wire format
+
+
+def _read_name(data: bytes, offset: int) -> Tuple[Name, int]:
+    """Read (possibly compressed) name, returns the lowercase name and the
+    offset right after it."""
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        length = data[offset]
+        if length & 0xc0 == 0xc0:
+            if jumps >= MAX_COMPRESSION_POINTERS:
+                raise DNSQueryError('Compression pointers loop')
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3f) << 8) | data[offset + 1]
+            jumps += 1
+            continue
+        offset += 1
+        if not length:
+            break
+        labels.append(data[offset:offset + length].lower())
+        offset += length
+    return tuple(labels), end if end is not None else offset
+
+
+def _canonical_rdata(data: bytes, offset: int, length: int,
+                     rtype: int) -> bytes:
+    """Rdata with the embedded names decompressed and lowercased."""
+    if rtype not in _RDATA_NAMES:
+        return data[offset:offset + length]
+    names_offset, count = _RDATA_NAMES[rtype]
+    end = offset + length
+    rdata = [data[offset:offset + names_offset]]
+    position = offset + names_offset
+    try:
+        for _ in range(count):
+            name, position = _read_name(data, position)
+            rdata.append(name_wire(name))
+    except RDATA_ERRORS:
+        position = end + 1
+    if position > end:
+        # The names don't fit in the rdata: it is kept as it is, so the
+        # record doesn't match anything.
+        return data[offset:end]
+    rdata.append(data[position:end])
+    return b''.join(rdata)
+
+
+def _read_records(data: bytes, offset: int, count: int
+                  ) -> Tuple[List[Record], int]:
+    records = []
+    for _ in range(count):
+        name, offset = _read_name(data, offset)
+        rtype, rclass, ttl, length = RR_FIXED.unpack_from(data, offset)
+        offset += RR_FIXED.size
+        if offset + length > len(data):
+            raise DNSQueryError('Truncated resource record')
+        if rclass == CLASS_IN:
+            records.append(Record(name, rtype, ttl, _canonical_rdata(
+                data, offset, length, rtype)))
+        offset += length
+    return records, offset
+
+
+def parse_message(data: bytes) -> Tuple[int, List[Record], List[Record]]:
+    """Rcode, answer and authority records of the wire-format response."""
+    try:
+        _, flags, qdcount, ancount, nscount, _ = HEADER.unpack_from(data)
+        offset = HEADER.size
+        for _ in range(qdcount):
+            offset = _read_name(data, offset)[1] + QUESTION_FIXED.size
+        answers, offset = _read_records(data, offset, ancount)
+        authority, _ = _read_records(data, offset, nscount)
+    except (struct.error, IndexError) as error:
+        raise DNSQueryError(f'Malformed DNS response: {error}') from error
+    return flags & 0x000f, answers, authority
+
+
+def _group(records: Iterable[Record]
+           ) -> Tuple[Dict[Tuple[Name, int], List[Record]],
+                      Dict[Tuple[Name, int], List[Record]]]:
+    """RRsets by (owner, type) and their RRSIG records by (owner, type
+    covered)."""
+    rrsets = {}
+    signatures = {}
+    for record in records:
+        if record.rtype == TYPE_RRSIG:
+            if len(record.rdata) <= RRSIG_FIXED.size:
+                continue
+            covered, = struct.unpack_from('!H', record.rdata)
+            signatures.setdefault((record.name, covered), []).append(record)
+        else:
+            rrsets.setdefault((record.name, record.rtype), []).append(record)
+    return rrsets, signatures
+
+
+# Keys and signatures
+
+
+def key_tag(dnskey: bytes) -> int:
+    """Key tag of DNSKEY rdata (RFC 4034 appendix B)."""
+    total = sum(byte if index & 1 else byte << 8
+                for index, byte in enumerate(dnskey))
+    return (total + (total >> 16)) & 0xffff
+
+
+def ds_digest(owner: Name, dnskey: bytes, digest_type: int) -> bytes:
+    return hashlib.new(DIGESTS[digest_type],
+                       name_wire(owner) + dnskey).digest()
+
+
+def ds_matches(owner: Name, dnskey: bytes, ds: bytes) -> bool:
+    """Whether the DS rdata is of the DNSKEY rdata."""
+    tag, algorithm, digest_type = DS_FIXED.unpack_from(ds)
+    return (tag == key_tag(dnskey) and algorithm == dnskey[3]
+            and digest_type in DIGESTS
+            and ds_digest(owner, dnskey, digest_type) == ds[DS_FIXED.size:])
+
+
+def rrset_signed_data(rrsig_head: bytes, owner: Name, rtype: int, ttl: int,
+                      rdatas: Iterable[bytes]) -> bytes:
+    """Data signed by RRSIG: its rdata without the signature and the RRset
+    in the canonical form and order (RFC 4034 section 3.1.8.1)."""
+    prefix = name_wire(owner) + struct.pack('!HHI', rtype, CLASS_IN, ttl)
+    return rrsig_head + b''.join(
+        prefix + struct.pack('!H', len(rdata)) + rdata
+        for rdata in sorted(set(rdatas)))
+
+
+def verify_rrset(owner: Name, rtype: int, records: Sequence[Record],
+                 signatures: Sequence[Record], keys: Sequence[bytes],
+                 zone: Name, now: int) -> bool:
+    """Whether any of the RRSIG records of the zone, valid at `now`, is
+    the signature of the RRset by one of the keys."""
+    for signature in signatures:
+        rdata = signature.rdata
+        try:
+            (covered, algorithm, labels, original_ttl, expiration, inception,
+             tag) = RRSIG_FIXED.unpack_from(rdata)
+            signer, position = _read_name(rdata, RRSIG_FIXED.size)
+        except RDATA_ERRORS:
+            continue
+        if (covered != rtype or signer != zone or algorithm not in ALGORITHMS
+                or labels > len(owner)
+                or not inception <= now <= expiration):
+            continue
+        # The record expanded from the wildcard is signed as the wildcard.
+        signed_owner = owner if labels == len(owner) else (
+            (b'*',) + owner[len(owner) - labels:])
+        data = rrset_signed_data(rdata[:position], signed_owner, rtype,
+                                 original_ttl,
+                                 (record.rdata for record in records))
+        for key in keys:
+            flags, protocol, key_algorithm = DNSKEY_FIXED.unpack_from(key)
+            if (key_algorithm == algorithm and flags & DNSKEY_ZONE_FLAG
+                    and protocol == DNSKEY_PROTOCOL and key_tag(key) == tag
+                    and ALGORITHMS[algorithm](
+                        key[4:], rdata[position:], data)):
+                return True
+    return False
+
+
+def _bitmap_types(bitmap: bytes) -> Set[int]:
+    """Types of the NSEC or NSEC3 type bitmap."""
+    types = set()
+    offset = 0
+    while offset + 2 <= len(bitmap):
+        window, length = bitmap[offset], bitmap[offset + 1]
+        for index, byte in enumerate(bitmap[offset + 2:offset + 2 + length]):
+            for bit in range(8):
+                if byte & (0x80 >> bit):
+                    types.add(window * 256 + index * 8 + bit)
+        offset += 2 + length
+    return types
+
+
+def _types_proof(types: Set[int], rtype: int) -> Optional[str]:
+    """What the types of the existing name prove about `rtype`."""
+    if rtype in types or TYPE_CNAME in types:
+        return None
+    if TYPE_NS in types and TYPE_SOA not in types:
+        return _DELEGATION
+    return _NODATA
+
+
+def nsec3_hash(name: Name, salt: bytes, iterations: int) -> bytes:
+    digest = hashlib.sha1(name_wire(name) + salt).digest()
+    for _ in range(iterations):
+        digest = hashlib.sha1(digest + salt).digest()
+    return digest
+
+
+def _nsec_proof(record: Record, name: Name, rtype: int) -> Optional[str]:
+    next_name, position = _read_name(record.rdata, 0)
+    if record.name == name:
+        return _types_proof(_bitmap_types(record.rdata[position:]), rtype)
+    if _covers(_canonical_key(record.name), _canonical_key(next_name),
+               _canonical_key(name)):
+        # The next name under the name: it is an empty non-terminal.
+        if _is_subdomain(next_name, name):
+            return _NODATA
+        return _NXDOMAIN
+    return None
+
+
+def _nsec3_proof(record: Record, name: Name, rtype: int) -> Optional[str]:
+    rdata = record.rdata
+    algorithm, flags, iterations, salt_length = struct.unpack_from(
+        '!BBHB', rdata)
+    if algorithm != NSEC3_SHA1 or iterations > NSEC3_MAX_ITERATIONS:
+        return None
+    position = 5 + salt_length
+    salt = rdata[5:position]
+    hash_end = position + 1 + rdata[position]
+    next_hash = rdata[position + 1:hash_end]
+    if hash_end > len(rdata):
+        raise IndexError('NSEC3 next hash is out of the rdata')
+    try:
+        owner_hash = base64.b32decode(record.name[0].translate(
+            _B32HEX_TO_B32))
+    except (binascii.Error, IndexError):
+        return None
+    hashed = nsec3_hash(name, salt, iterations)
+    if hashed == owner_hash:
+        return _types_proof(_bitmap_types(rdata[hash_end:]), rtype)
+    if _covers(owner_hash, next_hash, hashed):
+        return _OPT_OUT if flags & NSEC3_OPT_OUT_FLAG else _NXDOMAIN
+    return None
+
+
+def _denial(name: Name, rtype: int, authority: Sequence[Record],
+            keys: Sequence[bytes], zone: Name, now: int
+            ) -> Tuple[Optional[str], int]:
+    """What the signed NSEC or NSEC3 records of the negative answer prove
+    about the type of the name, None if nothing is proven, and the TTL of
+    the proof."""
+    rrsets, signatures = _group(authority)
+    for (owner, owner_type), records in rrsets.items():
+        if owner_type not in (TYPE_NSEC, TYPE_NSEC3) or not (
+                _is_subdomain(owner, zone)) or not verify_rrset(
+                owner, owner_type, records,
+                signatures.get((owner, owner_type), ()), keys, zone, now):
+            continue
+        for record in records:
+            try:
+                if owner_type == TYPE_NSEC:
+                    proof = _nsec_proof(record, name, rtype)
+                else:
+                    proof = _nsec3_proof(record, name, rtype)
+            except RDATA_ERRORS:
+                continue
+            if proof is not None:
+                return proof, record.ttl
+    return None, 0
+
+
+def parse_trust_anchors(anchors: Iterable[str] = DNSSEC_TRUST_ANCHORS
+                        ) -> List[bytes]:
+    """DS rdata of the trust anchors in presentation format."""
+    result = []
+    for anchor in anchors:
+        tag, algorithm, digest_type, *digest = anchor.split()
+        result.append(DS_FIXED.pack(int(tag), int(algorithm),
+                                    int(digest_type))
+                      + bytes.fromhex(''.join(digest)))
+    return result
+
+
+# Chain of trust
+
+# Answers which are validated, other rcodes (SERVFAIL, REFUSED) mean the
+# server can't answer.
+_ANSWER_RCODES: Tuple[int, ...] = (RCODE_VALUES['NOERROR'],
+                                   RCODE_VALUES['NXDOMAIN'])
+
+
+def _step(status: str, reason: Optional[str] = None,
+          keys: Sequence[bytes] = (), ttl: int = 0) -> dict:
+    """Result of the step of the chain: the zone status, its keys (hex) if
+    it is validated, and the TTL to cache it."""
+    return {'status': status, 'reason': reason,
+            'keys': [key.hex() for key in keys], 'ttl': ttl}
+
+
+def _keys_step(zone: Name, answers: Sequence[Record],
+               ds_records: Sequence[bytes], ttl: int, now: int) -> dict:
+    """Validate the DNSKEY RRset of the zone by the DS records of the
+    parent (or the trust anchors)."""
+    supported = [ds for ds in ds_records if len(ds) > DS_FIXED.size
+                 and ds[2] in ALGORITHMS and ds[3] in DIGESTS]
+    if not supported:
+        return _step(INSECURE, messages.DNSSEC_UNSUPPORTED, ttl=ttl)
+    rrsets, signatures = _group(answers)
+    dnskeys = rrsets.get((zone, TYPE_DNSKEY), [])
+    keys = [record.rdata for record in dnskeys
+            if len(record.rdata) > DNSKEY_FIXED.size]
+    entry_keys = [key for key in keys
+                  if any(ds_matches(zone, key, ds) for ds in supported)]
+    if not entry_keys:
+        return _step(BOGUS, messages.DNSSEC_NO_KEYS)
+    if not verify_rrset(zone, TYPE_DNSKEY, dnskeys,
+                        signatures.get((zone, TYPE_DNSKEY), ()), entry_keys,
+                        zone, now):
+        return _step(BOGUS, messages.DNSSEC_BAD_SIGNATURE.format('DNSKEY'))
+    ttl = min([ttl, *(record.ttl for record in dnskeys)])
+    return _step(VALIDATED, keys=keys, ttl=ttl)
+
+
+class _Chain:
+    """Validation of one domain: the queries are started at once and
+    awaited in the order of the chain."""
+
+    def __init__(self, servers: Sequence[str], trust_anchors: Sequence[str],
+                 now: int) -> None:
+        self.servers = servers
+        self.trust_anchors = trust_anchors
+        self.now = now
+        self.queries: Dict[Tuple[Name, str], asyncio.Future] = {}
+
+    async def _fetch(self, name: Name, record: str
+                     ) -> Tuple[int, List[Record], List[Record]]:
+        """Query the servers in order of their latency until one
+        answers."""
+        error = DNSQueryError(messages.DNSSEC_NO_ANSWER)
+        for server in upstreams.rank(self.servers):
+            health = upstreams.get(server)
+            started = time.monotonic()
+            try:
+                data = await resolver.exchange(
+                    name_text(name), record, *parse_server(server),
+                    dnssec=True)
+            except DNSQueryError as query_error:
+                health.record_failure(query_error)
+                error = query_error
+                continue
+            health.record_success(time.monotonic() - started)
+            message = parse_message(data)
+            if message[0] in _ANSWER_RCODES:
+                return message
+            error = DNSQueryError(
+                f'{server}: {RCODES.get(message[0], message[0])}')
+        raise error
+
+    def query(self, name: Name, record: str) -> asyncio.Future:
+        key = (name, record)
+        if key not in self.queries:
+            self.queries[key] = asyncio.ensure_future(
+                self._fetch(name, record))
+        return self.queries[key]
+
+    def close(self) -> None:
+        for future in self.queries.values():
+            if not future.done():
+                future.cancel()
+            elif not future.cancelled():
+                # Errors of the queries which are not needed anymore.
+                future.exception()
+
+    async def root_step(self) -> dict:
+        _, answers, _ = await self.query((), 'DNSKEY')
+        return _keys_step((), answers,
+                          parse_trust_anchors(self.trust_anchors),
+                          DIG_CACHE_MAX_TTL, self.now)
+
+    async def delegation_step(self, name: Name, zone: Name,
+                              keys: Sequence[bytes]) -> dict:
+        """Whether the name is the signed zone, the unsigned delegation or
+        not a zone cut, by its DS records signed in the parent `zone`."""
+        _, answers, authority = await self.query(name, 'DS')
+        rrsets, signatures = _group(answers)
+        ds_records = rrsets.get((name, TYPE_DS))
+        if ds_records:
+            if not verify_rrset(name, TYPE_DS, ds_records,
+                                signatures.get((name, TYPE_DS), ()), keys,
+                                zone, self.now):
+                return _step(BOGUS, messages.DNSSEC_BAD_SIGNATURE.format('DS'))
+            _, key_answers, _ = await self.query(name, 'DNSKEY')
+            return _keys_step(
+                name, key_answers, [record.rdata for record in ds_records],
+                min(record.ttl for record in ds_records), self.now)
+        cname = rrsets.get((name, TYPE_CNAME))
+        if cname and verify_rrset(name, TYPE_CNAME, cname,
+                                  signatures.get((name, TYPE_CNAME), ()),
+                                  keys, zone, self.now):
+            # Zone cuts can't have CNAME.
+            return _step(_NOT_CUT, ttl=min(record.ttl for record in cname))
+        proof, ttl = _denial(name, TYPE_DS, authority, keys, zone, self.now)
+        if proof is None:
+            return _step(BOGUS, messages.DNSSEC_NO_PROOF.format('DS'))
+        if proof in (_DELEGATION, _OPT_OUT):
+            return _step(INSECURE, messages.DNSSEC_NO_DS, ttl=ttl)
+        if proof == _NXDOMAIN:
+            return _step(_NXDOMAIN, ttl=ttl)
+        return _step(_NOT_CUT, ttl=ttl)
+
+    async def record_status(self, name: Name, record: str, zone: Name,
+                            keys: Sequence[bytes]) -> dict:
+        """Validate the RRset of the name (or the proof that there is no
+        such RRset) by the keys of its zone."""
+        try:
+            _, answers, authority = await self.query(name, record)
+        except DNSQueryError:
+            return {'status': INDETERMINATE,
+                    'reason': messages.DNSSEC_NO_ANSWER}
+        rtype = RECORD_TYPES[record]
+        rrsets, signatures = _group(answers)
+        for covered in (rtype, TYPE_CNAME):
+            rrset = rrsets.get((name, covered))
+            if not rrset:
+                continue
+            if verify_rrset(name, covered, rrset,
+                            signatures.get((name, covered), ()), keys, zone,
+                            self.now):
+                return {'status': VALIDATED, 'reason': None}
+            return {'status': BOGUS,
+                    'reason': messages.DNSSEC_BAD_SIGNATURE.format(record)}
+        proof, _ = _denial(name, rtype, authority, keys, zone, self.now)
+        if proof in (_NODATA, _NXDOMAIN):
+            return {'status': VALIDATED, 'reason': messages.DNSSEC_NO_RECORDS}
+        if proof == _OPT_OUT:
+            return {'status': INSECURE, 'reason': messages.DNSSEC_NO_DS}
+        return {'status': BOGUS,
+                'reason': messages.DNSSEC_NO_PROOF.format(record)}
+
+
+def _cache_key(name: Name, servers: Sequence[str],
+               trust_anchors: Sequence[str]) -> tuple:
+    return name_text(name), *servers, *trust_anchors
+
+
+async def validate(domain: str, records: Sequence[str] = (DEFAULT_TYPE,),
+                   dns: Sequence[str] = DNS_SERVERS, force: bool = False,
+                   trust_anchors: Sequence[str] = DNSSEC_TRUST_ANCHORS
+                   ) -> dict:
+    """Validate the chain of trust of the (punycode) domain and its records.
+    `zones` of the output are the zones of the chain from the root: their
+    status, the reason if they are not validated and the key tags;
+    `records` - the status of every record; `status` - the status of the
+    domain: the status of the chain, or the worst status of the records if
+    the chain is validated.
+    `force` - don't use the cached zones.
+    `trust_anchors` - DS records of the root keys in presentation format."""
+    name = to_name(domain)
+    servers = tuple(dns)
+    chain = _Chain(servers, trust_anchors, int(time.time()))
+    ancestors = [name[index:] for index in range(len(name), -1, -1)]
+
+    steps = {}
+    for ancestor in ancestors:
+        steps[ancestor] = None if force else dnssec_cache.get(
+            _cache_key(ancestor, servers, trust_anchors))
+        if steps[ancestor] is None:
+            chain.query(ancestor, 'DNSKEY')
+            if ancestor:
+                chain.query(ancestor, 'DS')
+    for record in records:
+        chain.query(name, record)
+
+    zones = []
+    # Validated zones of the chain: (zone, keys).
+    trusted: List[Tuple[Name, List[bytes]]] = []
+    try:
+        for ancestor in ancestors:
+            step = steps[ancestor]
+            if step is None:
+                try:
+                    if not ancestor:
+                        step = await chain.root_step()
+                    else:
+                        step = await chain.delegation_step(
+                            ancestor, *trusted[-1])
+                except DNSQueryError:
+                    step = _step(INDETERMINATE, messages.DNSSEC_NO_ANSWER)
+                dnssec_cache.set(
+                    _cache_key(ancestor, servers, trust_anchors), step,
+                    min(step['ttl'], DIG_CACHE_MAX_TTL))
+            if step['status'] == _NOT_CUT:
+                continue
+            if step['status'] == _NXDOMAIN:
+                break
+            keys = [bytes.fromhex(key) for key in step['keys']]
+            zones.append({
+                'zone': name_text(ancestor),
+                'status': step['status'],
+                'reason': step['reason'],
+                'keys': sorted({key_tag(key) for key in keys}),
+            })
+            if step['status'] != VALIDATED:
+                break
+            trusted.append((ancestor, keys))
+
+        status = zones[-1]['status'] if zones else INDETERMINATE
+        results = {}
+        for record in records:
+            if status != VALIDATED:
+                results[record] = {'status': status, 'reason': None}
+                continue
+            # DS records of the zone apex are signed by the parent zone.
+            zone, keys = trusted[-1]
+            if record == 'DS' and zone == name and len(trusted) > 1:
+                zone, keys = trusted[-2]
+            results[record] = await chain.record_status(
+                name, record, zone, keys)
+    finally:
+        chain.close()
+
+    if status == VALIDATED:
+        for worst in (BOGUS, INDETERMINATE, INSECURE):
+            if any(result['status'] == worst for result in results.values()):
+                status = worst
+                break
+    return {'domain': domain, 'status': status, 'zones': zones,
+            'records': results}
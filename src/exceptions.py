@@ -6,3 +6,63 @@ class BadDomain(Exception):
 class BotWrongInput(Exception):
     """Raises when the user inputted message is invalid."""
     pass
+
+
+class DNSQueryError(Exception):
+    """Raises when the DNS-server can't be queried or returns the malformed
+    response."""
+    pass
+
+
+class DNSTimeout(DNSQueryError):
+    """Raises when the DNS-server doesn't respond in time."""
+    pass
+
+
+class WhoisBusy(Exception):
+    """Raises when too many whois queries are already running or waiting."""
+    pass
+
+
+class WhoisTimeout(Exception):
+    """Raises when the whois query doesn't finish in time."""
+    pass
+
+
+class WhoisQueryError(Exception):
+    """Raises when the WHOIS-server can't be queried."""
+    pass
+
+
+class WhoisUnknownTld(Exception):
+    """Raises when there is no WHOIS-server for the TLD."""
+    pass
+
+
+class WhoisParseError(Exception):
+    """Raises when the output of the `whois` program can't be parsed or the
+    registry hides it."""
+    pass
+
+
+class WatchlistFull(Exception):
+    """Raises when the watcher has too many watched domains."""
+    pass
+
+
+class BadCallbackUrl(Exception):
+    """Raises when the callback URL of the watch isn't HTTP(S) or its host
+    isn't a public address."""
+    pass
+
+
+class RdapError(Exception):
+    """Raises when the RDAP-server can't be queried, the WHOIS is used
+    then."""
+    pass
+
+
+class BadNetwork(Exception):
+    """Raises when string is not an IP address or network, or the network
+    is too big."""
+    pass
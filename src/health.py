@@ -0,0 +1,127 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+import messages
+from constants import (DNS_BREAKER_COOLDOWN, DNS_BREAKER_FAILURES,
+                       DNS_HEALTH_ALPHA, DNS_HEDGE_FACTOR,
+                       DNS_HEDGE_MIN_DELAY)
+
+CLOSED: str = 'closed'
+OPEN: str = 'open'
+HALF_OPEN: str = 'half-open'
+
+
+class UpstreamHealth:
+    """
+    Health of one DNS-server: EWMA of latency and failure rate plus circuit
+    breaker. The breaker opens after DNS_BREAKER_FAILURES failures in a row,
+    then the server is skipped for DNS_BREAKER_COOLDOWN seconds, after that
+    the server is queried again (half-open): the first success closes the
+    breaker, the first failure opens it again.
+    """
+    __slots__ = ('server', 'latency', 'failure_rate', 'queries', 'failures',
+                 'consecutive_failures', 'opened_at')
+
+    def __init__(self, server: str) -> None:
+        self.server = server
+        self.latency: Optional[float] = None
+        self.failure_rate = 0.0
+        self.queries = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at < DNS_BREAKER_COOLDOWN:
+            return OPEN
+        return HALF_OPEN
+
+    def available(self) -> bool:
+        """Whether the server may be queried now."""
+        return self.state != OPEN
+
+    def record_success(self, latency: float) -> None:
+        self.queries += 1
+        self.latency = latency if self.latency is None else (
+            DNS_HEALTH_ALPHA * latency
+            + (1 - DNS_HEALTH_ALPHA) * self.latency)
+        self.failure_rate *= 1 - DNS_HEALTH_ALPHA
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self, error: Exception) -> None:
+        self.queries += 1
+        self.failures += 1
+        self.failure_rate = (DNS_HEALTH_ALPHA
+                             + (1 - DNS_HEALTH_ALPHA) * self.failure_rate)
+        self.consecutive_failures += 1
+        state = self.state
+        if state == HALF_OPEN or (
+                state == CLOSED
+                and self.consecutive_failures >= DNS_BREAKER_FAILURES):
+            logging.warning(messages.UPSTREAM_DOWN.format(
+                self.server, DNS_BREAKER_COOLDOWN, error))
+            self.opened_at = time.monotonic()
+
+    def hedge_delay(self) -> float:
+        """How long to wait for the answer before querying the next server
+        in hedged mode."""
+        if self.latency is None:
+            return DNS_HEDGE_MIN_DELAY
+        return max(DNS_HEDGE_MIN_DELAY, self.latency * DNS_HEDGE_FACTOR)
+
+    def to_dict(self) -> dict:
+        return {
+            'server': self.server,
+            'state': self.state,
+            'latency': self.latency,
+            'failure_rate': self.failure_rate,
+            'queries': self.queries,
+            'failures': self.failures,
+        }
+
+
+class UpstreamRegistry:
+    """Health of the DNS-servers, the servers are arbitrary in API requests,
+    so only `max_size` last used servers are kept."""
+
+    def __init__(self, max_size: int = 1024) -> None:
+        self.max_size = max_size
+        self._servers: 'OrderedDict[str, UpstreamHealth]' = OrderedDict()
+
+    def get(self, server: str) -> UpstreamHealth:
+        health = self._servers.get(server)
+        if health is None:
+            health = self._servers[server] = UpstreamHealth(server)
+            if len(self._servers) > self.max_size:
+                self._servers.popitem(last=False)
+        else:
+            self._servers.move_to_end(server)
+        return health
+
+    def available(self, servers: Sequence[str]) -> List[str]:
+        """Servers which may be queried now. If the breakers of all the
+        servers are open, all of them are returned: an answer from a bad
+        server is better than no answer."""
+        available = [server for server in servers
+                     if self.get(server).available()]
+        return available or list(servers)
+
+    def rank(self, servers: Sequence[str]) -> List[str]:
+        """Available servers sorted by latency, servers without latency
+        statistics go first to get it."""
+        return sorted(
+            self.available(servers),
+            key=lambda server: self.get(server).latency or 0.0
+        )
+
+    def stats(self) -> List[dict]:
+        return [health.to_dict() for health in self._servers.values()]
+
+
+upstreams = UpstreamRegistry()
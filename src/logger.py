@@ -2,11 +2,13 @@ import logging
 from pathlib import Path
 from logging.handlers import RotatingFileHandler
 
+from tracing import RequestIdFilter
+
 BASE_DIR = Path(__file__).parent
 LOG_DIR = BASE_DIR / 'logs'
 LOG_FILE_NAME = 'wd_bot.log'
 LOG_FORMAT = ("[%(asctime)s,%(msecs)d] %(levelname)s "
-              "[%(name)s:%(lineno)s] %(message)s")
+              "[%(name)s:%(lineno)s] [%(request_id)s] %(message)s")
 LOG_DT_FORMAT = "%d.%m.%y %H:%M:%S"
 LOG_BACKUP_COUNT = 5
 LOG_MAX_SIZE = 50000000
@@ -19,11 +21,15 @@ def configure_logging() -> None:
     rotating_handler = RotatingFileHandler(
         log_file, maxBytes=LOG_MAX_SIZE, backupCount=LOG_BACKUP_COUNT
     )
+    handlers = (rotating_handler, logging.StreamHandler())
+    # Records are marked by the ID of the request they are logged in.
+    for handler in handlers:
+        handler.addFilter(RequestIdFilter())
     logging.basicConfig(
         datefmt=LOG_DT_FORMAT,
         format=LOG_FORMAT,
         level=logging.INFO,
-        handlers=(rotating_handler, logging.StreamHandler())
+        handlers=handlers
     )
 
     # Disable information logs from telegram API itself requests.
@@ -1,4 +1,5 @@
-from constants import ALLOWED_RECORDS
+from constants import (ALLOWED_RECORDS, COMMON_RECORDS, DIG_ALL_PRESET,
+                       DNSSEC_PRESET)
 
 # Information messages
 WRONG_REQUEST = '❗ You send the wrong request. Maybe you need some /help?'
@@ -7,12 +8,45 @@ HELP_TEXT = (
     'Correct:\n'
     'example.com A\n'
     'http://example.com/ TXT\n'
-    'site.ru\n\n'
+    'site.ru\n'
+    'site.ru ALL\n\n'
     '❌ Wrong:\n'
     'A example.com\n'
     'example.com A TXT MX\n\n'
-    f'Allowed <b>dig</b> records to check: {", ".join(ALLOWED_RECORDS)}'
+    f'Allowed <b>dig</b> records to check: {", ".join(ALLOWED_RECORDS)}\n'
+    f'{DIG_ALL_PRESET} - check at once: {", ".join(COMMON_RECORDS)}\n'
+    f'{DNSSEC_PRESET} - validate the DNSSEC chain of trust\n\n'
+    '<b>Watch</b> the domain expiration, statuses and nameservers:\n'
+    '/watch example.com\n'
+    '/unwatch example.com\n'
+    '/watchlist\n\n'
+    '<b>Propagation</b> of the record across the public resolvers:\n'
+    '/propagation example.com A\n\n'
+    '<b>PTR</b> records of the IP address or network:\n'
+    '/ptr 192.0.2.0/24'
 )
+WATCH_USAGE = '❗ Send the domain to watch: /watch example.com'
+UNWATCH_USAGE = '❗ Send the domain to stop watching: /unwatch example.com'
+WATCH_ADDED = (
+    '👀 {} is watched now, I will tell you when it is about to expire or '
+    'its statuses or nameservers change.'
+)
+WATCH_REMOVED = '{} is not watched anymore.'
+WATCH_NOT_FOUND = '{} is not watched.'
+WATCH_FULL = '❗ You can watch at most {} domains.'
+WATCHLIST_EMPTY = 'You have no watched domains. Add one: /watch example.com'
+WATCHLIST_LABEL = '👀 Watched domains:'
+WATCHLIST_ITEM = '{} - expires {}'
+WATCHLIST_NOT_CHECKED = 'not checked yet'
+WATCHLIST_UNKNOWN = 'unknown'
+WATCH_EXPIRES = '⏰ {} expires in {} days: {}'
+WATCH_EXPIRED = '❗ {} has expired: {}'
+WATCH_EXPIRATION_CHANGED = '📅 {}: expiration date is changed: {} → {}'
+WATCH_STATUSES_CHANGED = '🔄 {}: statuses are changed: {} → {}'
+WATCH_NAME_SERVERS_CHANGED = '🔄 {}: nameservers are changed: {} → {}'
+WATCH_NOT_REGISTERED = '❗ {} is not registered anymore'
+WATCH_REGISTERED = '✅ {} is registered'
+RATE_LIMITED = '⏳ Too many requests, try again in {:.0f} sec.'
 INTERNAL_ERROR = (
     '‼️ Возникла внутренняя проблема при обработке запроса. '
     'Попробуйте повторить данное действие позже.'
@@ -29,12 +63,53 @@ UNKNOWN_TLD = (
 DIG_TG_LABEL = '🔍 Here is DIG {}:'
 DIG_EMPTY_RESPONSE = '- empty -'
 DIG_RECORD_AT_NS = '\n▫ {} at {}:'
+DIG_SKIPPED = '\n⚠ Not responding DNS-servers are skipped: {}'
+MESSAGE_CUT = '\n...'
+
+# Propagation check messages
+PROPAGATION_USAGE = (
+    '❗ Send the domain and the record: /propagation example.com A'
+)
+PROPAGATION_TG_LABEL = '🌍 Propagation of {} {}: {} of {} resolvers answered'
+PROPAGATION_GROUP = '\n▫ {} resolvers:'
+PROPAGATION_GROUP_STATUS = '\n▫ {} at {} resolvers'
+PROPAGATION_FAILED = '\n❗ No answer from: {}'
+PROPAGATION_IN_PROGRESS = '\n⏳ Checking...'
+PROPAGATION_CONSISTENT = '\n✅ All the answers are the same'
+PROPAGATION_INCONSISTENT = '\n⚠ Resolvers give {} different answers'
+
+# PTR sweep messages
+PTR_USAGE = '❗ Send the IP address or network: /ptr 192.0.2.0/24'
+BAD_NETWORK = '❗ Bad IP address or network: {}'
+NETWORK_TOO_BIG = '❗ The network is too big, max {} addresses'
+PTR_TG_LABEL = '🔁 PTR records of {}: {} of {} addresses have them'
+PTR_ITEM = '{} → {}'
+PTR_FAILED = '\n❗ No answer for {} addresses'
+
+# DNSSEC validation messages
+DNSSEC_TG_LABEL = '🔐 DNSSEC of {}: {} {}'
+DNSSEC_ZONE = '{} {} - {}'
+DNSSEC_ZONE_KEYS = 'keys {}'
+DNSSEC_RECORD = '▫ {}: {} {}'
+DNSSEC_REASON = '{} ({})'
+DNSSEC_STATUS_ICONS = {
+    'validated': '✅', 'insecure': '⚪', 'bogus': '❌', 'indeterminate': '❓'
+}
+DNSSEC_NO_ANSWER = 'no answer from the DNS-servers'
+DNSSEC_NO_KEYS = 'no DNSKEY matches the DS records'
+DNSSEC_BAD_SIGNATURE = 'no valid signature of {} records'
+DNSSEC_NO_PROOF = 'no signed proof that there are no {} records'
+DNSSEC_NO_DS = 'unsigned delegation'
+DNSSEC_UNSUPPORTED = 'unsupported algorithms'
+DNSSEC_NO_RECORDS = 'no records'
 
 # Whois messages
 WHOIS_TG_LABEL = '🔍 Here is whois information:'
 NO_QUERY = 'No entries found for the selected source'
 WHOIS_ERROR = '❗ Whois error: {}. Trying to dig...'
 WHOIS_ITEM = '{:20}{}'
+WHOIS_BUSY = 'too many whois queries, try again later'
+WHOIS_TIMEOUT = 'whois query timed out'
 
 # Whois items labels
 PUNYCODE = 'Punycode:'
@@ -47,6 +122,9 @@ ACTIVE = ' - active!'
 EXPIRED = '<b> - EXPIRED! 🛑</b>'
 STATUSES = 'Statuses:'
 
+# CLI messages
+CLI_DONE = 'Checked {} domains in {:.1f} sec, skipped by the checkpoint: {}'
+
 # Logging messages
 SOMEONE_STARTS_BOT = 'Someone starts bot: {}, {} {}, {}'
 ERROR_LOG = 'User: {}. Input message: {}. Error: {}'
@@ -54,3 +132,27 @@ NEW_EXCEPTION = (
     'New exception was happened. User: {}. Input message: {} Error:'
 )
 BAD_DOMAIN_LOG = 'Bad domain'
+UPSTREAM_DOWN = 'DNS-server {} is skipped for {} sec. Last error: {}'
+DIG_TASK_ERROR = 'Dig of {} {} failed: {}'
+METRICS_SERVER = 'Metrics are served on port {}'
+WEBHOOK_SET = 'Telegram webhook is set to {}'
+WATCH_CHECK_ERROR = 'Watched domain {} is not checked: {}'
+BAD_CALLBACK_URL = 'Callback URL is not allowed: {}'
+CALLBACK_SCHEME = 'only http and https are allowed'
+CALLBACK_NOT_RESOLVED = 'host {} is not resolved'
+CALLBACK_NOT_PUBLIC = 'host {} is not a public address'
+WATCH_FORBIDDEN = 'Wrong or missing X-Watch-Token of the callback URL'
+WATCH_NOTIFY_ERROR = 'Watch notification to {} is not sent: {}'
+WHOIS_UNKNOWN_TLD = 'there is no whois server for .{}'
+WHOIS_EMPTY_RESPONSE = '{}: empty response'
+WHOIS_REFERRAL_ERROR = 'Whois referral {} is skipped: {}'
+WHOIS_SERVERS_LOAD_ERROR = 'Whois servers map is not loaded: {}'
+WHOIS_SERVERS_SAVE_ERROR = 'Whois servers map is not saved: {}'
+RDAP_UNKNOWN_TLD = 'there is no RDAP server for .{}'
+RDAP_BOOTSTRAP_ERROR = 'RDAP bootstrap file is not loaded: {}'
+RDAP_FALLBACK = 'RDAP query of {} failed, using whois: {}'
+SLOW_REQUEST = 'Slow request {} ({}) took {:.1f} ms:\n{}'
+SLOW_REQUEST_SPAN = '{}{} +{:.1f} ms {:.1f} ms{}'
+SLOW_REQUEST_DROPPED = '... {} spans are dropped'
+TRACES_DROPPED = 'Traces are not exported, the export queue is full'
+TRACES_EXPORT_ERROR = 'Traces are not exported: {}'
@@ -0,0 +1,222 @@
+import abc
+import asyncio
+import math
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+CONTENT_TYPE: str = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str],
+                   extra: str = '') -> str:
+    labels = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(labelnames, labelvalues)
+    ]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class Metric(abc.ABC):
+    """Base class of the metric in Prometheus text exposition format."""
+    type: str = 'untyped'
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = (), registry=None) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(sample name, formatted labels, value) of the metric."""
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.type}']
+        lines.extend(f'{name}{labels} {_format_value(value)}'
+                     for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            return [(self.name, _format_labels(self.labelnames, key), value)
+                    for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class CallbackMetric(Metric):
+    """Metric which values are got from the callback at collect time, the
+    callback returns {label values: value}."""
+
+    def __init__(self, name: str, documentation: str, type: str,
+                 labelnames: Sequence[str],
+                 callback: Callable[[], Dict[Tuple[str, ...], float]],
+                 registry=None) -> None:
+        self.type = type
+        self.callback = callback
+        super().__init__(name, documentation, labelnames, registry)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        return [(self.name, _format_labels(self.labelnames, key), value)
+                for key, value in self.callback().items()]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 registry=None) -> None:
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values: ([count per bucket], sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(
+                key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = _format_labels(
+                        self.labelnames, key, f'le="{_format_value(bound)}"')
+                    samples.append((f'{self.name}_bucket', labels, cumulative))
+                labels = _format_labels(self.labelnames, key)
+                samples.append((f'{self.name}_sum', labels, total))
+                samples.append((f'{self.name}_count', labels, cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return '\n'.join(
+            metric.render() for metric in self._metrics.values()) + '\n'
+
+
+REGISTRY = Registry()
+
+
+_caches: Dict[str, Callable[[], dict]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], dict]) -> None:
+    """Export counters of the cache, `stats` is its `stats()` method."""
+    _caches[name] = stats
+
+
+def _cache_values(key: str) -> Callable[[], Dict[Tuple[str, ...], float]]:
+    return lambda: {(name,): stats()[key] for name, stats in _caches.items()}
+
+
+async def _handle_metrics_request(reader: asyncio.StreamReader,
+                                  writer: asyncio.StreamWriter) -> None:
+    try:
+        await reader.readuntil(b'\r\n\r\n')
+        body = REGISTRY.render().encode()
+        writer.write(
+            b'HTTP/1.1 200 OK\r\n'
+            b'Content-Type: ' + CONTENT_TYPE.encode() + b'\r\n'
+            b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+            b'Connection: close\r\n\r\n' + body
+        )
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+            ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(port: int, host: str = '0.0.0.0'
+                               ) -> asyncio.AbstractServer:
+    """Serve metrics over HTTP on the side port (for processes without web
+    framework like the telegram bot)."""
+    return await asyncio.start_server(_handle_metrics_request, host, port)
+
+
+# Metrics of the whole application.
+DIG_DURATION = Histogram(
+    'wd_dig_duration_seconds', 'Duration of dig queries to DNS-servers.',
+    ('server', 'backend', 'status'))
+DIG_IN_FLIGHT = Gauge(
+    'wd_dig_in_flight', 'Dig queries waiting for DNS-servers.')
+WHOIS_DURATION = Histogram(
+    'wd_whois_duration_seconds', 'Duration of whois queries.',
+    ('tld', 'source', 'result'))
+BOT_RATE_LIMITED = Counter(
+    'wd_bot_rate_limited_total', 'Bot requests rejected by the chat limit.',
+    ('handler',))
+BOT_EDITS_SKIPPED = Counter(
+    'wd_bot_edits_skipped_total',
+    'Bot message edits skipped because the text is the same.')
+SUBPROCESSES = Gauge(
+    'wd_subprocesses', 'Running dig and whois programs.', ('program',))
+for _key, _name, _type in (('hits', 'hits_total', 'counter'),
+                           ('misses', 'misses_total', 'counter'),
+                           ('evictions', 'evictions_total', 'counter'),
+                           ('size', 'size', 'gauge'),
+                           ('hit_ratio', 'hit_ratio', 'gauge')):
+    CallbackMetric(f'wd_cache_{_name}', f'Cache {_key.replace("_", " ")}.',
+                   _type, ('cache',), _cache_values(_key))
@@ -0,0 +1,76 @@
+import ipaddress
+from typing import AsyncIterator, Sequence, Union
+
+import messages
+from batch import bounded_map, global_limiter
+from constants import DNS_SERVERS, PTR_CONCURRENCY, PTR_MAX_ADDRESSES
+from exceptions import BadNetwork
+from wd import Domain
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+Address = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+
+def parse_network(value: str,
+                  max_addresses: int = PTR_MAX_ADDRESSES) -> Network:
+    """IP address (as the network of one address) or network in CIDR
+    notation, host bits are ignored."""
+    try:
+        network = ipaddress.ip_network(value.strip(), strict=False)
+    except ValueError:
+        raise BadNetwork(messages.BAD_NETWORK.format(value)) from None
+    if network.num_addresses > max_addresses:
+        raise BadNetwork(messages.NETWORK_TOO_BIG.format(max_addresses))
+    return network
+
+
+async def check_ptr(address: Address, dns: Sequence[str] = DNS_SERVERS,
+                    force: bool = False) -> dict:
+    """PTR records of the address from the first answered DNS-server."""
+    name = address.reverse_pointer
+    output = {'ip': str(address), 'name': name, 'result': True,
+              'server': None, 'status': None, 'ptr': []}
+    dig = await Domain(name).dig('PTR', dns, force=force, fastest=True)
+    for server, answers in dig['data'].items():
+        output.update(server=server,
+                      status=dig['servers'][server]['status'],
+                      ptr=[answer['content'] for answer in answers])
+        return output
+    # None of the DNS-servers answered or all of them are skipped.
+    output['result'] = False
+    for status in dig['servers'].values():
+        output['status'] = status['status']
+    return output
+
+
+async def ptr_sweep(network: Network, dns: Sequence[str] = DNS_SERVERS,
+                    force: bool = False) -> AsyncIterator[dict]:
+    """PTR records of all the addresses of the network, at most
+    PTR_CONCURRENCY addresses of all the running sweeps are queried at once.
+    Addresses are taken from the network lazily, results are yielded as
+    they complete."""
+    async for result in bounded_map(
+            lambda address: check_ptr(address, dns, force),
+            iter(network), PTR_CONCURRENCY,
+            global_limiter('ptr', PTR_CONCURRENCY)
+    ):
+        yield result
+
+
+def ptr_tg_message(network: Network, results: Sequence[dict]) -> str:
+    """Generates telegram message with the PTR records of the addresses
+    sorted by address."""
+    results = sorted(results, key=lambda result: ipaddress.ip_address(
+        result['ip']))
+    found = [result for result in results if result['ptr']]
+    message = [messages.PTR_TG_LABEL.format(
+        network, len(found), network.num_addresses)]
+    if found:
+        message.append('')
+        message.extend(
+            messages.PTR_ITEM.format(result['ip'], ', '.join(result['ptr']))
+            for result in found)
+    failed = sum(not result['result'] for result in results)
+    if failed:
+        message.append(messages.PTR_FAILED.format(failed))
+    return Domain.tg_cut('\n'.join(message))
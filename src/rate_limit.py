@@ -0,0 +1,75 @@
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class TokenBucket:
+    """Token bucket: holds up to `capacity` tokens and gets `rate` tokens
+    per second, every request takes one token."""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at', 'warned')
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        # Whether the owner was already told about the limit.
+        self.warned = False
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def consume(self) -> bool:
+        """Take the token, returns False if there is no token."""
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        self.warned = False
+        return True
+
+    def retry_after(self) -> float:
+        """Seconds until the next token."""
+        self._refill()
+        if self.tokens >= 1 or not self.rate:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Token bucket per key (telegram chat). Buckets of at most `max_keys` keys
+    are kept, the least recently used ones are dropped: the dropped bucket
+    is full again when its key comes back.
+    `rate` <= 0 disables the limit.
+    """
+
+    def __init__(self, rate: float, burst: int,
+                 max_keys: int = 10000) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_keys = max_keys
+        self.limited = 0
+        self._buckets: 'OrderedDict[Hashable, TokenBucket]' = OrderedDict()
+
+    def bucket(self, key: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def allow(self, key: Hashable) -> bool:
+        """Whether the request of the key is allowed, takes the token."""
+        if self.rate <= 0:
+            return True
+        if self.bucket(key).consume():
+            return True
+        self.limited += 1
+        return False
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import messages
+from constants import (RDAP_BOOTSTRAP_PATH, RDAP_BOOTSTRAP_RETRY,
+                       RDAP_BOOTSTRAP_TTL, RDAP_BOOTSTRAP_URL,
+                       RDAP_MAX_CONNECTIONS, RDAP_TIMEOUT)
+from exceptions import RdapError
+from whois_client import parse_date
+
+if TYPE_CHECKING:
+    import httpx
+
+RDAP_MEDIA_TYPE: str = 'application/rdap+json'
+
+# RDAP statuses (RFC 8056) which differ from the EPP ones of WHOIS.
+EPP_STATUSES: Dict[str, str] = {'active': 'ok'}
+
+
+def epp_status(status: str) -> str:
+    """EPP form of the RDAP status like WHOIS shows it: `client transfer
+    prohibited` -> `clientTransferProhibited`."""
+    status = EPP_STATUSES.get(status, status)
+    words = status.split()
+    return words[0] + ''.join(word.capitalize() for word in words[1:])
+
+
+def _vcard(entity: dict, name: str) -> List[list]:
+    vcard = entity.get('vcardArray') or [None, []]
+    return [item for item in vcard[1] if item and item[0] == name]
+
+
+def _entities(entities: List[dict], role: str) -> List[dict]:
+    """Entities with the role, nested entities are searched too."""
+    found = []
+    for entity in entities or []:
+        if role in entity.get('roles', ()):
+            found.append(entity)
+        found.extend(_entities(entity.get('entities'), role))
+    return found
+
+
+def _full_name(entities: List[dict]) -> Optional[str]:
+    for entity in entities:
+        for item in _vcard(entity, 'fn'):
+            if item[3]:
+                return item[3]
+    return None
+
+
+def _country(entities: List[dict]) -> Optional[str]:
+    for entity in entities:
+        for item in _vcard(entity, 'adr'):
+            country = item[1].get('cc') if isinstance(item[1], dict) else None
+            if not country and isinstance(item[3], list) and len(item[3]) > 6:
+                country = item[3][6]
+            if country:
+                return country
+    return None
+
+
+def _emails(entities: List[dict]) -> List[str]:
+    emails = set()
+    for entity in entities or []:
+        emails.update(item[3] for item in _vcard(entity, 'email')
+                      if isinstance(item[3], str))
+        emails.update(_emails(entity.get('entities')))
+    return sorted(emails)
+
+
+def parse_domain(domain: str, tld: str, data: dict) -> dict:
+    """Map the RDAP domain object to the fields of the WHOIS record."""
+    events = {event.get('eventAction'): event.get('eventDate')
+              for event in data.get('events', [])}
+    statuses = sorted({epp_status(status)
+                       for status in data.get('status', [])})
+    name_servers = sorted({
+        name_server['ldhName'].lower().rstrip('.')
+        for name_server in data.get('nameservers', [])
+        if name_server.get('ldhName')
+    })
+    entities = data.get('entities', [])
+    registrants = _entities(entities, 'registrant')
+    return {
+        'name': (data.get('ldhName') or domain).lower().rstrip('.'),
+        'tld': tld,
+        'registrar': _full_name(_entities(entities, 'registrar')),
+        'registrant_country': _country(registrants),
+        'creation_date': parse_date(events.get('registration') or ''),
+        'expiration_date': parse_date(events.get('expiration') or ''),
+        'last_updated': parse_date(events.get('last changed') or ''),
+        'status': statuses[0] if statuses else None,
+        'statuses': statuses,
+        'dnssec': bool(data.get('secureDNS', {}).get('delegationSigned')),
+        'name_servers': name_servers,
+        'registrant': _full_name(registrants),
+        'emails': _emails(entities),
+    }
+
+
+class RdapClient:
+    """
+    RDAP client (RFC 9082, 9083). RDAP-servers of the TLDs are taken from the
+    IANA bootstrap file (RFC 9224) which is cached in RDAP_BOOTSTRAP_PATH.
+    Every RDAP-server has its own HTTP client, so the connections to it are
+    kept alive and reused.
+    """
+
+    def __init__(self, bootstrap_path: str = RDAP_BOOTSTRAP_PATH,
+                 bootstrap_url: str = RDAP_BOOTSTRAP_URL,
+                 timeout: float = RDAP_TIMEOUT) -> None:
+        self.bootstrap_path = bootstrap_path
+        self.bootstrap_url = bootstrap_url
+        self.timeout = timeout
+        # tld: base URLs of the RDAP-servers.
+        self.servers: Dict[str, List[str]] = {}
+        self._bootstrapped_at = 0.0
+        # Error of the failed bootstrap, it is raised until the retry time.
+        self._bootstrap_error: Optional[str] = None
+        self._bootstrap_retry_at = 0.0
+        self._bootstrap_lock: Optional[asyncio.Lock] = None
+        self._clients: Dict[str, Tuple[asyncio.AbstractEventLoop,
+                                       'httpx.AsyncClient']] = {}
+
+    def _client(self, base_url: str) -> 'httpx.AsyncClient':
+        """HTTP client of the RDAP-server for the current event loop. httpx
+        is imported on the first query, so it doesn't slow down the start."""
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(base_url)
+        if client is None or client[0] is not loop:
+            client = self._clients[base_url] = (loop, httpx.AsyncClient(
+                base_url=base_url, timeout=self.timeout,
+                follow_redirects=True,
+                headers={'Accept': RDAP_MEDIA_TYPE},
+                limits=httpx.Limits(
+                    max_connections=RDAP_MAX_CONNECTIONS,
+                    max_keepalive_connections=RDAP_MAX_CONNECTIONS)))
+        return client[1]
+
+    def _apply_bootstrap(self, bootstrap: dict) -> None:
+        servers = {}
+        for tlds, urls in bootstrap.get('services', []):
+            urls = sorted(urls, key=lambda url: not url.startswith('https'))
+            for tld in tlds:
+                servers[tld.lower()] = [url.rstrip('/') + '/' for url in urls]
+        self.servers = servers
+
+    async def _bootstrap(self) -> None:
+        """Load the bootstrap file from the disk or from IANA if the file is
+        missing or older than RDAP_BOOTSTRAP_TTL."""
+        import httpx
+
+        path = Path(self.bootstrap_path) if self.bootstrap_path else None
+        if path is not None and path.exists() and (
+                time.time() - path.stat().st_mtime < RDAP_BOOTSTRAP_TTL):
+            try:
+                self._apply_bootstrap(json.loads(path.read_text()))
+                self._bootstrapped_at = path.stat().st_mtime
+                return
+            except (OSError, ValueError) as error:
+                logging.warning(messages.RDAP_BOOTSTRAP_ERROR.format(error))
+
+        try:
+            response = await self._client(self.bootstrap_url).get(
+                self.bootstrap_url)
+            response.raise_for_status()
+            bootstrap = response.json()
+        except (httpx.HTTPError, ValueError) as error:
+            if self.servers:
+                # The outdated map is better than nothing, try again later.
+                self._bootstrapped_at = (
+                    time.time() - RDAP_BOOTSTRAP_TTL + RDAP_BOOTSTRAP_RETRY)
+                return
+            self._bootstrap_error = messages.RDAP_BOOTSTRAP_ERROR.format(
+                error)
+            self._bootstrap_retry_at = time.time() + RDAP_BOOTSTRAP_RETRY
+            raise RdapError(self._bootstrap_error) from error
+        self._bootstrap_error = None
+        self._apply_bootstrap(bootstrap)
+        self._bootstrapped_at = time.time()
+        if path is not None:
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(json.dumps(bootstrap))
+            except OSError as error:
+                logging.warning(messages.RDAP_BOOTSTRAP_ERROR.format(error))
+
+    def _check_bootstrap(self) -> bool:
+        """Whether the bootstrap file should be loaded. Raises the error of
+        the failed bootstrap until its retry time."""
+        if time.time() - self._bootstrapped_at < RDAP_BOOTSTRAP_TTL:
+            return False
+        if (self._bootstrap_error is not None
+                and time.time() < self._bootstrap_retry_at):
+            raise RdapError(self._bootstrap_error)
+        return True
+
+    async def servers_for(self, domain: str) -> Tuple[List[str], str]:
+        """RDAP-servers of the domain and the (longest) known TLD of it."""
+        if self._check_bootstrap():
+            if self._bootstrap_lock is None:
+                self._bootstrap_lock = asyncio.Lock()
+            async with self._bootstrap_lock:
+                if self._check_bootstrap():
+                    await self._bootstrap()
+        labels = domain.lower().rstrip('.').split('.')
+        for index in range(1, len(labels)):
+            tld = '.'.join(labels[index:])
+            if tld in self.servers:
+                return self.servers[tld], tld
+        raise RdapError(messages.RDAP_UNKNOWN_TLD.format(labels[-1]))
+
+    async def query(self, domain: str) -> Optional[dict]:
+        """RDAP record of the domain in the fields of the WHOIS record, None
+        if the domain isn't registered."""
+        import httpx
+
+        servers, tld = await self.servers_for(domain)
+        error: Optional[Exception] = None
+        for base_url in servers:
+            try:
+                response = await self._client(base_url).get(
+                    f'domain/{domain}')
+            except httpx.HTTPError as http_error:
+                error = http_error
+                continue
+            if response.status_code == 404:
+                return None
+            if response.status_code != 200:
+                error = RdapError(f'{base_url}: HTTP {response.status_code}')
+                continue
+            try:
+                return parse_domain(domain, tld, response.json())
+            except (ValueError, KeyError, TypeError,
+                    IndexError) as parse_error:
+                raise RdapError(f'{base_url}: {parse_error}') from parse_error
+        raise RdapError(str(error)) from error
+
+    async def close(self) -> None:
+        for _, client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+
+rdap_client = RdapClient()
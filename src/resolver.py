@@ -0,0 +1,490 @@
+import asyncio
+import base64
+import ipaddress
+import secrets
+import struct
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from constants import (DIG_TIMEOUT, DNS_MAX_UPSTREAMS, DNS_PORT,
+                       DNS_UDP_PAYLOAD_SIZE, DNS_UDP_TRIES)
+from exceptions import DNSQueryError, DNSTimeout
+
+RECORD_TYPES: Dict[str, int] = {
+    'A': 1, 'NS': 2, 'CNAME': 5, 'SOA': 6, 'PTR': 12, 'MX': 15, 'TXT': 16,
+    'AAAA': 28, 'SRV': 33, 'DNAME': 39, 'OPT': 41, 'DS': 43, 'RRSIG': 46,
+    'NSEC': 47, 'DNSKEY': 48, 'NSEC3': 50, 'TLSA': 52, 'CAA': 257,
+}
+RECORD_NAMES: Dict[int, str] = {
+    code: name for name, code in RECORD_TYPES.items()}
+
+CLASS_IN: int = 1
+CLASS_NAMES: Dict[int, str] = {1: 'IN', 3: 'CH', 4: 'HS'}
+
+RCODES: Dict[int, str] = {
+    0: 'NOERROR', 1: 'FORMERR', 2: 'SERVFAIL', 3: 'NXDOMAIN',
+    4: 'NOTIMP', 5: 'REFUSED',
+}
+RCODE_VALUES: Dict[str, int] = {name: value for value, name in RCODES.items()}
+
+HEADER = struct.Struct('!HHHHHH')
+RR_FIXED = struct.Struct('!HHIH')
+QUESTION_FIXED = struct.Struct('!HH')
+
+FLAG_QR: int = 0x8000
+FLAG_TC: int = 0x0200
+FLAG_RD: int = 0x0100
+FLAG_CD: int = 0x0010
+# DNSSEC OK flag in the TTL field of the OPT record.
+EDNS_FLAG_DO: int = 0x8000
+
+MAX_COMPRESSION_POINTERS: int = 64
+
+
+class ResourceRecord:
+    """One resource record in presentation form, like a line of `dig` answer
+    section: owner, TTL, class, type and rdata."""
+    __slots__ = ('name', 'ttl', 'rclass', 'rtype', 'rdata')
+
+    def __init__(self, name: str, ttl: int, rclass: str, rtype: str,
+                 rdata: str) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.rclass = rclass
+        self.rtype = rtype
+        self.rdata = rdata
+
+    def __repr__(self):
+        return (f'{self.name}\t{self.ttl}\t{self.rclass}\t{self.rtype}\t'
+                f'{self.rdata}')
+
+
+class DNSResponse:
+    """Parsed DNS response message."""
+    __slots__ = ('id', 'rcode', 'truncated', 'answers', 'authority')
+
+    def __init__(self, id: int, rcode: int, truncated: bool,
+                 answers: List[ResourceRecord],
+                 authority: List[ResourceRecord]) -> None:
+        self.id = id
+        self.rcode = rcode
+        self.truncated = truncated
+        self.answers = answers
+        self.authority = authority
+
+    @property
+    def status(self) -> str:
+        return RCODES.get(self.rcode, str(self.rcode))
+
+    def negative_ttl(self) -> Optional[int]:
+        """TTL of the negative answer (RFC 2308): minimum of the SOA record
+        TTL and its MINIMUM field, None if there is no SOA in authority."""
+        for record in self.authority:
+            if record.rtype == 'SOA':
+                return min(record.ttl, int(record.rdata.split()[-1]))
+        return None
+
+
+def encode_name(name: str) -> bytes:
+    """Encode domain name to the DNS wire format."""
+    wire = bytearray()
+    for label in name.rstrip('.').split('.'):
+        if not label:
+            continue
+        label = label.encode('ascii')
+        if len(label) > 63:
+            raise DNSQueryError(f'Label is too long: {label!r}')
+        wire.append(len(label))
+        wire += label
+    wire.append(0)
+    return bytes(wire)
+
+
+def build_query(query_id: int, name: str, record: str,
+                dnssec: bool = False) -> bytes:
+    """Build wire-format query with EDNS0 OPT record which allows servers
+    to send UDP responses bigger than 512 bytes.
+    `dnssec` - ask for the RRSIG and NSEC records (DO flag) and for the
+    answers which the server failed to validate (CD flag)."""
+    flags = FLAG_RD | FLAG_CD if dnssec else FLAG_RD
+    header = HEADER.pack(query_id, flags, 1, 0, 0, 1)
+    question = encode_name(name) + QUESTION_FIXED.pack(
+        RECORD_TYPES[record], CLASS_IN)
+    opt = b'\x00' + RR_FIXED.pack(
+        RECORD_TYPES['OPT'], DNS_UDP_PAYLOAD_SIZE,
+        EDNS_FLAG_DO if dnssec else 0, 0)
+    return header + question + opt
+
+
+def _label_to_text(label: bytes) -> str:
+    """Presentation form of label, escaped the same way `dig` does."""
+    text = []
+    for byte in label:
+        if byte in b'.\\"()@;$':
+            text.append('\\' + chr(byte))
+        elif 0x21 <= byte <= 0x7e:
+            text.append(chr(byte))
+        else:
+            text.append(f'\\{byte:03d}')
+    return ''.join(text)
+
+
+def read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """Read (possibly compressed) domain name from the message, returns the
+    name and the offset right after it."""
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        try:
+            length = data[offset]
+        except IndexError:
+            raise DNSQueryError('Truncated domain name') from None
+        if length & 0xc0 == 0xc0:
+            if jumps >= MAX_COMPRESSION_POINTERS:
+                raise DNSQueryError('Compression pointers loop')
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3f) << 8) | data[offset + 1]
+            jumps += 1
+            continue
+        offset += 1
+        if not length:
+            break
+        labels.append(_label_to_text(data[offset:offset + length]))
+        offset += length
+    return '.'.join(labels) + '.', end if end is not None else offset
+
+
+def _quote(chunk: bytes) -> str:
+    """Quoted presentation form of <character-string>."""
+    text = []
+    for byte in chunk:
+        if byte in b'"\\':
+            text.append('\\' + chr(byte))
+        elif 0x20 <= byte <= 0x7e:
+            text.append(chr(byte))
+        else:
+            text.append(f'\\{byte:03d}')
+    return '"' + ''.join(text) + '"'
+
+
+def _character_strings(rdata: bytes) -> List[str]:
+    """Split rdata to the list of <character-string> in presentation form."""
+    strings = []
+    offset = 0
+    while offset < len(rdata):
+        length = rdata[offset]
+        strings.append(_quote(rdata[offset + 1:offset + 1 + length]))
+        offset += 1 + length
+    return strings
+
+
+def _format_time(timestamp: int) -> str:
+    return time.strftime('%Y%m%d%H%M%S', time.gmtime(timestamp))
+
+
+def rdata_to_text(data: bytes, offset: int, length: int, rtype: int) -> str:
+    """Convert rdata to the presentation format used by `dig`."""
+    rdata = data[offset:offset + length]
+    if rtype == RECORD_TYPES['A']:
+        return str(ipaddress.IPv4Address(rdata))
+    if rtype == RECORD_TYPES['AAAA']:
+        return str(ipaddress.IPv6Address(rdata))
+    if rtype in (RECORD_TYPES['NS'], RECORD_TYPES['CNAME'],
+                 RECORD_TYPES['PTR'], RECORD_TYPES['DNAME']):
+        return read_name(data, offset)[0]
+    if rtype == RECORD_TYPES['MX']:
+        preference, = struct.unpack_from('!H', data, offset)
+        return f'{preference} {read_name(data, offset + 2)[0]}'
+    if rtype == RECORD_TYPES['SOA']:
+        mname, position = read_name(data, offset)
+        rname, position = read_name(data, position)
+        numbers = struct.unpack_from('!IIIII', data, position)
+        return ' '.join([mname, rname, *map(str, numbers)])
+    if rtype == RECORD_TYPES['TXT']:
+        return ' '.join(_character_strings(rdata))
+    if rtype == RECORD_TYPES['SRV']:
+        priority, weight, port = struct.unpack_from('!HHH', data, offset)
+        target = read_name(data, offset + 6)[0]
+        return f'{priority} {weight} {port} {target}'
+    if rtype == RECORD_TYPES['CAA']:
+        flags, tag_length = rdata[0], rdata[1]
+        tag = rdata[2:2 + tag_length].decode('ascii', 'replace')
+        value = _quote(rdata[2 + tag_length:])
+        return f'{flags} {tag} {value}'
+    if rtype == RECORD_TYPES['DS']:
+        key_tag, algorithm, digest_type = struct.unpack_from('!HBB', rdata)
+        return f'{key_tag} {algorithm} {digest_type} {rdata[4:].hex().upper()}'
+    if rtype == RECORD_TYPES['DNSKEY']:
+        flags, protocol, algorithm = struct.unpack_from('!HBB', rdata)
+        key = base64.b64encode(rdata[4:]).decode()
+        return f'{flags} {protocol} {algorithm} {key}'
+    if rtype == RECORD_TYPES['RRSIG']:
+        (covered, algorithm, labels, original_ttl, expiration, inception,
+         key_tag) = struct.unpack_from('!HBBIIIH', rdata)
+        signer, position = read_name(data, offset + 18)
+        signature = base64.b64encode(data[position:offset + length]).decode()
+        return ' '.join([
+            RECORD_NAMES.get(covered, f'TYPE{covered}'), str(algorithm),
+            str(labels), str(original_ttl), _format_time(expiration),
+            _format_time(inception), str(key_tag), signer, signature
+        ])
+    if rtype == RECORD_TYPES['TLSA']:
+        usage, selector, matching_type = struct.unpack_from('!BBB', rdata)
+        return f'{usage} {selector} {matching_type} {rdata[3:].hex().upper()}'
+    return f'\\# {length} {rdata.hex().upper()}'.rstrip()
+
+
+def _read_records(data: bytes, offset: int, count: int
+                  ) -> Tuple[List[ResourceRecord], int]:
+    records = []
+    for _ in range(count):
+        name, offset = read_name(data, offset)
+        rtype, rclass, ttl, length = RR_FIXED.unpack_from(data, offset)
+        offset += RR_FIXED.size
+        if offset + length > len(data):
+            raise DNSQueryError('Truncated resource record')
+        if rtype != RECORD_TYPES['OPT']:
+            records.append(ResourceRecord(
+                name, ttl, CLASS_NAMES.get(rclass, f'CLASS{rclass}'),
+                RECORD_NAMES.get(rtype, f'TYPE{rtype}'),
+                rdata_to_text(data, offset, length, rtype)
+            ))
+        offset += length
+    return records, offset
+
+
+def parse_response(data: bytes) -> DNSResponse:
+    """Parse wire-format DNS response message."""
+    try:
+        (query_id, flags, qdcount, ancount,
+         nscount, _) = HEADER.unpack_from(data)
+        offset = HEADER.size
+        for _ in range(qdcount):
+            offset = read_name(data, offset)[1] + QUESTION_FIXED.size
+        answers, offset = _read_records(data, offset, ancount)
+        authority, offset = _read_records(data, offset, nscount)
+    except (struct.error, IndexError, ValueError) as error:
+        raise DNSQueryError(f'Malformed DNS response: {error}') from error
+    return DNSResponse(query_id, flags & 0x000f, bool(flags & FLAG_TC),
+                       answers, authority)
+
+
+def _query_question(name: str, record: str) -> Tuple[str, int]:
+    """Question (name, type) of the query as `_response_question` reads
+    it."""
+    return name.rstrip('.').lower() + '.', RECORD_TYPES[record]
+
+
+def _response_question(data: bytes) -> Optional[Tuple[str, int]]:
+    """Get the question (name, type) of the response to match it with the
+    pending query."""
+    try:
+        name, offset = read_name(data, HEADER.size)
+        qtype, _ = QUESTION_FIXED.unpack_from(data, offset)
+    except (struct.error, IndexError, DNSQueryError):
+        return None
+    return name.lower(), qtype
+
+
+class _UDPProtocol(asyncio.DatagramProtocol):
+    def __init__(self, upstream: 'UDPUpstream') -> None:
+        self.upstream = upstream
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.upstream.response_received(data)
+
+    def error_received(self, exc: Exception) -> None:
+        self.upstream.fail_pending(exc)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.upstream.fail_pending(exc or ConnectionError('Socket closed'))
+
+
+class UDPUpstream:
+    """One shared UDP socket to a DNS-server. Concurrent queries are sent
+    through the same socket and the responses are matched to pending
+    queries by the transaction ID and the question."""
+
+    def __init__(self, host: str, port: int = DNS_PORT) -> None:
+        self.host = host
+        self.port = port
+        self.loop = asyncio.get_running_loop()
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._lock = asyncio.Lock()
+        self._pending: Dict[int, Tuple[asyncio.Future, Tuple[str, int]]] = {}
+        self._retired = False
+
+    async def _get_transport(self) -> asyncio.DatagramTransport:
+        async with self._lock:
+            if self._transport is None or self._transport.is_closing():
+                self._transport, _ = await self.loop.create_datagram_endpoint(
+                    lambda: _UDPProtocol(self),
+                    remote_addr=(self.host, self.port)
+                )
+        return self._transport
+
+    def _new_query_id(self) -> int:
+        while True:
+            # Unpredictable IDs make off-path spoofing of the answers to
+            # the shared socket harder.
+            query_id = secrets.randbits(16)
+            if query_id not in self._pending:
+                return query_id
+
+    async def exchange(self, name: str, record: str,
+                       retry_interval: float, dnssec: bool = False) -> bytes:
+        """Send query and wait for the matching response, the query is
+        resent every `retry_interval` seconds because UDP may lose it."""
+        transport = await self._get_transport()
+        query_id = self._new_query_id()
+        future = self.loop.create_future()
+        question = _query_question(name, record)
+        self._pending[query_id] = (future, question)
+        query = build_query(query_id, name, record, dnssec)
+        try:
+            while True:
+                transport.sendto(query)
+                done, _ = await asyncio.wait({future}, timeout=retry_interval)
+                if done:
+                    return future.result()
+        finally:
+            self._pending.pop(query_id, None)
+            if self._retired and not self._pending:
+                self.close()
+
+    def response_received(self, data: bytes) -> None:
+        if len(data) < HEADER.size:
+            return
+        query_id, = struct.unpack_from('!H', data)
+        pending = self._pending.get(query_id)
+        if pending is None:
+            return
+        future, question = pending
+        if future.done() or _response_question(data) != question:
+            return
+        future.set_result(data)
+
+    def fail_pending(self, exc: Exception) -> None:
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.set_exception(DNSQueryError(str(exc)))
+
+    def retire(self) -> None:
+        """Close the socket as soon as the pending queries are done."""
+        self._retired = True
+        if not self._pending:
+            self.close()
+
+    def close(self) -> None:
+        transport, self._transport = self._transport, None
+        # The socket of the closed event loop is closed by the garbage
+        # collector with the transport.
+        if transport is None or self.loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            transport.close()
+        else:
+            self.loop.call_soon_threadsafe(transport.close)
+
+
+async def tcp_exchange(host: str, port: int, name: str, record: str,
+                       dnssec: bool = False) -> bytes:
+    """Send the query over TCP, used when the UDP response is truncated.
+    The response must have the ID and the question of the query."""
+    query_id = secrets.randbits(16)
+    query = build_query(query_id, name, record, dnssec)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(struct.pack('!H', len(query)) + query)
+        await writer.drain()
+        length, = struct.unpack('!H', await reader.readexactly(2))
+        data = await reader.readexactly(length)
+    finally:
+        writer.close()
+    if (len(data) < HEADER.size
+            or struct.unpack_from('!H', data)[0] != query_id
+            or _response_question(data) != _query_question(name, record)):
+        raise DNSQueryError(f'{host}: TCP response does not match the query')
+    return data
+
+
+def parse_server(server: str) -> Tuple[str, int]:
+    """Split the DNS-server in `host#port` notation of `dig`, the port is
+    optional."""
+    host, _, port = server.partition('#')
+    return host, int(port) if port.isdigit() else DNS_PORT
+
+
+class Resolver:
+    """Asynchronous stub resolver which speaks DNS wire protocol by itself
+    instead of forking `dig` for every query."""
+
+    def __init__(self, timeout: float = DIG_TIMEOUT,
+                 tries: int = DNS_UDP_TRIES,
+                 max_upstreams: int = DNS_MAX_UPSTREAMS) -> None:
+        self.timeout = timeout
+        self.tries = tries
+        self.max_upstreams = max_upstreams
+        self._upstreams: 'OrderedDict[Tuple[str, int], UDPUpstream]' = (
+            OrderedDict())
+
+    def _get_upstream(self, host: str, port: int) -> UDPUpstream:
+        """Get the shared upstream socket, a new one is created if there is
+        no upstream for the current event loop. The replaced upstream and
+        the least recently used ones over `max_upstreams` are closed when
+        their pending queries are done."""
+        key = (host, port)
+        upstream = self._upstreams.get(key)
+        if upstream is not None:
+            if upstream.loop is asyncio.get_running_loop():
+                self._upstreams.move_to_end(key)
+                return upstream
+            upstream.retire()
+        upstream = self._upstreams[key] = UDPUpstream(host, port)
+        self._upstreams.move_to_end(key)
+        while len(self._upstreams) > self.max_upstreams:
+            self._upstreams.popitem(last=False)[1].retire()
+        return upstream
+
+    async def exchange(self, name: str, record: str, server: str,
+                       port: int = DNS_PORT, dnssec: bool = False) -> bytes:
+        """Wire-format response to the query at specified DNS-server,
+        retries over TCP if the UDP response is truncated."""
+        upstream = self._get_upstream(server, port)
+        try:
+            data = await asyncio.wait_for(
+                upstream.exchange(name, record, self.timeout / self.tries,
+                                  dnssec),
+                self.timeout)
+            if len(data) < HEADER.size:
+                raise DNSQueryError('Malformed DNS response: too short')
+            if HEADER.unpack_from(data)[1] & FLAG_TC:
+                data = await asyncio.wait_for(
+                    tcp_exchange(server, port, name, record, dnssec),
+                    self.timeout)
+        except asyncio.TimeoutError:
+            raise DNSTimeout(f'{server} timed out') from None
+        except (OSError, asyncio.IncompleteReadError) as error:
+            raise DNSQueryError(f'{server}: {error}') from error
+        return data
+
+    async def query(self, name: str, record: str, server: str,
+                    port: int = DNS_PORT) -> DNSResponse:
+        """Resolve the record at specified DNS-server."""
+        return parse_response(
+            await self.exchange(name, record, server, port))
+
+    def close(self) -> None:
+        for upstream in self._upstreams.values():
+            upstream.close()
+        self._upstreams.clear()
+
+
+resolver = Resolver()
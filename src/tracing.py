@@ -0,0 +1,419 @@
+"""
+Request tracing: every bot update and API request gets the request ID and
+the spans of its stages (domain parsing, dig queries, whois, sending of the
+telegram message). The current span is kept in the contextvar, so it follows
+the request into the coroutines and tasks it starts. Finished requests are
+exported by TRACING_EXPORTER, the requests slower than TRACING_SLOW_THRESHOLD
+are logged with all their spans.
+"""
+import abc
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from typing import (TYPE_CHECKING, AsyncIterable, AsyncIterator, Dict, List,
+                    Optional, Union)
+
+import messages
+from constants import (TRACING_EXPORTER, TRACING_JSON_FILE,
+                       TRACING_MAX_SPANS, TRACING_OTLP_ENDPOINT,
+                       TRACING_SAMPLE_RATE, TRACING_SERVICE_NAME,
+                       TRACING_SLOW_SAMPLE_RATE, TRACING_SLOW_THRESHOLD)
+
+if TYPE_CHECKING:
+    import httpx
+
+# Request ID of the client (`X-Request-ID`) is used if it is the trace ID of
+# OpenTelemetry: 32 hex digits.
+REQUEST_ID_PATTERN: re.Pattern = re.compile(r'[0-9a-f]{32}')
+
+# Finished requests waiting for the export, the newer ones are dropped.
+EXPORT_QUEUE_SIZE: int = 1000
+
+# Max requests exported at once.
+EXPORT_BATCH_SIZE: int = 100
+
+# Max time (sec) to wait for the OTLP collector.
+OTLP_TIMEOUT: float = 10
+
+# Spans are recorded only if there is something to do with them, otherwise
+# requests get only the ID.
+RECORDING: bool = bool(TRACING_EXPORTER or TRACING_SLOW_THRESHOLD)
+
+
+class Span:
+    """Stage of the request, times are `perf_counter_ns`. The span is the
+    current one inside its `with` block, it ends with the block unless it
+    is deferred."""
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'attributes',
+                 'error', 'start', 'end', 'deferred', '_token')
+
+    def __init__(self, trace: 'Trace', name: str, parent_id: Optional[str],
+                 attributes: dict) -> None:
+        self.trace = trace
+        self.name = name
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.start = time.perf_counter_ns()
+        self.end: Optional[int] = None
+        self.deferred = False
+
+    def __enter__(self) -> 'Span':
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, error_type, error, traceback) -> None:
+        _current_span.reset(self._token)
+        if not self.deferred or error_type is not None:
+            self.finish(error_type)
+
+    def finish(self, error_type: Optional[type] = None) -> None:
+        self.end = time.perf_counter_ns()
+        if error_type is not None:
+            self.error = error_type.__name__
+        self.trace.close(self)
+
+    def defer(self) -> None:
+        """Keep the span open after its `with` block, it is finished by
+        `wrap` (or `finish()`)."""
+        self.deferred = True
+
+    async def wrap(self, iterator: AsyncIterable) -> AsyncIterator:
+        """Iterate with the span as the current one and finish the span
+        with the iterator, e.g. the body of the streamed response."""
+        token = _current_span.set(self)
+        error_type = None
+        try:
+            async for item in iterator:
+                yield item
+        except BaseException as error:
+            error_type = type(error)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish(error_type)
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self) -> float:
+        """Duration in ms, till now if the span isn't finished."""
+        return ((self.end or time.perf_counter_ns()) - self.start) / 1e6
+
+
+class _NoSpan:
+    """Span of the stage which isn't recorded."""
+
+    def __enter__(self) -> '_NoSpan':
+        return self
+
+    def __exit__(self, error_type, error, traceback) -> None:
+        pass
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def defer(self) -> None:
+        pass
+
+    def wrap(self, iterator: AsyncIterable) -> AsyncIterable:
+        return iterator
+
+
+NO_SPAN = _NoSpan()
+
+
+class Trace:
+    """Finished spans of one request. Spans which finish after the request
+    (tasks left running) are not recorded."""
+
+    def __init__(self, request_id: str) -> None:
+        self.request_id = request_id
+        self.root: Optional[Span] = None
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.finished = False
+        # Wall clock time of the start, span times are relative to it.
+        self.started_at = time.time_ns()
+        self.started = time.perf_counter_ns()
+
+    def close(self, span: Span) -> None:
+        """Records the finished span, the request is finished with its root
+        span."""
+        if self.finished:
+            return
+        if span is self.root:
+            self.finished = True
+            _finish(self)
+        elif len(self.spans) >= TRACING_MAX_SPANS:
+            self.dropped += 1
+        else:
+            self.spans.append(span)
+
+    def unix_ns(self, perf_ns: int) -> int:
+        return self.started_at + perf_ns - self.started
+
+    def offset(self, span: Span) -> float:
+        """Start of the span since the start of the request in ms."""
+        return (span.start - self.started) / 1e6
+
+    def to_dict(self) -> dict:
+        """Local JSON form of the request."""
+        return {
+            'request_id': self.request_id,
+            'name': self.root.name,
+            'start': self.started_at / 1e9,
+            'duration_ms': round(self.root.duration, 3),
+            'error': self.root.error,
+            'attributes': self.root.attributes,
+            'spans': [
+                {'name': span.name, 'span_id': span.span_id,
+                 'parent_id': span.parent_id,
+                 'offset_ms': round(self.offset(span), 3),
+                 'duration_ms': round(span.duration, 3),
+                 'error': span.error, 'attributes': span.attributes}
+                for span in self.spans
+            ],
+            'dropped_spans': self.dropped
+        }
+
+    def breakdown(self) -> str:
+        """Spans as the tree ordered by start: offset and duration."""
+        children: Dict[Optional[str], List[Span]] = {}
+        for span in self.spans:
+            children.setdefault(span.parent_id, []).append(span)
+        lines = []
+
+        def walk(span: Span, depth: int) -> None:
+            details = ''.join(f' {key}={value}'
+                              for key, value in span.attributes.items())
+            if span.error:
+                details += f' error={span.error}'
+            lines.append(messages.SLOW_REQUEST_SPAN.format(
+                '  ' * depth, span.name, self.offset(span), span.duration,
+                details))
+            for child in sorted(children.get(span.span_id, ()),
+                                key=lambda item: item.start):
+                walk(child, depth + 1)
+
+        walk(self.root, 0)
+        if self.dropped:
+            lines.append(messages.SLOW_REQUEST_DROPPED.format(self.dropped))
+        return '\n'.join(lines)
+
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar(
+    'current_span', default=None)
+
+
+def request_id() -> Optional[str]:
+    """ID of the current request, None outside of requests."""
+    current = _current_span.get()
+    return None if current is None else current.trace.request_id
+
+
+def span(name: str, **attributes) -> Union[Span, _NoSpan]:
+    """Span of the stage of the current request to use by `with`, more
+    attributes may be set by `set()`. Nothing is recorded outside of
+    requests."""
+    parent = _current_span.get()
+    if parent is None or not RECORDING:
+        return NO_SPAN
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+def request(name: str, client_request_id: Optional[str] = None,
+            **attributes) -> Union[Span, _NoSpan]:
+    """Root span of the request to use by `with`, with the new request ID
+    or the ID of the client if it is valid. Inside another request it is
+    the usual span."""
+    if _current_span.get() is not None:
+        return span(name, **attributes)
+    if client_request_id is None or not REQUEST_ID_PATTERN.fullmatch(
+            client_request_id):
+        client_request_id = os.urandom(16).hex()
+    trace = Trace(client_request_id)
+    trace.root = Span(trace, name, None, attributes)
+    return trace.root
+
+
+def _finish(trace: Trace) -> None:
+    """Logs the slow request and exports the finished one."""
+    if not RECORDING:
+        return
+    duration = trace.root.duration
+    if (TRACING_SLOW_THRESHOLD
+            and duration >= TRACING_SLOW_THRESHOLD * 1000
+            and random.random() < TRACING_SLOW_SAMPLE_RATE):
+        logging.warning(messages.SLOW_REQUEST.format(
+            trace.root.name, trace.request_id, duration, trace.breakdown()))
+    if exporter is not None and random.random() < TRACING_SAMPLE_RATE:
+        exporter.put(trace)
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds `request_id` of the current request to the log records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id() or '-'
+        return True
+
+
+class Exporter(abc.ABC):
+    """Exports the finished requests by batches in the background thread,
+    so the event loop doesn't wait for the disk or the collector."""
+
+    def __init__(self) -> None:
+        self.queue: queue.Queue = queue.Queue(EXPORT_QUEUE_SIZE)
+        self.thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._warned = False
+
+    def put(self, trace: Trace) -> None:
+        if self.thread is None:
+            with self._lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run,
+                                                   daemon=True)
+                    self.thread.start()
+                    atexit.register(self.close)
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            if not self._warned:
+                self._warned = True
+                logging.warning(messages.TRACES_DROPPED)
+        else:
+            self._warned = False
+
+    def _run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < EXPORT_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            traces = [trace for trace in batch if trace is not None]
+            if traces:
+                try:
+                    self.export(traces)
+                except Exception as error:
+                    logging.warning(messages.TRACES_EXPORT_ERROR.format(
+                        error))
+            if len(traces) < len(batch):
+                return
+
+    @abc.abstractmethod
+    def export(self, traces: List[Trace]) -> None:
+        """Export the batch of requests, called in the thread."""
+
+    def close(self, timeout: float = 5) -> None:
+        """Exports the queued requests and stops the thread."""
+        if self.thread is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self.thread.join(timeout)
+
+
+class JsonExporter(Exporter):
+    """Requests are appended to the file, one JSON per line."""
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self.path = path
+
+    def export(self, traces: List[Trace]) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.writelines(
+                json.dumps(trace.to_dict(), ensure_ascii=False,
+                           default=str) + '\n'
+                for trace in traces)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> List[dict]:
+    return [{'key': key, 'value': _otlp_value(value)}
+            for key, value in attributes.items() if value is not None]
+
+
+class OtlpExporter(Exporter):
+    """Requests are sent to the OpenTelemetry collector by OTLP/HTTP in
+    JSON encoding, request ID is the trace ID."""
+    # Span kinds of OTLP.
+    KIND_INTERNAL: int = 1
+    KIND_SERVER: int = 2
+    # Span status codes of OTLP.
+    STATUS_UNSET: int = 0
+    STATUS_ERROR: int = 2
+
+    def __init__(self, endpoint: str) -> None:
+        super().__init__()
+        self.endpoint = endpoint
+        self.client: Optional['httpx.Client'] = None
+
+    def _span(self, trace: Trace, span: Span) -> dict:
+        output = {
+            'traceId': trace.request_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': (self.KIND_SERVER if span is trace.root
+                     else self.KIND_INTERNAL),
+            'startTimeUnixNano': str(trace.unix_ns(span.start)),
+            'endTimeUnixNano': str(trace.unix_ns(span.end)),
+            'attributes': _otlp_attributes(span.attributes),
+            'status': {'code': self.STATUS_UNSET},
+        }
+        if span.parent_id is not None:
+            output['parentSpanId'] = span.parent_id
+        if span.error:
+            output['status'] = {'code': self.STATUS_ERROR,
+                                'message': span.error}
+        return output
+
+    def export(self, traces: List[Trace]) -> None:
+        if self.client is None:
+            import httpx
+
+            self.client = httpx.Client(timeout=OTLP_TIMEOUT)
+        spans = [self._span(trace, span)
+                 for trace in traces for span in (trace.root, *trace.spans)]
+        response = self.client.post(self.endpoint, json={'resourceSpans': [{
+            'resource': {'attributes': _otlp_attributes(
+                {'service.name': TRACING_SERVICE_NAME})},
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}]
+        }]})
+        response.raise_for_status()
+
+
+def create_exporter(name: str) -> Optional[Exporter]:
+    if name == 'json':
+        return JsonExporter(TRACING_JSON_FILE)
+    if name == 'otlp':
+        return OtlpExporter(TRACING_OTLP_ENDPOINT)
+    return None
+
+
+exporter: Optional[Exporter] = create_exporter(TRACING_EXPORTER)
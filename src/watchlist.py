@@ -0,0 +1,470 @@
+import asyncio
+import datetime
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import random
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import messages
+from batch import global_limiter, to_ndjson
+from constants import (TOKEN, WATCHLIST_ALLOW_PRIVATE_CALLBACKS,
+                       WATCHLIST_BATCH_SIZE, WATCHLIST_CONCURRENCY,
+                       WATCHLIST_INTERVALS, WATCHLIST_LEASE,
+                       WATCHLIST_MAX_WATCHES, WATCHLIST_NOTIFY_DAYS,
+                       WATCHLIST_PATH, WATCHLIST_QUERY_INTERVAL,
+                       WATCHLIST_RETRY_INTERVAL, WATCHLIST_SCHEDULER,
+                       WATCHLIST_SWEEP_INTERVAL, WATCHLIST_UNKNOWN_INTERVAL,
+                       WHOIS_WORKERS)
+from exceptions import BadCallbackUrl, WatchlistFull, WhoisBusy, WhoisTimeout
+from wd import Domain
+from whois_cache import WHOIS_ERRORS
+
+if TYPE_CHECKING:
+    import httpx
+
+# Watchers are chats (`tg:<chat id>`) or callback URLs.
+CHAT_PREFIX: str = 'tg:'
+
+# Max time (sec) to wait for the callback URL response.
+CALLBACK_TIMEOUT: float = 10
+
+
+def chat_watcher(chat_id: int) -> str:
+    return f'{CHAT_PREFIX}{chat_id}'
+
+
+def _callback_address(url: str) -> Tuple[str, int]:
+    """Host and port of the HTTP(S) callback URL."""
+    parts = urlsplit(url)
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise BadCallbackUrl(messages.BAD_CALLBACK_URL.format(
+            messages.CALLBACK_SCHEME))
+    return parts.hostname, port or (443 if parts.scheme == 'https' else 80)
+
+
+def _check_addresses(host: str, addresses: Iterable[str]) -> None:
+    """Callback host must resolve only to the public addresses, so the
+    watchlist can't be used to reach the internal services."""
+    addresses = list(addresses)
+    if not addresses:
+        raise BadCallbackUrl(messages.BAD_CALLBACK_URL.format(
+            messages.CALLBACK_NOT_RESOLVED.format(host)))
+    if WATCHLIST_ALLOW_PRIVATE_CALLBACKS:
+        return
+    for address in addresses:
+        # Scope of the IPv6 link-local address is dropped.
+        if not ipaddress.ip_address(address.split('%')[0]).is_global:
+            raise BadCallbackUrl(messages.BAD_CALLBACK_URL.format(
+                messages.CALLBACK_NOT_PUBLIC.format(host)))
+
+
+def check_callback_url(url: str) -> None:
+    """Raises `BadCallbackUrl` if the URL isn't HTTP(S) or its host isn't a
+    public address. Blocks on the resolution of the host."""
+    host, port = _callback_address(url)
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError):
+        infos = []
+    _check_addresses(host, (info[4][0] for info in infos))
+
+
+async def callback_addresses(host: str, port: int) -> List[str]:
+    """Addresses of the callback host resolved on the event loop, raises
+    `BadCallbackUrl` like `check_callback_url`."""
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            host, port, type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError):
+        infos = []
+    addresses = [info[4][0] for info in infos]
+    _check_addresses(host, addresses)
+    return addresses
+
+
+def check_interval(expiration_date: Optional[int],
+                   now: Optional[float] = None) -> int:
+    """Seconds to the next check: the closer the expiration date is, the
+    more often the domain is checked."""
+    if expiration_date is None:
+        return WATCHLIST_UNKNOWN_INTERVAL
+    days_left = (expiration_date - (now or time.time())) / 86400
+    for days, interval in WATCHLIST_INTERVALS:
+        if days_left > days:
+            return interval
+    return WATCHLIST_INTERVALS[-1][1]
+
+
+def format_date(timestamp: Optional[int]) -> str:
+    if timestamp is None:
+        return messages.WATCHLIST_UNKNOWN
+    return f'{datetime.datetime.utcfromtimestamp(timestamp):%Y-%m-%d}'
+
+
+def _list(values: Sequence[str]) -> str:
+    return ', '.join(values) or '-'
+
+
+def compare(domain: str, state: dict, whois: dict,
+            now: Optional[float] = None) -> Tuple[List[Tuple[str, str]], dict]:
+    """Events (kind, message) of the changes between the stored state of
+    the domain and its new whois result, and the new state."""
+    now = now or time.time()
+    registered = bool(whois.get('result'))
+    expiration_date = whois.get('expiration_date') if registered else None
+    statuses = sorted(whois.get('statuses') or []) if registered else []
+    name_servers = sorted(whois.get('name_servers') or []) if registered \
+        else []
+    new_state = {
+        'registered': registered,
+        'expiration_date': expiration_date,
+        'statuses': statuses,
+        'name_servers': name_servers,
+        'notified_days': state.get('notified_days'),
+    }
+    events = []
+    first_check = state.get('checked_at') is None
+
+    if not first_check:
+        if state['registered'] and not registered:
+            events.append(('registration',
+                           messages.WATCH_NOT_REGISTERED.format(domain)))
+        elif registered and not state['registered']:
+            events.append(('registration',
+                           messages.WATCH_REGISTERED.format(domain)))
+        if registered and state['registered']:
+            if expiration_date != state['expiration_date']:
+                events.append(('expiration',
+                               messages.WATCH_EXPIRATION_CHANGED.format(
+                                   domain,
+                                   format_date(state['expiration_date']),
+                                   format_date(expiration_date))))
+            if statuses != state['statuses']:
+                events.append(('statuses',
+                               messages.WATCH_STATUSES_CHANGED.format(
+                                   domain, _list(state['statuses']),
+                                   _list(statuses))))
+            if name_servers != state['name_servers']:
+                events.append(('name_servers',
+                               messages.WATCH_NAME_SERVERS_CHANGED.format(
+                                   domain, _list(state['name_servers']),
+                                   _list(name_servers))))
+
+    if expiration_date != state.get('expiration_date'):
+        # Renewed (or changed) domain is notified about its new expiration.
+        new_state['notified_days'] = None
+    if expiration_date is not None:
+        days_left = (expiration_date - now) / 86400
+        notified = new_state['notified_days']
+        if days_left <= 0:
+            if notified is None or notified > 0:
+                events.append(('expired', messages.WATCH_EXPIRED.format(
+                    domain, format_date(expiration_date))))
+                new_state['notified_days'] = 0
+        else:
+            due = [days for days in WATCHLIST_NOTIFY_DAYS
+                   if days_left <= days
+                   and (notified is None or days < notified)]
+            if due:
+                events.append(('expires', messages.WATCH_EXPIRES.format(
+                    domain, int(days_left) + 1, format_date(expiration_date))))
+                new_state['notified_days'] = min(due)
+    return events, new_state
+
+
+class Watchlist:
+    """
+    Domains watched by the chats of the telegram bot and by the callback
+    URLs of the API users, stored in SQLite.
+    The scheduler of every process takes the due domains with the lease, so
+    many processes may check them at once, and checks them through the whois
+    cache (RDAP or WHOIS) with limited concurrency. The watchers are
+    notified when the domain is about to expire and when its expiration
+    date, statuses or nameservers change. Async code calls SQLite in the
+    threads (`asyncio.to_thread`), so the locked database doesn't block
+    the event loop.
+    """
+
+    def __init__(self, path: str = WATCHLIST_PATH) -> None:
+        self.path = path
+        self.telegram_bot = None
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._http: Optional['httpx.AsyncClient'] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5,
+                                 check_same_thread=False,
+                                 isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS domains ('
+                'domain TEXT PRIMARY KEY, next_check REAL, lease_until REAL '
+                'DEFAULT 0, checked_at REAL, registered INTEGER, '
+                'expiration_date INTEGER, statuses TEXT, name_servers TEXT, '
+                'notified_days INTEGER)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS domains_next_check '
+                       'ON domains (next_check)')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS watches ('
+                'domain TEXT, watcher TEXT, created_at REAL, '
+                'PRIMARY KEY (watcher, domain))'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS watches_domain '
+                       'ON watches (domain)')
+            # Hashes of the secret tokens of the callback URLs.
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS watchers ('
+                'watcher TEXT PRIMARY KEY, token_hash TEXT, created_at REAL)'
+            )
+            self._db = db
+        return self._db
+
+    def _execute(self, query: str, parameters: Sequence = ()) -> list:
+        with self._lock:
+            return self._connect().execute(query, parameters).fetchall()
+
+    def add(self, domain: str, watcher: str) -> bool:
+        """Watch the domain, returns False if it is watched already.
+        New domain is checked by the next sweep."""
+        with self._lock:
+            db = self._connect()
+            if db.execute('SELECT 1 FROM watches WHERE watcher = ? AND '
+                          'domain = ?', (watcher, domain)).fetchone():
+                return False
+            watched, = db.execute('SELECT COUNT(*) FROM watches WHERE '
+                                  'watcher = ?', (watcher,)).fetchone()
+            if watched >= WATCHLIST_MAX_WATCHES:
+                raise WatchlistFull(
+                    messages.WATCH_FULL.format(WATCHLIST_MAX_WATCHES))
+            db.execute('INSERT OR IGNORE INTO domains (domain, next_check) '
+                       'VALUES (?, ?)', (domain, time.time()))
+            db.execute('INSERT INTO watches VALUES (?, ?, ?)',
+                       (domain, watcher, time.time()))
+        return True
+
+    @staticmethod
+    def _token_hash(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def create_token(self, watcher: str) -> Optional[str]:
+        """New secret token of the watcher, None if it has one already.
+        Only the hash of the token is stored."""
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            created = self._connect().execute(
+                'INSERT OR IGNORE INTO watchers VALUES (?, ?, ?)',
+                (watcher, self._token_hash(token), time.time())).rowcount
+        return token if created else None
+
+    def check_token(self, watcher: str, token: Optional[str]) -> bool:
+        """Whether the token is the secret token of the watcher."""
+        if not token:
+            return False
+        rows = self._execute(
+            'SELECT token_hash FROM watchers WHERE watcher = ?', (watcher,))
+        return bool(rows) and hmac.compare_digest(
+            rows[0]['token_hash'], self._token_hash(token))
+
+    def remove(self, domain: str, watcher: str) -> bool:
+        """Stop watching the domain, returns False if it isn't watched."""
+        with self._lock:
+            db = self._connect()
+            removed = db.execute(
+                'DELETE FROM watches WHERE watcher = ? AND domain = ?',
+                (watcher, domain)).rowcount
+            db.execute('DELETE FROM domains WHERE domain = ? AND NOT EXISTS '
+                       '(SELECT 1 FROM watches WHERE domain = ?)',
+                       (domain, domain))
+        return bool(removed)
+
+    @staticmethod
+    def _state(row: sqlite3.Row) -> dict:
+        return {
+            'domain': row['domain'],
+            'checked_at': row['checked_at'],
+            'next_check': row['next_check'],
+            'registered': bool(row['registered']),
+            'expiration_date': row['expiration_date'],
+            'statuses': json.loads(row['statuses'] or '[]'),
+            'name_servers': json.loads(row['name_servers'] or '[]'),
+            'notified_days': row['notified_days'],
+        }
+
+    def watched(self, watcher: str) -> List[dict]:
+        """Watched domains of the watcher with their last known state."""
+        rows = self._execute(
+            'SELECT domains.* FROM watches JOIN domains USING (domain) '
+            'WHERE watcher = ? ORDER BY domain', (watcher,))
+        return [self._state(row) for row in rows]
+
+    def watchers(self, domain: str) -> List[str]:
+        return [row['watcher'] for row in self._execute(
+            'SELECT watcher FROM watches WHERE domain = ?', (domain,))]
+
+    def claim(self, limit: int = WATCHLIST_BATCH_SIZE) -> List[dict]:
+        """Take the due domains with the lease, so other processes don't
+        check them at the same time."""
+        now = time.time()
+        rows = self._execute(
+            'UPDATE domains SET lease_until = ? WHERE domain IN ('
+            'SELECT domain FROM domains WHERE next_check <= ? AND '
+            'lease_until <= ? ORDER BY next_check LIMIT ?) RETURNING *',
+            (now + WATCHLIST_LEASE, now, now, limit))
+        return [self._state(row) for row in rows]
+
+    def _release(self, domain: str, next_check: float,
+                 state: Optional[dict] = None) -> None:
+        if state is None:
+            self._execute('UPDATE domains SET next_check = ?, lease_until = 0 '
+                          'WHERE domain = ?', (next_check, domain))
+            return
+        self._execute(
+            'UPDATE domains SET next_check = ?, lease_until = 0, '
+            'checked_at = ?, registered = ?, expiration_date = ?, '
+            'statuses = ?, name_servers = ?, notified_days = ? '
+            'WHERE domain = ?',
+            (next_check, time.time(), state['registered'],
+             state['expiration_date'], json.dumps(state['statuses']),
+             json.dumps(state['name_servers']), state['notified_days'],
+             domain))
+
+    def _retry_later(self, domain: str) -> None:
+        """Release the lease of the domain which is checked again after
+        WATCHLIST_RETRY_INTERVAL."""
+        self._release(domain, time.time() + WATCHLIST_RETRY_INTERVAL)
+
+    async def check(self, state: dict) -> List[Tuple[str, str]]:
+        """Check the claimed domain, notify its watchers about the events
+        and schedule the next check."""
+        domain = state['domain']
+        try:
+            # The watchlist doesn't take more whois workers than batches do,
+            # the rest is left for interactive requests.
+            async with global_limiter('whois', WHOIS_WORKERS):
+                whois = await Domain(domain).whois_json(force=True)
+        except (*WHOIS_ERRORS, WhoisBusy, WhoisTimeout) as error:
+            logging.warning(messages.WATCH_CHECK_ERROR.format(domain, error))
+            await asyncio.to_thread(self._retry_later, domain)
+            return []
+
+        events, new_state = compare(domain, state, whois)
+        interval = check_interval(new_state['expiration_date'])
+        # Jitter spreads the domains added at once over the time.
+        next_check = time.time() + interval * random.uniform(0.9, 1.0)
+        await asyncio.to_thread(self._release, domain, next_check, new_state)
+        for kind, message in events:
+            await self.notify(domain, kind, message, whois)
+        return events
+
+    async def _telegram(self):
+        """Bot of the telegram application, or the own one in the API."""
+        if self.telegram_bot is None:
+            from telegram import Bot
+            self.telegram_bot = Bot(TOKEN)
+            await self.telegram_bot.initialize()
+        return self.telegram_bot
+
+    async def notify(self, domain: str, kind: str, message: str,
+                     whois: dict) -> None:
+        for watcher in await asyncio.to_thread(self.watchers, domain):
+            try:
+                if watcher.startswith(CHAT_PREFIX):
+                    if not TOKEN:
+                        continue
+                    bot = await self._telegram()
+                    await bot.send_message(int(watcher[len(CHAT_PREFIX):]),
+                                           message)
+                else:
+                    # The host is checked again on connection: it may be
+                    # resolved to another address since the watch was
+                    # added. Redirects are not followed.
+                    if self._http is None:
+                        from callback_client import create_client
+                        self._http = create_client(callback_addresses,
+                                                   CALLBACK_TIMEOUT)
+                    response = await self._http.post(
+                        watcher, headers={'Content-Type': 'application/json'},
+                        content=to_ndjson({
+                            'domain': domain, 'event': kind,
+                            'message': message, 'whois': whois}))
+                    response.raise_for_status()
+            except Exception as error:
+                logging.warning(
+                    messages.WATCH_NOTIFY_ERROR.format(watcher, error))
+
+    async def sweep(self) -> int:
+        """Check the due domains, returns the amount of checked ones."""
+        claimed = await asyncio.to_thread(self.claim)
+        if not claimed:
+            return 0
+        states = iter(claimed)
+
+        async def worker() -> None:
+            for state in states:
+                try:
+                    await self.check(state)
+                except Exception as error:
+                    # One broken domain doesn't stop the others, its lease
+                    # is released to check it again later.
+                    logging.exception(messages.WATCH_CHECK_ERROR.format(
+                        state['domain'], error))
+                    try:
+                        await asyncio.to_thread(
+                            self._retry_later, state['domain'])
+                    except sqlite3.Error as release_error:
+                        logging.error(messages.WATCH_CHECK_ERROR.format(
+                            state['domain'], release_error))
+                await asyncio.sleep(WATCHLIST_QUERY_INTERVAL)
+
+        await asyncio.gather(*(worker() for _ in range(
+            min(WATCHLIST_CONCURRENCY, len(claimed)))))
+        return len(claimed)
+
+    async def run(self) -> None:
+        """Sweep the due domains forever, at once after the full batch."""
+        while True:
+            try:
+                checked = await self.sweep()
+            except Exception as error:
+                # The scheduler runs for the whole life of the process.
+                logging.exception(messages.WATCH_CHECK_ERROR.format(
+                    '*', error))
+                checked = 0
+            if checked < WATCHLIST_BATCH_SIZE:
+                await asyncio.sleep(WATCHLIST_SWEEP_INTERVAL)
+
+    def start(self) -> None:
+        """Start the scheduler in the background, if WATCHLIST_SCHEDULER."""
+        if WATCHLIST_SCHEDULER and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+watchlist = Watchlist()
@@ -1,15 +1,55 @@
 import asyncio
 import datetime
+import functools
+import ipaddress
+import logging
 import re
-from typing import Tuple
-
-import idna
-import whois
+import time
+from typing import (AsyncIterator, FrozenSet, Iterable, List, Optional,
+                    Sequence, Tuple, Union)
 
 import messages
-from exceptions import BadDomain
+from cache import dig_cache
+from exceptions import (BadDomain, DNSQueryError, DNSTimeout, RdapError,
+                        WhoisBusy, WhoisTimeout)
+from health import upstreams
+from dig_parser import DigOutputParser, rdata_content
+from dnssec import validate as dnssec_validate
 from constants import (ALLOWED_RECORDS, DEFAULT_TYPE, DNS_SERVERS, DIG_TIMEOUT,
-                       SHELL_OUTPUT_ENCODING)
+                       SHELL_OUTPUT_ENCODING, DIG_BACKEND, DIG_BACKENDS,
+                       DIG_CACHE_MAX_TTL, DIG_CACHE_NEGATIVE_TTL,
+                       DIG_ALL_PRESET, COMMON_RECORDS, TG_MESSAGE_MAX_LENGTH,
+                       WHOIS_BACKEND, WHOIS_SOURCE, WHOIS_SOURCES,
+                       IDNA_CACHE_SIZE, PROPAGATION_SERVERS,
+                       PROPAGATION_CONCURRENCY)
+from metrics import DIG_DURATION, DIG_IN_FLIGHT, SUBPROCESSES
+from resolver import RCODES, DNSResponse, parse_server, resolver
+from rdap import rdap_client
+from tracing import span
+from whois_cache import WHOIS_ERRORS, whois_cache, whois_program_query
+from whois_client import whois_client
+from whois_pool import whois_pool
+
+
+@functools.lru_cache(maxsize=IDNA_CACHE_SIZE)
+def _idna_encode(domain: str) -> str:
+    # Most of the domains are ASCII, so idna is imported on the first IDN.
+    import idna
+
+    try:
+        return idna.encode(domain).decode()
+    except idna.core.InvalidCodepoint:
+        return domain
+
+
+@functools.lru_cache(maxsize=IDNA_CACHE_SIZE)
+def _idna_decode(domain: str) -> str:
+    import idna
+
+    try:
+        return idna.decode(domain)
+    except idna.core.InvalidCodepoint:
+        return domain
 
 
 class Domain:
@@ -19,10 +59,24 @@ class Domain:
     various methods to get the information about extracted domain.
     """
     DOMAIN_REGEXP: str = r'[.\w-]+\.[\w-]{2,}'
-    DIG_QUERY_COLUMN: int = 4
+    DOMAIN_PATTERN: re.Pattern = re.compile(DOMAIN_REGEXP)
+    # Only these statuses are final answers, which are allowed to be cached.
+    DIG_CACHEABLE_RCODES: Tuple[int, ...] = (0, 3)
+    # Statuses of the requests the DNS-server didn't answer.
+    DIG_FAILED_STATUSES: Tuple[str, ...] = ('TIMEOUT', 'ERROR')
+    # Exit code of the `dig` program when the DNS-server doesn't respond.
+    DIG_TIMEOUT_EXIT_CODE: int = 9
+    # Max length of the `dig` output line, TXT records may be long.
+    DIG_LINE_LIMIT: int = 2 ** 20
+    # Servers of the API requests are arbitrary, so the others are counted
+    # in the metrics as `other`.
+    DIG_METRIC_SERVERS: FrozenSet[str] = frozenset(
+        (*DNS_SERVERS, *PROPAGATION_SERVERS))
 
     def __init__(self, raw_site: str) -> None:
-        self.domain = raw_site
+        with span('domain.parse') as current:
+            self.domain = raw_site
+            current.set(domain=self.domain)
 
     def __str__(self):
         return self.domain
@@ -35,19 +89,92 @@ class Domain:
     def domain(self, input_site: str) -> None:
         """Lookup for domain name in inputted string, raise the `BadDomain`
         exception if no domain in the string."""
-        domain = input_site.lower()
-        domain = re.search(self.DOMAIN_REGEXP, domain)
+        domain = self.normalize(input_site)
 
-        if not domain:
+        if domain is None:
             raise BadDomain(messages.BAD_DOMAIN)
 
-        self.__domain = self.domain_encode(domain.group())
+        self.__domain = domain
+
+    @classmethod
+    def normalize(cls, input_site: str) -> Optional[str]:
+        """Punycode domain name from the inputted string, None if there is
+        no domain in the string."""
+        domain = cls.DOMAIN_PATTERN.search(input_site.lower())
+        if domain is None:
+            return None
+        return cls.domain_encode(domain.group())
+
+    @classmethod
+    def from_many(cls, input_sites: Iterable[str]
+                  ) -> Tuple[List['Domain'], List[str]]:
+        """Domains from many inputted strings in one pass. Returns the
+        domains without duplicates (in order of the first occurrence) and
+        the strings without domain."""
+        normalize = cls.normalize
+        domains, bad, seen = [], [], set()
+        for input_site in input_sites:
+            name = normalize(input_site)
+            if name is None:
+                bad.append(input_site)
+            elif name not in seen:
+                seen.add(name)
+                domain = cls.__new__(cls)
+                domain.__domain = name
+                domains.append(domain)
+        return domains, bad
 
-    def whois_tg_message(self) -> str:
+    @staticmethod
+    async def _whois_lookup(domain: str) -> Optional[dict]:
+        """WHOIS record by the native client on the event loop or by the
+        blocking `whois` library in the whois pool."""
+        with span('whois.lookup', backend=WHOIS_BACKEND):
+            if WHOIS_BACKEND == 'native':
+                record = await whois_client.query(domain)
+            else:
+                record = await whois_pool.run(whois_program_query, domain)
+        if record is not None:
+            record['source'] = 'whois'
+        return record
+
+    @classmethod
+    async def _rdap_lookup(cls, domain: str) -> Optional[dict]:
+        """RDAP record, WHOIS one if the RDAP-server is unknown or fails."""
+        try:
+            with span('rdap.lookup'):
+                record = await rdap_client.query(domain)
+        except RdapError as error:
+            logging.info(messages.RDAP_FALLBACK.format(domain, error))
+            return await cls._whois_lookup(domain)
+        if record is not None:
+            record['source'] = 'rdap'
+        return record
+
+    async def _whois_query(self, force: bool = False,
+                           source: str = WHOIS_SOURCE):
+        """Whois query through the cache. Fresh cached result is returned at
+        once, otherwise the query is made to the `source`: `rdap` (WHOIS is
+        the fallback) or `whois`."""
+        if source not in WHOIS_SOURCES:
+            source = WHOIS_SOURCE
+        with span('whois', source=source, force=force) as current:
+            if not force:
+                found, query = whois_cache.get_fresh(
+                    whois_cache.key(self.domain, source))
+                current.set(cached=found)
+                if found:
+                    return query
+            lookup = (self._rdap_lookup if source == 'rdap'
+                      else self._whois_lookup)
+            return await whois_cache.query_async(self.domain, lookup, force,
+                                                 source)
+
+    async def whois_tg_message(self, force: bool = False,
+                               source: str = WHOIS_SOURCE) -> str:
         """Gets whois information about domain, then creates the telegram
         message with this information."""
         decoded_domain = self.domain_decode(self.domain)
-        query = whois.query(self.domain, force=True)
+        query = await self._whois_query(force, source)
 
         if not query:
             return messages.DOMAIN_NOT_REGISTERED
@@ -89,10 +216,13 @@ class Domain:
 
         return '\n'.join(whois_information)
 
-    def whois_json(self) -> dict:
-        """Makes whois query and brings it to the JSON format output."""
+    async def whois_json(self, force: bool = False,
+                         source: str = WHOIS_SOURCE) -> dict:
+        """Makes whois query and brings it to the JSON format output.
+        `force` - don't use the cached whois result, `source` - `rdap` or
+        `whois`."""
         decoded_domain = self.domain_decode(self.domain)
-        query = whois.query(self.domain, force=True)
+        query = await self._whois_query(force, source)
 
         if not query:
             return {
@@ -118,85 +248,601 @@ class Domain:
 
         return query.__dict__
 
-    async def _dig_task(self, server: str, record: str, output: dict):
-        """Coroutine for dig request to specified DNS-server."""
-        output['data'][server] = []
-        proc = await asyncio.create_subprocess_exec(
-            'dig',
-            '+noall',
-            '+answer',
-            self.domain,
-            f'@{server}',
-            record,
-            f'+timeout={DIG_TIMEOUT}',
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await proc.communicate()
-        temp_output = stdout.decode(SHELL_OUTPUT_ENCODING)
-        temp_output = re.sub('"', '', temp_output)
-        for result in temp_output.splitlines():
-            query = result.split(maxsplit=self.DIG_QUERY_COLUMN)
-            new_result = {
-                'ttl': query[1],
-                'content': query[4]
-            }
-            output['data'][server].append(new_result)
+    async def _dig_subprocess(self, server: str, record: str
+                              ) -> DNSResponse:
+        """Dig request to specified DNS-server via `dig` program, the output
+        is parsed line by line as it arrives."""
+        host, port = parse_server(server)
+        SUBPROCESSES.inc(program='dig')
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                'dig',
+                '+noall',
+                '+answer',
+                '+authority',
+                '+comments',
+                self.domain,
+                f'@{host}',
+                '-p',
+                str(port),
+                record,
+                f'+timeout={DIG_TIMEOUT}',
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=self.DIG_LINE_LIMIT
+            )
+            try:
+                parser, stderr = await asyncio.gather(
+                    DigOutputParser().read(proc.stdout), proc.stderr.read())
+                returncode = await proc.wait()
+            except BaseException:
+                if proc.returncode is None:
+                    proc.kill()
+                raise
+        finally:
+            SUBPROCESSES.dec(program='dig')
+        if returncode:
+            message = stderr.decode(SHELL_OUTPUT_ENCODING).strip() or (
+                f'dig exited with code {returncode}')
+            if returncode == self.DIG_TIMEOUT_EXIT_CODE:
+                raise DNSTimeout(message)
+            raise DNSQueryError(message)
+        return DNSResponse(0, parser.rcode, False, parser.answers,
+                           parser.authority)
+
+    async def _dig_query(self, server: str, record: str, backend: str
+                         ) -> DNSResponse:
+        """Dig request through the selected backend, errors of the backend
+        (no `dig` program, the name which can't be encoded) are raised as
+        `DNSQueryError`."""
+        try:
+            if backend == 'subprocess':
+                return await self._dig_subprocess(server, record)
+            return await resolver.query(
+                self.domain, record, *parse_server(server))
+        except (OSError, UnicodeError) as error:
+            raise DNSQueryError(
+                f'{type(error).__name__}: {error}') from error
+
+    async def _dig_lookup(self, server: str, record: str, backend: str
+                          ) -> Tuple[tuple, int]:
+        """Dig request through the selected backend. Returns the answers as
+        (fetch time, rcode, ((ttl, content), ...)) and the TTL for caching
+        them: the minimal TTL of the answers or the SOA minimum for empty
+        answers."""
+        health = upstreams.get(server)
+        started = time.monotonic()
+        DIG_IN_FLIGHT.inc()
+        try:
+            with span('dig.lookup', server=server, record=record,
+                      backend=backend):
+                response = await self._dig_query(server, record, backend)
+        except DNSQueryError as error:
+            health.record_failure(error)
+            DIG_DURATION.observe(
+                time.monotonic() - started,
+                server=self._dig_metric_server(server), backend=backend,
+                status=self._dig_error_status(error))
+            raise
+        finally:
+            DIG_IN_FLIGHT.dec()
+        latency = time.monotonic() - started
+        health.record_success(latency)
+        DIG_DURATION.observe(latency, server=self._dig_metric_server(server),
+                             backend=backend, status=response.status)
+
+        answers = tuple(
+            (answer.ttl, rdata_content(answer.rdata))
+            for answer in response.answers)
+        if response.rcode not in self.DIG_CACHEABLE_RCODES:
+            ttl = 0
+        elif answers:
+            ttl = min(answer_ttl for answer_ttl, _ in answers)
+        else:
+            ttl = response.negative_ttl()
+            if ttl is None:
+                ttl = DIG_CACHE_NEGATIVE_TTL
+        # Wall clock time, so the answers cached by other processes get the
+        # right TTLs.
+        return ((time.time(), response.rcode, answers),
+                min(ttl, DIG_CACHE_MAX_TTL))
 
-    async def dig(
-            self, record: str = DEFAULT_TYPE, ns_list: Tuple[str] = DNS_SERVERS
-    ) -> dict:
-        """Main dig coroutine. Create tasks for digging all the DNS_SERVERS
-        and returns information with results."""
-        record = record.upper()
+    @staticmethod
+    def _dig_failed_status() -> dict:
+        """Status of the request which failed by the unexpected error."""
+        return {'status': 'ERROR', 'time': None, 'timeout': False,
+                'cached': False}
 
-        if record not in ALLOWED_RECORDS:
-            record = DEFAULT_TYPE
+    @staticmethod
+    def _dig_error_status(error: DNSQueryError) -> str:
+        return 'TIMEOUT' if isinstance(error, DNSTimeout) else 'ERROR'
+
+    @classmethod
+    def _dig_metric_server(cls, server: str) -> str:
+        return server if server in cls.DIG_METRIC_SERVERS else 'other'
+
+    async def _dig_answers(self, server: str, record: str,
+                           backend: str = DIG_BACKEND, force: bool = False
+                           ) -> Tuple[Optional[list], dict]:
+        """Dig request to specified DNS-server. Returns the answers (None if
+        the server doesn't answer) and the status of the request: rcode,
+        time in ms, timeout flag and whether the answers are from the cache.
+        Answers are cached by (domain, record, server, backend) until their
+        TTL expires, TTLs in the output are decreased by the time spent in
+        the cache."""
+        started = time.monotonic()
+        started_at = time.time()
+        status = {'status': None, 'time': None, 'timeout': False,
+                  'cached': False}
+        try:
+            with span('dig.query', server=server, record=record) as current:
+                fetched_at, rcode, answers = await dig_cache.fetch(
+                    (self.domain, record, server, backend),
+                    lambda: self._dig_lookup(server, record, backend),
+                    force
+                )
+                current.set(status=RCODES.get(rcode, str(rcode)),
+                            cached=fetched_at < started_at)
+        except DNSQueryError as error:
+            status['status'] = self._dig_error_status(error)
+            status['timeout'] = isinstance(error, DNSTimeout)
+            status['time'] = round((time.monotonic() - started) * 1000, 2)
+            return None, status
+        status['status'] = RCODES.get(rcode, str(rcode))
+        status['time'] = round((time.monotonic() - started) * 1000, 2)
+        status['cached'] = fetched_at < started_at
+        elapsed = max(int(time.time() - fetched_at), 0)
+        return [
+            {
+                'ttl': str(max(ttl - elapsed, 0)),
+                'content': content
+            }
+            for ttl, content in answers
+        ], status
+
+    async def _dig_task(self, server: str, record: str, output: dict,
+                        statuses: dict, backend: str = DIG_BACKEND,
+                        force: bool = False):
+        """Coroutine for dig request to specified DNS-server, results are put
+        to `output[server]`, status of the request to `statuses[server]`."""
+        output[server] = []
+        answers, statuses[server] = await self._dig_answers(
+            server, record, backend, force)
+        if answers is not None:
+            output[server] = answers
+
+    async def _dig_fastest(self, servers: Sequence[str], record: str,
+                           output: dict, statuses: dict,
+                           backend: str = DIG_BACKEND, force: bool = False):
+        """Hedged dig request: servers are queried one by one in order of
+        their latency, the next server is queried when the previous one
+        doesn't answer in its hedge delay or fails. Only the first answer is
+        put to `output`, statuses of the failed servers are kept too."""
+        tasks = {}
+
+        def handle(done) -> bool:
+            for task in done:
+                server = tasks.pop(task)
+                answers, statuses[server] = task.result()
+                if answers is not None:
+                    output[server] = answers
+                    return True
+            return False
 
-        output = {
-            'domain': self.domain,
-            'record': record,
-            'result': True,
-            'data': {}
-        }
+        try:
+            for server in upstreams.rank(servers):
+                task = asyncio.ensure_future(
+                    self._dig_answers(server, record, backend, force))
+                tasks[task] = server
+                done, _ = await asyncio.wait(
+                    tasks, timeout=upstreams.get(server).hedge_delay(),
+                    return_when=asyncio.FIRST_COMPLETED)
+                if handle(done):
+                    return
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED)
+                if handle(done):
+                    return
+        finally:
+            for task in tasks:
+                task.cancel()
 
-        tasks = [asyncio.ensure_future(
-            self._dig_task(server, record, output)) for server in ns_list]
-        await asyncio.wait(tasks)
+    @staticmethod
+    def dig_records(record: Union[str, Sequence[str]]) -> List[str]:
+        """Normalize the record or the list of records to dig: unknown
+        records are dropped, `ALL` preset is expanded to COMMON_RECORDS."""
+        if isinstance(record, str):
+            record = [record]
+        records = []
+        for current_record in record:
+            current_record = current_record.upper()
+            if current_record == DIG_ALL_PRESET:
+                records.extend(COMMON_RECORDS)
+            elif current_record in ALLOWED_RECORDS:
+                records.append(current_record)
+        return list(dict.fromkeys(records)) or [DEFAULT_TYPE]
 
+    async def dig(
+            self, record: Union[str, Sequence[str]] = DEFAULT_TYPE,
+            ns_list: Tuple[str] = DNS_SERVERS, backend: str = DIG_BACKEND,
+            force: bool = False, fastest: bool = False, dnssec: bool = False
+    ) -> dict:
+        """Main dig coroutine. Create tasks for digging all the DNS_SERVERS
+        and returns information with results.
+        `ns_list` - DNS-servers as `host` or `host#port`.
+        `record` - one record or the list of records (or `ALL` preset), all
+        the (record, server) pairs are digged concurrently and the results
+        are grouped by record.
+        DNS-servers with open circuit breaker are skipped and listed in
+        `skipped` of the output.
+        `servers` of the output has the same layout as `data` and keeps the
+        status of every request: rcode, time in ms, timeout flag and whether
+        the answers are from the cache.
+        `force` - don't use the cached answers.
+        `fastest` - return only the first answer of the healthy servers.
+        `dnssec` - validate the records by their DNSSEC chain of trust at
+        the same time, the result is in `dnssec` of the output."""
+        multiple = (not isinstance(record, str)
+                    or record.upper() == DIG_ALL_PRESET)
+        records = self.dig_records(record)
+        validation = None
+        if dnssec:
+            validation = asyncio.ensure_future(
+                self.dnssec(records, ns_list, force))
+
+        if backend not in DIG_BACKENDS:
+            backend = DIG_BACKEND
+
+        data = {current_record: {} for current_record in records}
+        statuses = {current_record: {} for current_record in records}
+
+        servers = upstreams.available(ns_list)
+        # Tasks are created inside the span, so their spans are its children.
+        with span('dig', records=' '.join(records), servers=len(servers),
+                  backend=backend, fastest=fastest):
+            # Task: (record, servers it queries).
+            if fastest:
+                tasks = {
+                    asyncio.ensure_future(self._dig_fastest(
+                        servers, current_record, data[current_record],
+                        statuses[current_record], backend, force)):
+                    (current_record, servers)
+                    for current_record in records
+                }
+            else:
+                tasks = {
+                    asyncio.ensure_future(self._dig_task(
+                        server, current_record, data[current_record],
+                        statuses[current_record], backend, force)):
+                    (current_record, [server])
+                    for current_record in records for server in servers
+                }
+            await asyncio.wait(tasks)
+
+        for task, (current_record, task_servers) in tasks.items():
+            error = task.exception()
+            if error is None:
+                continue
+            logging.error(messages.DIG_TASK_ERROR.format(
+                self.domain, current_record, error), exc_info=error)
+            for server in task_servers:
+                data[current_record].setdefault(server, [])
+                statuses[current_record].setdefault(
+                    server, self._dig_failed_status())
+
+        skipped = [server for server in ns_list if server not in servers]
+        if multiple:
+            output = {
+                'domain': self.domain,
+                'records': records,
+                'result': True,
+                'data': data,
+                'servers': statuses,
+                'skipped': skipped
+            }
+        else:
+            output = {
+                'domain': self.domain,
+                'record': records[0],
+                'result': True,
+                'data': data[records[0]],
+                'servers': statuses[records[0]],
+                'skipped': skipped
+            }
+        if validation is not None:
+            output['dnssec'] = await validation
         return output
 
-    async def dig_tg_message(self, record: str = DEFAULT_TYPE) -> str:
-        """Generates telegram message with dig information about domain."""
+    async def dnssec(
+            self, record: Union[str, Sequence[str]] = DEFAULT_TYPE,
+            ns_list: Sequence[str] = DNS_SERVERS, force: bool = False
+    ) -> dict:
+        """DNSSEC validation of the zones from the root to the domain and of
+        the records of the domain, see `dnssec.validate`."""
+        records = self.dig_records(record)
+        with span('dnssec', records=' '.join(records)) as current:
+            result = await dnssec_validate(self.domain, records, ns_list,
+                                           force)
+            current.set(status=result['status'])
+        return result
+
+    async def dnssec_tg_message(
+            self, record: Union[str, Sequence[str]] = DEFAULT_TYPE) -> str:
+        """Generates telegram message with DNSSEC status of every zone of
+        the chain of trust and of the records."""
+        output = await self.dnssec(record)
+        icons = messages.DNSSEC_STATUS_ICONS
+
+        def status(result: dict) -> str:
+            if result['reason']:
+                return messages.DNSSEC_REASON.format(
+                    result['status'], result['reason'])
+            return result['status']
+
+        message = [messages.DNSSEC_TG_LABEL.format(
+            self.domain, icons[output['status']], output['status']), '']
+        for zone in output['zones']:
+            details = status(zone)
+            if zone['keys']:
+                details = messages.DNSSEC_REASON.format(
+                    details, messages.DNSSEC_ZONE_KEYS.format(
+                        ', '.join(map(str, zone['keys']))))
+            message.append(messages.DNSSEC_ZONE.format(
+                icons[zone['status']], zone['zone'], details))
+        message.append('')
+        for record, result in output['records'].items():
+            message.append(messages.DNSSEC_RECORD.format(
+                record, icons[result['status']], status(result)))
+        return self.tg_cut('\n'.join(message))
+
+    async def dig_tg_message(
+            self, record: Union[str, Sequence[str]] = DEFAULT_TYPE) -> str:
+        """Generates telegram message with dig information about domain.
+        For several records the results are grouped by record."""
         dig_output = await self.dig(record=record)
         domain = dig_output.pop('domain')
-        record = dig_output.pop('record')
+        if 'records' in dig_output:
+            data = dig_output['data']
+        else:
+            data = {dig_output['record']: dig_output['data']}
 
         message = [messages.DIG_TG_LABEL.format(domain)]
-        for ns, results in dig_output['data'].items():
-            message.append(messages.DIG_RECORD_AT_NS.format(record, ns))
-            if results:
-                current_results = [result.get('content') for result in results]
-                message.extend(current_results)
-            else:
-                message.append(messages.DIG_EMPTY_RESPONSE)
+        for record, servers in data.items():
+            for ns, results in servers.items():
+                message.append(messages.DIG_RECORD_AT_NS.format(record, ns))
+                if results:
+                    current_results = [
+                        result.get('content') for result in results]
+                    message.extend(current_results)
+                else:
+                    message.append(messages.DIG_EMPTY_RESPONSE)
+
+        if dig_output['skipped']:
+            message.append(messages.DIG_SKIPPED.format(
+                ', '.join(dig_output['skipped'])))
+
+        return self.tg_cut('\n'.join(message))
+
+    @staticmethod
+    def tg_cut(message: str) -> str:
+        """Cut the message to the max length of telegram message."""
+        if len(message) > TG_MESSAGE_MAX_LENGTH:
+            cut = TG_MESSAGE_MAX_LENGTH - len(messages.MESSAGE_CUT)
+            message = message[:cut] + messages.MESSAGE_CUT
+        return message
+
+    async def propagation(
+            self, record: str = DEFAULT_TYPE,
+            servers: Sequence[str] = PROPAGATION_SERVERS,
+            force: bool = False,
+            concurrency: int = PROPAGATION_CONCURRENCY
+    ) -> AsyncIterator[dict]:
+        """Propagation check: the record is digged at all the `servers` by
+        the native DNS client, at most `concurrency` servers at once, open
+        circuit breakers are ignored. Results are yielded in order of
+        completion: the server, the status of the request like in `dig` and
+        the answers (empty if the server doesn't answer)."""
+        record = self.dig_records(record)[0]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def query(server: str) -> dict:
+            async with semaphore:
+                answers, status = await self._dig_answers(
+                    server, record, 'native', force)
+            return {'server': server, **status, 'answers': answers or []}
+
+        tasks = [asyncio.ensure_future(query(server))
+                 for server in dict.fromkeys(servers)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @classmethod
+    def propagation_summary(cls, results: Iterable[dict]) -> dict:
+        """Consistency summary of the propagation check results: servers
+        grouped by the same status and answers (ignoring TTLs and order),
+        the biggest groups first, and the servers which didn't answer."""
+        groups = {}
+        failed = []
+        total = 0
+        for result in results:
+            total += 1
+            if result['status'] in cls.DIG_FAILED_STATUSES:
+                failed.append(result['server'])
+                continue
+            answers = tuple(sorted(
+                {answer['content'] for answer in result['answers']}))
+            groups.setdefault((result['status'], answers), []).append(
+                result['server'])
+        return {
+            'total': total,
+            'answered': total - len(failed),
+            'consistent': len(groups) == 1,
+            'groups': [
+                {'status': status, 'answers': list(answers),
+                 'servers': servers}
+                for (status, answers), servers in sorted(
+                    groups.items(), key=lambda group: -len(group[1]))
+            ],
+            'failed': failed
+        }
 
-        return '\n'.join(message)
+    def propagation_tg_message(self, record: str, summary: dict,
+                               servers: int, finished: bool = True) -> str:
+        """Generates telegram message with the propagation check summary,
+        `servers` - amount of the checked servers."""
+        message = [messages.PROPAGATION_TG_LABEL.format(
+            record, self.domain, summary['answered'], servers)]
+        for group in summary['groups']:
+            if group['status'] != 'NOERROR':
+                message.append(messages.PROPAGATION_GROUP_STATUS.format(
+                    group['status'], len(group['servers'])))
+                continue
+            message.append(messages.PROPAGATION_GROUP.format(
+                len(group['servers'])))
+            message.extend(group['answers'] or [messages.DIG_EMPTY_RESPONSE])
+        if summary['failed']:
+            message.append(messages.PROPAGATION_FAILED.format(
+                ', '.join(summary['failed'])))
+        if not finished:
+            message.append(messages.PROPAGATION_IN_PROGRESS)
+        elif summary['consistent']:
+            message.append(messages.PROPAGATION_CONSISTENT)
+        elif summary['groups']:
+            message.append(messages.PROPAGATION_INCONSISTENT.format(
+                len(summary['groups'])))
+        return self.tg_cut('\n'.join(message))
+
+    async def _first_answers(self, record: str,
+                             dns: Sequence[str] = DNS_SERVERS,
+                             force: bool = False) -> List[str]:
+        """Contents of the answers of the first answered DNS-server."""
+        output = await self.dig(record, dns, force=force, fastest=True)
+        for answers in output['data'].values():
+            return [answer['content'] for answer in answers]
+        return []
 
     @staticmethod
-    def domain_encode(domain: str) -> str:
-        """Encode domain from IDN to punycode."""
+    def _soa_serial(contents: Iterable[str]) -> Optional[int]:
+        """Serial of the SOA record of the answers contents."""
+        for content in contents:
+            fields = content.split()
+            if len(fields) == 7 and fields[2].isdigit():
+                return int(fields[2])
+        return None
+
+    @staticmethod
+    def _is_address(content: str) -> bool:
+        try:
+            ipaddress.ip_address(content)
+        except ValueError:
+            return False
+        return True
+
+    async def _zone(self, dns: Sequence[str] = DNS_SERVERS,
+                    force: bool = False) -> Optional['Domain']:
+        """Apex of the zone of the domain: the domain itself or the nearest
+        parent domain with SOA record."""
+        labels = self.domain.split('.')
+        for index in range(len(labels) - 1):
+            zone = self if index == 0 else Domain('.'.join(labels[index:]))
+            answers = await zone._first_answers('SOA', dns, force)
+            if self._soa_serial(answers) is not None:
+                return zone
+        return None
+
+    async def authority(self, dns: Sequence[str] = DNS_SERVERS,
+                        force: bool = False) -> dict:
+        """Check of the authoritative nameservers of the zone of the domain:
+        NS records of the zone apex are resolved and every nameserver
+        address is asked for the SOA record directly. The nameservers are
+        consistent if all of them answer with the same serial."""
+        zone = await self._zone(dns, force)
+        if zone is None:
+            return {'zone': None, 'result': False, 'name_servers': [],
+                    'serials': [], 'consistent': False}
+
+        name_servers = [name.rstrip('.').lower() for name in
+                        await zone._first_answers('NS', dns, force)]
+        addresses = await asyncio.gather(*(
+            Domain(name)._first_answers('A', dns, force)
+            for name in name_servers))
+        checks = [(name, address)
+                  for name, name_addresses in zip(name_servers, addresses)
+                  for address in name_addresses if self._is_address(address)]
+        answers = await asyncio.gather(*(
+            zone._dig_answers(address, 'SOA', 'native', force)
+            for _, address in checks))
+
+        servers = [
+            {'name': name, 'address': address, 'status': status['status'],
+             'time': status['time'],
+             'serial': self._soa_serial(
+                 answer['content'] for answer in soa or ())}
+            for (name, address), (soa, status) in zip(checks, answers)
+        ]
+        serials = sorted({server['serial'] for server in servers
+                          if server['serial'] is not None})
+        return {
+            'zone': zone.domain,
+            'result': True,
+            'name_servers': servers,
+            'serials': serials,
+            'consistent': bool(servers) and len(serials) == 1 and all(
+                server['serial'] is not None for server in servers)
+        }
+
+    async def _report_whois(self, force: bool = False,
+                            source: str = WHOIS_SOURCE) -> dict:
         try:
-            domain = idna.encode(domain)
-        except idna.core.InvalidCodepoint:
+            return await self.whois_json(force, source)
+        except (*WHOIS_ERRORS, WhoisBusy, WhoisTimeout) as error:
+            return {'message': str(error), 'result': False}
+
+    async def report(
+            self, record: Union[str, Sequence[str]] = DIG_ALL_PRESET,
+            dns: Sequence[str] = DNS_SERVERS, force: bool = False,
+            source: str = WHOIS_SOURCE
+    ) -> AsyncIterator[Tuple[str, dict]]:
+        """Full report of the domain: whois, dig of the records and check of
+        the authoritative nameservers run concurrently. Parts are yielded as
+        (`whois`, `dig` or `authority`, result) as soon as they are ready,
+        whois errors are returned as the result of its part."""
+        async def part(name: str, coroutine) -> Tuple[str, dict]:
+            return name, await coroutine
+
+        tasks = [
+            asyncio.ensure_future(part('whois',
+                                       self._report_whois(force, source))),
+            asyncio.ensure_future(part('dig',
+                                       self.dig(record, dns, force=force))),
+            asyncio.ensure_future(part('authority',
+                                       self.authority(dns, force))),
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def domain_encode(domain: str) -> str:
+        """Encode domain from IDN to punycode. ASCII domains are returned as
+        is, IDNs are memoized."""
+        if domain.isascii():
             return domain
-        return domain.decode()
+        with span('domain.idna'):
+            return _idna_encode(domain)
 
     @staticmethod
     def domain_decode(domain: str) -> str:
-        """Decode domain from punycode to IDN."""
-        try:
-            domain = idna.decode(domain)
-        except idna.core.InvalidCodepoint:
+        """Decode domain from punycode to IDN. Domains without punycode
+        labels are returned as is, others are memoized."""
+        if 'xn--' not in domain:
             return domain
-        return domain
+        return _idna_decode(domain)
@@ -3,8 +3,25 @@ from pathlib import Path
 
 BASE_DIR = Path(__file__).parent.parent
 
-sys.path.append(str(BASE_DIR))
+# Modules of the project are top-level ones.
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
 
-from constants import DEFAULT_TYPE, DNS_SERVERS, ALLOWED_RECORDS  # noqa
+from constants import (DEFAULT_TYPE, DNS_SERVERS, ALLOWED_RECORDS,  # noqa
+                       DIG_BACKEND, DIG_BACKENDS, WHOIS_SOURCE, TOKEN,
+                       BOT_MODE, BOT_WEBHOOK_PATH, BOT_WEBHOOK_SECRET,
+                       PROPAGATION_SERVERS, PROPAGATION_MAX_SERVERS,
+                       DIG_ALL_PRESET, BATCH_MAX_DOMAINS, BATCH_MAX_FILE_SIZE)
 from wd import Domain  # noqa
-from exceptions import BadDomain  # noqa
\ No newline at end of file
+from cache import dig_cache  # noqa
+from health import upstreams  # noqa
+from resolver import resolver  # noqa
+from whois_cache import whois_cache, WHOIS_ERRORS  # noqa
+from batch import run_batch, read_lines, to_ndjson  # noqa
+from exceptions import (BadDomain, WhoisBusy, WhoisTimeout,  # noqa
+                        WatchlistFull, BadNetwork, BadCallbackUrl)
+from watchlist import watchlist, check_callback_url  # noqa
+from ptr import parse_network, ptr_sweep  # noqa
+import messages  # noqa
+import metrics  # noqa
+import tracing  # noqa
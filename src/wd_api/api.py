@@ -1,47 +1,315 @@
-from fastapi import APIRouter
-import whois
+import asyncio
+import json
+import tempfile
+from typing import List, Optional, Union
 
-from .schemas import DomainDig, DomainWhois, DigSettings
-from . import DEFAULT_TYPE, Domain, BadDomain, ALLOWED_RECORDS
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
-router = APIRouter()
+from .responses import NegotiatedRoute
+from .schemas import (DomainDig, DomainWhois, DigSettings, CacheStats,
+                      WhoisCacheStats, DomainBatch, UpstreamHealth,
+                      WatchDomain, WatchedDomain, Message, DigOutput,
+                      DigRecordsOutput, WhoisOutput, DomainReport)
+from . import (DEFAULT_TYPE, DNS_SERVERS, Domain, BadDomain, ALLOWED_RECORDS,
+               DIG_BACKEND, DIG_BACKENDS, dig_cache, whois_cache, WhoisBusy,
+               WhoisTimeout, WHOIS_ERRORS, run_batch, read_lines, to_ndjson,
+               upstreams, watchlist, WatchlistFull, PROPAGATION_SERVERS,
+               PROPAGATION_MAX_SERVERS, BadNetwork, parse_network, ptr_sweep,
+               BadCallbackUrl, check_callback_url, messages,
+               BATCH_MAX_FILE_SIZE)
+
+# Responses are JSON or msgpack, by the `Accept` header of the request.
+router = APIRouter(route_class=NegotiatedRoute)
+
+# Seconds to wait before retry, when all the whois workers are busy.
+WHOIS_RETRY_AFTER: int = 5
+
+# Uploaded batch files bigger than this (bytes) are kept on the disk.
+BATCH_SPOOL_SIZE: int = 1024 * 1024
 
 
 @router.get('/dig/settings', tags=['dig'], response_model=DigSettings)
 def dig_settings():
     """Allows to get information about current
-    DIG settings (default type and allowed records to dig)."""
-    return {"default_type": DEFAULT_TYPE, "allowed_records": ALLOWED_RECORDS}
+    DIG settings (default type, allowed records and backends to dig)."""
+    return {"default_type": DEFAULT_TYPE, "allowed_records": ALLOWED_RECORDS,
+            "default_backend": DIG_BACKEND, "allowed_backends": DIG_BACKENDS}
+
+
+@router.get('/dig/cache', tags=['dig'], response_model=CacheStats)
+def dig_cache_stats():
+    """Allows to get DIG answers cache counters to size the cache."""
+    return dig_cache.stats()
+
+
+@router.get('/dig/upstreams', tags=['dig'],
+            response_model=List[UpstreamHealth])
+def dig_upstreams():
+    """Allows to get health of the DNS-servers: average latency, failure
+    rate and circuit breaker state."""
+    return upstreams.stats()
 
 
-@router.post('/dig', tags=['dig'])
+# `dnssec` is in the output only if it is asked.
+@router.post('/dig', tags=['dig'],
+             response_model=Union[DigOutput, DigRecordsOutput, Message],
+             response_model_exclude_unset=True)
 async def dig_api(request_data: DomainDig):
-    """Allows to get DIG information about domain."""
+    """Allows to get DIG information about domain, optionally validated by
+    DNSSEC."""
     try:
         domain = Domain(request_data.domain)
         dns = request_data.dns
         if isinstance(request_data.dns, str):
             dns = [dns]
-        dig_output = await domain.dig(request_data.record, dns)
+        dig_output = await domain.dig(
+            request_data.record, dns, request_data.backend,
+            request_data.force, request_data.fastest, request_data.dnssec)
         return dig_output
     except BadDomain:
         return {'message': 'Bad domain', 'result': False}
 
 
-@router.post('/whois', tags=['whois'])
-def whois_api(request_data: DomainWhois):
+def _sse_event(event: str, data: dict) -> str:
+    """Server-sent event with JSON data."""
+    return (f'event: {event}\n'
+            f'data: {json.dumps(data, ensure_ascii=False)}\n\n')
+
+
+async def _propagation_stream(domain: Domain, record: str, dns: List[str],
+                              force: bool):
+    results = []
+    async for result in domain.propagation(record, dns, force):
+        results.append(result)
+        yield _sse_event('result', result)
+    summary = domain.propagation_summary(results)
+    summary.update(domain=domain.domain, record=record)
+    yield _sse_event('summary', summary)
+
+
+@router.get('/dig/propagation', tags=['dig'])
+async def dig_propagation_api(
+        domain: str,
+        record: str = DEFAULT_TYPE,
+        dns: List[str] = Query(list(PROPAGATION_SERVERS)),
+        force: bool = False
+):
+    """Allows to check the propagation of the record across many public
+    resolvers. Results are streamed as server-sent events: `result` event
+    for every resolver in order of their answers, then `summary` event with
+    the resolvers grouped by the same answers."""
+    try:
+        domain = Domain(domain)
+    except BadDomain:
+        return {'message': 'Bad domain', 'result': False}
+    if len(dns) > PROPAGATION_MAX_SERVERS:
+        return JSONResponse(
+            {'message': f'Max {PROPAGATION_MAX_SERVERS} DNS-servers',
+             'result': False}, status_code=400)
+    record = domain.dig_records(record)[0]
+    return StreamingResponse(
+        _propagation_stream(domain, record, dns, force),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@router.get('/whois/cache', tags=['whois'], response_model=WhoisCacheStats)
+def whois_cache_stats():
+    """Allows to get WHOIS results cache counters."""
+    return whois_cache.stats()
+
+
+@router.post('/whois', tags=['whois'],
+             response_model=Union[WhoisOutput, Message])
+async def whois_api(request_data: DomainWhois):
     """Allows to get WHOIS information about domain."""
     try:
         domain = Domain(request_data.domain)
-        whois_output = domain.whois_json()
+        whois_output = await domain.whois_json(request_data.force,
+                                               request_data.source)
         return whois_output
     except BadDomain:
         return {'message': 'Bad domain', 'result': False}
-    except (
-            whois.exceptions.WhoisCommandFailed,
-            whois.exceptions.WhoisPrivateRegistry,
-            whois.exceptions.FailedParsingWhoisOutput,
-            whois.exceptions.UnknownTld,
-            whois.exceptions.UnknownDateFormat
-    ) as error:
+    except WhoisBusy as error:
+        return JSONResponse(
+            {'message': str(error), 'result': False},
+            status_code=503,
+            headers={'Retry-After': str(WHOIS_RETRY_AFTER)}
+        )
+    except WhoisTimeout as error:
+        return JSONResponse(
+            {'message': str(error), 'result': False}, status_code=504)
+    except WHOIS_ERRORS as error:
         return {'message': str(error), 'result': False}
+
+
+async def _ndjson_stream(results):
+    async for result in results:
+        yield to_ndjson(result)
+
+
+async def _report_stream(domain: Domain, parts):
+    async for part, result in parts:
+        yield to_ndjson({'domain': domain.domain, 'part': part,
+                         'data': result})
+
+
+@router.post('/report', tags=['report'])
+async def report_api(request_data: DomainReport):
+    """Allows to get the full report about domain: WHOIS, DIG of the
+    records and check of the authoritative nameservers (SOA serials), all of
+    them run concurrently. With `stream` the parts are streamed as NDJSON as
+    soon as they are ready."""
+    try:
+        domain = Domain(request_data.domain)
+    except BadDomain:
+        return {'message': 'Bad domain', 'result': False}
+    dns = request_data.dns
+    if isinstance(dns, str):
+        dns = [dns]
+    parts = domain.report(request_data.record, dns, request_data.force,
+                          request_data.source)
+    if request_data.stream:
+        return StreamingResponse(_report_stream(domain, parts),
+                                 media_type='application/x-ndjson')
+    report = {'domain': domain.domain, 'result': True}
+    async for part, result in parts:
+        report[part] = result
+    return report
+
+
+@router.post('/batch', tags=['batch'])
+async def batch_api(request_data: DomainBatch):
+    """Allows to get DIG and WHOIS information about many domains at once.
+    Results are streamed as NDJSON (one JSON object per line) in order of
+    completion."""
+    dns = request_data.dns
+    if isinstance(dns, str):
+        dns = [dns]
+    results = run_batch(request_data.domains, request_data.records, dns,
+                        request_data.whois, request_data.force)
+    return StreamingResponse(
+        _ndjson_stream(results), media_type='application/x-ndjson')
+
+
+@router.post('/batch/file', tags=['batch'])
+async def batch_file_api(
+        request: Request,
+        records: List[str] = Query([DEFAULT_TYPE]),
+        dns: List[str] = Query(list(DNS_SERVERS)),
+        whois: bool = False,
+        force: bool = False
+):
+    """Allows to check domains from the uploaded text file (request body,
+    one domain per line, at most BATCH_MAX_FILE_SIZE bytes). Results are
+    streamed as NDJSON."""
+    too_large = JSONResponse(
+        {'message': f'Max {BATCH_MAX_FILE_SIZE} bytes of the batch file',
+         'result': False}, status_code=413)
+    length = request.headers.get('content-length', '')
+    if length.isdigit() and int(length) > BATCH_MAX_FILE_SIZE:
+        return too_large
+    # The body is spooled to the disk (in the thread) if it is big, the
+    # domains are read from the file lazily while results are streamed.
+    upload = tempfile.SpooledTemporaryFile(max_size=BATCH_SPOOL_SIZE)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > BATCH_MAX_FILE_SIZE:
+            upload.close()
+            return too_large
+        await asyncio.to_thread(upload.write, chunk)
+    upload.seek(0)
+    results = run_batch(read_lines(upload), records, dns, whois, force)
+    return StreamingResponse(
+        _ndjson_stream(results), media_type='application/x-ndjson',
+        background=BackgroundTask(upload.close))
+
+
+@router.get('/ptr', tags=['dig'])
+async def ptr_api(
+        network: str,
+        dns: List[str] = Query(list(DNS_SERVERS)),
+        force: bool = False
+):
+    """Allows to get PTR records of the IP address or of all the addresses
+    of the network (IPv4 or IPv6, CIDR notation). Results are streamed as
+    NDJSON in order of completion."""
+    try:
+        network = parse_network(network)
+    except BadNetwork as error:
+        return {'message': str(error), 'result': False}
+    return StreamingResponse(
+        _ndjson_stream(ptr_sweep(network, dns, force)),
+        media_type='application/x-ndjson')
+
+
+def _watch_forbidden() -> JSONResponse:
+    return JSONResponse({'message': messages.WATCH_FORBIDDEN,
+                         'result': False}, status_code=403)
+
+
+# Routes of the watchlist are sync ones, they are run in the thread pool, so
+# the resolution of the callback host and SQLite don't block the loop.
+@router.post('/watchlist', tags=['watchlist'])
+def watch_api(request_data: WatchDomain,
+              x_watch_token: Optional[str] = Header(None)):
+    """Allows to watch the domain: the callback URL is notified when the
+    domain is about to expire or its statuses or nameservers change.
+    The callback host must be a public address. The first watch of the
+    callback URL returns its secret `token`, the next requests of this URL
+    must send it in the `X-Watch-Token` header."""
+    callback_url = str(request_data.callback_url)
+    try:
+        domain = Domain(request_data.domain)
+        check_callback_url(callback_url)
+    except BadDomain:
+        return {'message': 'Bad domain', 'result': False}
+    except BadCallbackUrl as error:
+        return JSONResponse(
+            {'message': str(error), 'result': False}, status_code=400)
+    token = None
+    if not watchlist.check_token(callback_url, x_watch_token):
+        token = None if x_watch_token else watchlist.create_token(
+            callback_url)
+        if token is None:
+            return _watch_forbidden()
+    try:
+        added = watchlist.add(domain.domain, callback_url)
+    except WatchlistFull as error:
+        return JSONResponse(
+            {'message': str(error), 'result': False}, status_code=429)
+    output = {'domain': domain.domain, 'result': True, 'added': added}
+    if token is not None:
+        output['token'] = token
+    return output
+
+
+@router.get('/watchlist', tags=['watchlist'],
+            response_model=List[WatchedDomain])
+def watchlist_api(callback_url: str,
+                  x_watch_token: Optional[str] = Header(None)):
+    """Allows to get the domains watched by the callback URL with their last
+    known expiration date, statuses and nameservers. Requires the token of
+    the callback URL in the `X-Watch-Token` header."""
+    if not watchlist.check_token(callback_url, x_watch_token):
+        return _watch_forbidden()
+    return watchlist.watched(callback_url)
+
+
+@router.delete('/watchlist', tags=['watchlist'])
+def unwatch_api(request_data: WatchDomain,
+                x_watch_token: Optional[str] = Header(None)):
+    """Allows to stop watching the domain by the callback URL. Requires the
+    token of the callback URL in the `X-Watch-Token` header."""
+    callback_url = str(request_data.callback_url)
+    if not watchlist.check_token(callback_url, x_watch_token):
+        return _watch_forbidden()
+    try:
+        domain = Domain(request_data.domain)
+    except BadDomain:
+        return {'message': 'Bad domain', 'result': False}
+    removed = watchlist.remove(domain.domain, callback_url)
+    return {'domain': domain.domain, 'result': removed}
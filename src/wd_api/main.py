@@ -1,7 +1,27 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 
+from . import metrics, resolver, BOT_MODE, TOKEN, watchlist
 from .api import router
+from .responses import APIResponse
 
-app = FastAPI()
+app = FastAPI(default_response_class=APIResponse,
+              on_startup=[watchlist.start],
+              on_shutdown=[watchlist.stop, resolver.close])
 
 app.include_router(router, prefix='/api/v1')
+
+if BOT_MODE == 'webhook' and TOKEN:
+    # The telegram bot is served by the API, so it doesn't need its own
+    # process and port.
+    from wd_telegram_bot import WDTelegramBot, build_application
+    from .webhook import create_webhook_router
+
+    app.include_router(create_webhook_router(
+        WDTelegramBot(build_application())))
+
+
+@app.get('/metrics', include_in_schema=False)
+def get_metrics():
+    """Metrics in Prometheus text exposition format."""
+    return Response(metrics.REGISTRY.render(),
+                    headers={'Content-Type': metrics.CONTENT_TYPE})
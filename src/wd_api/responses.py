@@ -0,0 +1,62 @@
+import contextvars
+from typing import Any, Callable
+
+import msgpack
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi.routing import APIRoute
+
+from . import tracing
+
+MSGPACK_MEDIA_TYPE: str = 'application/msgpack'
+
+# Header of the request ID, the client may set it to trace its request.
+REQUEST_ID_HEADER: str = 'X-Request-ID'
+
+# Whether the client of the current request accepts msgpack.
+_accepts_msgpack: contextvars.ContextVar = contextvars.ContextVar(
+    'accepts_msgpack', default=False)
+
+
+class APIResponse(ORJSONResponse):
+    """JSON response encoded by orjson, or msgpack if the client sent
+    `Accept: application/msgpack` (see `NegotiatedRoute`)."""
+
+    def render(self, content: Any) -> bytes:
+        if _accepts_msgpack.get():
+            self.media_type = MSGPACK_MEDIA_TYPE
+            return msgpack.packb(content)
+        return super().render(content)
+
+
+class NegotiatedRoute(APIRoute):
+    """Route which chooses the encoding of `APIResponse` by the `Accept`
+    header of the request. Every request is traced, its ID is returned in
+    the `X-Request-ID` header. The request of the streamed response ends
+    when its body is sent."""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        name = f'{"/".join(sorted(self.methods))} {self.path}'
+
+        async def route_handler(request: Request) -> Response:
+            token = _accepts_msgpack.set(
+                MSGPACK_MEDIA_TYPE in request.headers.get('accept', ''))
+            try:
+                with tracing.request(
+                        name, request.headers.get(REQUEST_ID_HEADER),
+                        route=self.path) as current:
+                    response = await handler(request)
+                    current.set(status_code=response.status_code)
+                    request_id = tracing.request_id()
+                    if isinstance(response, StreamingResponse):
+                        current.defer()
+                        response.body_iterator = current.wrap(
+                            response.body_iterator)
+            finally:
+                _accepts_msgpack.reset(token)
+            response.headers['Vary'] = 'Accept'
+            response.headers[REQUEST_ID_HEADER] = request_id
+            return response
+
+        return route_handler
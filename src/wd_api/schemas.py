@@ -1,19 +1,57 @@
-from typing import Union, List
+import datetime
+from typing import Dict, Union, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, HttpUrl
 
-from . import DEFAULT_TYPE, DNS_SERVERS
+from . import (DEFAULT_TYPE, DNS_SERVERS, DIG_BACKEND, DIG_BACKENDS,
+               WHOIS_SOURCE, DIG_ALL_PRESET, BATCH_MAX_DOMAINS)
 
 
 class DigSettings(BaseModel):
     """Schema for get dig settings."""
     default_type: str = DEFAULT_TYPE
     allowed_records: List[str] = DNS_SERVERS
+    default_backend: str = DIG_BACKEND
+    allowed_backends: List[str] = DIG_BACKENDS
+
+
+class CacheStats(BaseModel):
+    """Schema for get cache counters."""
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    hit_ratio: float
+    evictions: int
+    expirations: int
+    coalesced: int
+    in_flight: int
+
+
+class WhoisCacheStats(CacheStats):
+    """Schema for get whois cache counters."""
+    disk_hits: int
+    stale_hits: int
+
+
+class UpstreamHealth(BaseModel):
+    """Schema for get health of the DNS-server."""
+    server: str
+    state: str
+    latency: Optional[float]
+    failure_rate: float
+    queries: int
+    failures: int
 
 
 class DomainWhois(BaseModel):
-    """Schema for get whois information about specified domain."""
+    """Schema for get whois information about specified domain.
+    Not required fields: force (don't use the cached result), source (`rdap`
+    with WHOIS fallback or `whois`).
+    """
     domain: str
+    force: bool = False
+    source: str = WHOIS_SOURCE
 
     class Config:
         json_schema_extra = {
@@ -25,10 +63,15 @@ class DomainWhois(BaseModel):
 
 class DomainDig(DomainWhois):
     """Schema for get dig information about specified domain.
-    Not required fields: record, dns.
+    Not required fields: record (one record, list of records or `ALL`), dns,
+    backend, force, fastest (return only the first answer of the healthy
+    DNS-servers), dnssec (validate the records by DNSSEC).
     """
-    record: str = DEFAULT_TYPE
+    record: Union[str, List[str]] = DEFAULT_TYPE
     dns: Union[str, List[str]] = DNS_SERVERS
+    backend: str = DIG_BACKEND
+    fastest: bool = False
+    dnssec: bool = False
 
     class Config:
         json_schema_extra = {
@@ -38,3 +81,162 @@ class DomainDig(DomainWhois):
                 'dns': ['1.1.1.1', '8.8.8.8']
             }
         }
+
+
+class DomainReport(DomainWhois):
+    """Schema for get the full report about specified domain.
+    Not required fields: record (one record, list of records or `ALL`), dns,
+    force, source, stream (stream the parts as NDJSON as soon as they are
+    ready).
+    """
+    record: Union[str, List[str]] = DIG_ALL_PRESET
+    dns: Union[str, List[str]] = DNS_SERVERS
+    stream: bool = False
+
+    class Config:
+        json_schema_extra = {
+            'example': {
+                'domain': 'google.com',
+                'stream': True
+            }
+        }
+
+
+class DomainBatch(BaseModel):
+    """Schema for check many domains at once.
+    Not required fields: records, dns, whois, force.
+    """
+    domains: List[str] = Field(max_length=BATCH_MAX_DOMAINS)
+    records: List[str] = [DEFAULT_TYPE]
+    dns: Union[str, List[str]] = DNS_SERVERS
+    whois: bool = False
+    force: bool = False
+
+    class Config:
+        json_schema_extra = {
+            'example': {
+                'domains': ['google.com', 'example.com'],
+                'records': ['A', 'MX'],
+                'whois': True
+            }
+        }
+
+
+class WatchDomain(BaseModel):
+    """Schema for watch the domain: the callback URL gets POST request with
+    JSON (domain, event, message, whois) when the domain is about to expire
+    or its expiration date, statuses or nameservers change.
+    """
+    domain: str
+    callback_url: HttpUrl
+
+    class Config:
+        json_schema_extra = {
+            'example': {
+                'domain': 'google.com',
+                'callback_url': 'https://example.com/hooks/domains'
+            }
+        }
+
+
+class WatchedDomain(BaseModel):
+    """Schema for get the watched domain with its last known state."""
+    domain: str
+    checked_at: Optional[float]
+    next_check: Optional[float]
+    registered: bool
+    expiration_date: Optional[int]
+    statuses: List[str]
+    name_servers: List[str]
+
+
+class Message(BaseModel):
+    """Schema of the failed request."""
+    message: str
+    result: bool = False
+
+
+class DigAnswer(BaseModel):
+    """Schema of the answer of the DNS-server."""
+    ttl: str
+    content: str
+
+
+class DigStatus(BaseModel):
+    """Schema of the status of the request to the DNS-server: rcode, time in
+    ms, timeout flag and whether the answers are from the cache."""
+    status: Optional[str]
+    time: Optional[float]
+    timeout: bool
+    cached: bool
+
+
+class DnssecStatus(BaseModel):
+    """Schema of the DNSSEC status of the record: validated, insecure, bogus
+    or indeterminate, and the reason."""
+    status: str
+    reason: Optional[str]
+
+
+class DnssecZone(BaseModel):
+    """Schema of the DNSSEC status of the zone and the tags of its keys."""
+    zone: str
+    status: str
+    reason: Optional[str]
+    keys: List[int]
+
+
+class DnssecOutput(BaseModel):
+    """Schema of the DNSSEC validation of the domain: status of the domain,
+    of the zones from the root and of the records."""
+    domain: str
+    status: str
+    zones: List[DnssecZone]
+    records: Dict[str, DnssecStatus]
+
+
+class DigOutput(BaseModel):
+    """Schema of the dig result of one record."""
+    domain: str
+    record: str
+    result: bool
+    data: Dict[str, List[DigAnswer]]
+    servers: Dict[str, DigStatus]
+    skipped: List[str]
+    dnssec: Optional[DnssecOutput] = None
+
+
+class DigRecordsOutput(BaseModel):
+    """Schema of the dig result of several records grouped by record."""
+    domain: str
+    records: List[str]
+    result: bool
+    data: Dict[str, Dict[str, List[DigAnswer]]]
+    servers: Dict[str, Dict[str, DigStatus]]
+    skipped: List[str]
+    dnssec: Optional[DnssecOutput] = None
+
+
+class WhoisOutput(BaseModel):
+    """Schema of the whois result, dates are unix timestamps. Fields of the
+    `whois` program output which are not listed are passed as is."""
+    result: bool
+    name: str
+    name_IDN: Optional[str] = None
+    source: Optional[str] = None
+    tld: Optional[str] = None
+    registrar: Optional[str] = None
+    registrant_country: Optional[str] = None
+    registrant: Optional[str] = None
+    creation_date: Optional[int] = None
+    expiration_date: Optional[int] = None
+    last_updated: Optional[datetime.datetime] = None
+    is_active: Optional[bool] = None
+    status: Optional[str] = None
+    statuses: List[str] = []
+    dnssec: Optional[bool] = None
+    name_servers: List[str] = []
+    emails: List[str] = []
+
+    class Config:
+        extra = 'allow'
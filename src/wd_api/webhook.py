@@ -0,0 +1,34 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, FastAPI, Header, Request, Response
+
+from . import BOT_WEBHOOK_PATH, BOT_WEBHOOK_SECRET
+
+
+def create_webhook_router(bot) -> APIRouter:
+    """Router of the telegram webhook of the `WDTelegramBot`, the bot is
+    started and stopped with the application."""
+    router = APIRouter(on_startup=[bot.start_webhook],
+                       on_shutdown=[bot.stop_webhook])
+
+    @router.post(BOT_WEBHOOK_PATH, include_in_schema=False)
+    async def telegram_webhook(
+            request: Request,
+            x_telegram_bot_api_secret_token: Optional[str] = Header(None)
+    ):
+        """Receives the updates from Telegram."""
+        if BOT_WEBHOOK_SECRET and not secrets.compare_digest(
+                x_telegram_bot_api_secret_token or '', BOT_WEBHOOK_SECRET):
+            return Response(status_code=403)
+        await bot.put_update(await request.json())
+        return Response()
+
+    return router
+
+
+def create_webhook_app(bot) -> FastAPI:
+    """Application which serves only the telegram webhook."""
+    app = FastAPI(openapi_url=None)
+    app.include_router(create_webhook_router(bot))
+    return app
@@ -0,0 +1,310 @@
+"""
+Command-line tool to check many domains without the API: domains are read
+from the files (or stdin) as a stream, checked concurrently and the results
+are written as NDJSON or CSV as soon as they are ready.
+
+    python wd_cli.py domains.txt -r A MX --whois -f csv -o audit.csv \
+        --checkpoint audit.done
+    cat domains.txt | python wd_cli.py - --workers 4 > audit.ndjson
+"""
+import argparse
+import asyncio
+import csv
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import (AsyncIterable, AsyncIterator, Callable, Iterable,
+                    Iterator, List, Optional, TextIO, Tuple, Union)
+
+import messages
+from batch import bounded_map, check_domain, read_lines, to_ndjson
+from constants import BATCH_CONCURRENCY, DEFAULT_TYPE, DNS_SERVERS
+from resolver import resolver
+from wd import Domain
+
+FORMATS: Tuple[str, ...] = ('ndjson', 'csv')
+
+# Whois fields in the CSV output.
+WHOIS_COLUMNS: Tuple[str, ...] = ('registrar', 'creation_date',
+                                  'expiration_date', 'statuses',
+                                  'name_servers')
+
+# Domains are sent to the worker processes by chunks of this size.
+SHARD_CHUNK_SIZE: int = 100
+
+# Output and checkpoint are flushed after this amount of results.
+FLUSH_EVERY: int = 100
+
+
+def read_inputs(paths: Iterable[str]) -> Iterator[str]:
+    """Domains of the files lazily, `-` is stdin."""
+    for path in paths:
+        if path == '-':
+            yield from read_lines(sys.stdin.buffer)
+            continue
+        with open(path, 'rb') as file:
+            yield from read_lines(file)
+
+
+class Checkpoint:
+    """Inputs which are already checked, kept in the file one per line, so
+    the interrupted run continues without checking them again."""
+
+    def __init__(self, path: Optional[str]) -> None:
+        self.done = set()
+        self.file: Optional[TextIO] = None
+        if path is None:
+            return
+        if Path(path).exists():
+            with open(path, encoding='utf-8') as file:
+                self.done = {line.rstrip('\n') for line in file}
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def __contains__(self, line: str) -> bool:
+        return line in self.done
+
+    def add(self, line: str) -> None:
+        if self.file is not None:
+            self.file.write(line + '\n')
+
+    def flush(self) -> None:
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+
+class CsvWriter:
+    """One row per domain: answers of every record (of all the DNS-servers)
+    and, optionally, whois fields."""
+
+    def __init__(self, file: TextIO, records: List[str], whois: bool,
+                 header: bool = True) -> None:
+        self.records = records
+        self.whois = whois
+        self.writer = csv.writer(file)
+        if header:
+            self.writer.writerow(self.columns())
+
+    def columns(self) -> List[str]:
+        columns = ['domain', 'result', 'message', *self.records]
+        if self.whois:
+            columns.extend(WHOIS_COLUMNS)
+        return columns
+
+    def write(self, result: dict) -> None:
+        row = [result['domain'], result['result'], result.get('message', '')]
+        data = result.get('dig', {}).get('data', {})
+        for record in self.records:
+            row.append(' | '.join(dict.fromkeys(
+                answer['content']
+                for answers in data.get(record, {}).values()
+                for answer in answers)))
+        if self.whois:
+            whois = result.get('whois') or {}
+            for column in WHOIS_COLUMNS:
+                value = whois.get(column)
+                if isinstance(value, list):
+                    value = ' '.join(value)
+                row.append('' if value is None else value)
+        self.writer.writerow(row)
+
+
+class NdjsonWriter:
+    """One JSON object per line, as `/api/v1/batch` streams them."""
+
+    def __init__(self, file: TextIO) -> None:
+        self.file = file
+
+    def write(self, result: dict) -> None:
+        self.file.write(to_ndjson(result))
+
+
+async def check_lines(lines: Union[Iterable[str], AsyncIterable[str]],
+                      options: argparse.Namespace
+                      ) -> AsyncIterator[Tuple[str, dict]]:
+    """Check the domains of the (async) iterable with at most
+    `options.concurrency` domains at once, yields (input, result)."""
+    async def check(line: str) -> Tuple[str, dict]:
+        return line, await check_domain(line, options.records, options.dns,
+                                        options.whois, options.force)
+
+    async for item in bounded_map(check, lines, options.concurrency):
+        yield item
+
+
+def run_local(lines: Iterable[str], options: argparse.Namespace,
+              write: Callable[[str, dict], None]) -> None:
+    """Check the domains in this process."""
+    async def run() -> None:
+        try:
+            async for line, result in check_lines(lines, options):
+                write(line, result)
+        finally:
+            resolver.close()
+
+    asyncio.run(run())
+
+
+def _shard_worker(tasks, results, options: argparse.Namespace) -> None:
+    """Worker process: checks the chunks of domains from `tasks` until None
+    and puts (input, result) to `results`, then None."""
+    async def inputs() -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        while True:
+            chunk = await loop.run_in_executor(None, tasks.get)
+            if chunk is None:
+                return
+            for line in chunk:
+                yield line
+
+    async def run() -> None:
+        try:
+            async for item in check_lines(inputs(), options):
+                results.put(item)
+        finally:
+            resolver.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        results.put(None)
+
+
+def run_sharded(lines: Iterable[str], options: argparse.Namespace,
+                write: Callable[[str, dict], None]) -> None:
+    """Check the domains in `options.workers` processes, every process
+    checks `options.concurrency` domains at once. Domains are sent to the
+    processes by chunks through the bounded queue, so the memory usage
+    doesn't depend on the amount of domains."""
+    context = multiprocessing.get_context('spawn')
+    tasks = context.Queue(options.workers * 2)
+    results = context.Queue()
+    workers = [
+        context.Process(target=_shard_worker, args=(tasks, results, options),
+                        daemon=True)
+        for _ in range(options.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def feed() -> None:
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= SHARD_CHUNK_SIZE:
+                tasks.put(chunk)
+                chunk = []
+        if chunk:
+            tasks.put(chunk)
+        for _ in workers:
+            tasks.put(None)
+
+    threading.Thread(target=feed, daemon=True).start()
+    running = len(workers)
+    while running:
+        try:
+            item = results.get(timeout=1)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+            continue
+        if item is None:
+            running -= 1
+        else:
+            write(*item)
+
+
+def parse_arguments(arguments: Optional[List[str]] = None
+                    ) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('inputs', nargs='*', default=['-'], metavar='FILE',
+                        help='Files with one domain per line, `-` - stdin.')
+    parser.add_argument('-r', '--records', nargs='+', default=[DEFAULT_TYPE],
+                        help='Records to dig, `ALL` - the common ones.')
+    parser.add_argument('--dns', nargs='+', default=list(DNS_SERVERS),
+                        help='DNS-servers as `host` or `host#port`.')
+    parser.add_argument('--whois', action='store_true',
+                        help='Query whois of every domain too.')
+    parser.add_argument('--force', action='store_true',
+                        help="Don't use the cached answers.")
+    parser.add_argument('-c', '--concurrency', type=int,
+                        default=BATCH_CONCURRENCY,
+                        help='Max domains checked at once by one process.')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Amount of processes to check the domains.')
+    parser.add_argument('-f', '--format', choices=FORMATS, default='ndjson')
+    parser.add_argument('-o', '--output', help='Output file, default stdout.')
+    parser.add_argument('--checkpoint',
+                        help='File of the checked domains: they are skipped '
+                             'and the output is appended to.')
+    options = parser.parse_args(arguments)
+    options.records = Domain.dig_records(options.records)
+    return options
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    options = parse_arguments(arguments)
+    checkpoint = Checkpoint(options.checkpoint)
+    resume = bool(checkpoint.done)
+
+    if options.output:
+        output = open(options.output, 'a' if resume else 'w',
+                      encoding='utf-8', newline='')
+    else:
+        output = sys.stdout
+    if options.format == 'csv':
+        header = not (resume and output is not sys.stdout
+                      and output.tell())
+        writer = CsvWriter(output, options.records, options.whois, header)
+    else:
+        writer = NdjsonWriter(output)
+
+    skipped = 0
+    checked = 0
+
+    def lines() -> Iterator[str]:
+        nonlocal skipped
+        for line in read_inputs(options.inputs):
+            if line in checkpoint:
+                skipped += 1
+                continue
+            yield line
+
+    def write(line: str, result: dict) -> None:
+        nonlocal checked
+        writer.write(result)
+        checkpoint.add(line)
+        checked += 1
+        if checked % FLUSH_EVERY == 0:
+            # The checkpoint never lists the domains which results are not
+            # written yet.
+            output.flush()
+            checkpoint.flush()
+
+    started = time.monotonic()
+    try:
+        if options.workers > 1:
+            run_sharded(lines(), options, write)
+        else:
+            run_local(lines(), options, write)
+    finally:
+        output.flush()
+        checkpoint.close()
+        if output is not sys.stdout:
+            output.close()
+        print(messages.CLI_DONE.format(
+            checked, time.monotonic() - started, skipped), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        # Results and checkpoint are already flushed, rerun to continue.
+        sys.exit(130)
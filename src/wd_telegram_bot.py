@@ -1,17 +1,35 @@
 from typing import Tuple
+import asyncio
+import functools
 import logging
+import time
 
-import whois
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (Application, CommandHandler, MessageHandler,
                           filters, ContextTypes, CallbackQueryHandler)
 from telegram.error import BadRequest
 
 import messages
-from exceptions import BadDomain, BotWrongInput
+from cache import SingleFlight, TTLCache
+from exceptions import (BadDomain, BadNetwork, BotWrongInput, WatchlistFull,
+                        WhoisBusy, WhoisParseError, WhoisQueryError,
+                        WhoisTimeout, WhoisUnknownTld)
 from wd import Domain, DEFAULT_TYPE
 from logger import configure_logging
-from constants import TOKEN, MAX_DOMAIN_LEN_TO_BUTTONS, RECORDS_ON_KEYBOARD
+from constants import (TOKEN, MAX_DOMAIN_LEN_TO_BUTTONS, RECORDS_ON_KEYBOARD,
+                       METRICS_PORT, BOT_RATE_LIMIT, BOT_RATE_BURST,
+                       BOT_SENT_MESSAGES_SIZE, BOT_SENT_MESSAGES_TTL,
+                       BOT_MODE, BOT_WEBHOOK_URL, BOT_WEBHOOK_SECRET,
+                       BOT_WEBHOOK_HOST, BOT_WEBHOOK_PORT,
+                       BOT_CONCURRENT_UPDATES, PROPAGATION_SERVERS,
+                       PROPAGATION_EDIT_INTERVAL, PTR_BOT_MAX_ADDRESSES,
+                       DNSSEC_PRESET)
+from metrics import BOT_EDITS_SKIPPED, BOT_RATE_LIMITED, start_metrics_server
+from ptr import parse_network, ptr_sweep, ptr_tg_message
+from rate_limit import RateLimiter
+from resolver import resolver
+from tracing import request, span
+from watchlist import chat_watcher, format_date, watchlist
 
 
 class WDTelegramBot:
@@ -19,6 +37,44 @@ class WDTelegramBot:
 
     def __init__(self, application) -> None:
         self.application = application
+        # Same queries of many users (or repeated by one) share one call.
+        self.single_flight = SingleFlight()
+        self.rate_limiter = RateLimiter(BOT_RATE_LIMIT, BOT_RATE_BURST)
+        # (chat id, message id): text of the dig message sent by the bot.
+        self.sent_messages = TTLCache(BOT_SENT_MESSAGES_SIZE)
+
+    def _allow(self, chat_id: int, handler: str) -> bool:
+        """Takes the token of the chat, False if the chat is limited."""
+        if self.rate_limiter.allow(chat_id):
+            return True
+        BOT_RATE_LIMITED.inc(handler=handler)
+        return False
+
+    def _limited_message(self, chat_id: int) -> str:
+        return messages.RATE_LIMITED.format(
+            max(1.0, self.rate_limiter.bucket(chat_id).retry_after()))
+
+    async def _dig_message(self, domain: Domain, record: str) -> str:
+        """Dig message of the record, or DNSSEC validation message for the
+        DNSSEC_PRESET."""
+        # Spans of the shared call are in the trace of the first caller,
+        # others see only the time they wait for it.
+        with span('bot.dig', record=record):
+            if record.upper() == DNSSEC_PRESET:
+                return await self.single_flight.do(
+                    ('dnssec', domain.domain), domain.dnssec_tg_message)
+            return await self.single_flight.do(
+                ('dig', domain.domain, record.upper()),
+                lambda: domain.dig_tg_message(record))
+
+    async def _whois_message(self, domain: Domain) -> str:
+        with span('bot.whois'):
+            return await self.single_flight.do(
+                ('whois', domain.domain), domain.whois_tg_message)
+
+    def _remember(self, message, text: str) -> None:
+        self.sent_messages.set((message.chat_id, message.message_id), text,
+                               BOT_SENT_MESSAGES_TTL)
 
     @staticmethod
     def create_dig_keyboard(domain: str) -> list:
@@ -32,18 +88,31 @@ class WDTelegramBot:
     async def dig_buttons(self, update, context) -> None:
         """Processing buttons under dig message."""
         query = update.callback_query
+        chat_id = query.message.chat_id
+        if not self._allow(chat_id, 'button'):
+            await query.answer(self._limited_message(chat_id))
+            return
         domain, record = query.data.split()
         domain = Domain(domain)
-        dig_output = await domain.dig_tg_message(record)
+        dig_output = await self._dig_message(domain, record)
         await query.answer()
+
+        key = (chat_id, query.message.message_id)
+        if dig_output in (self.sent_messages.peek(key), query.message.text):
+            # Telegram rejects the edit which doesn't change the message.
+            BOT_EDITS_SKIPPED.inc()
+            return
         try:
-            await query.edit_message_text(
-                text=dig_output,
-                reply_markup=InlineKeyboardMarkup.from_row(
-                    self.create_dig_keyboard(str(domain)))
-            )
+            with span('telegram.edit'):
+                await query.edit_message_text(
+                    text=dig_output,
+                    reply_markup=InlineKeyboardMarkup.from_row(
+                        self.create_dig_keyboard(str(domain)))
+                )
         except BadRequest:
             pass
+        else:
+            self._remember(query.message, dig_output)
 
     @staticmethod
     async def error_handler(
@@ -67,6 +136,134 @@ class WDTelegramBot:
             exc_info=context.error
         )
 
+    async def command_watch(self, update: Update,
+                            context: ContextTypes.context) -> None:
+        """Watch the domain: the chat is notified when it is about to expire
+        or its statuses or nameservers change."""
+        message = update.message
+        if not self._allow(message.chat_id, 'watch'):
+            await message.reply_text(self._limited_message(message.chat_id))
+            return
+        if len(context.args) != 1:
+            await message.reply_text(messages.WATCH_USAGE)
+            return
+        try:
+            domain = Domain(context.args[0])
+            await asyncio.to_thread(watchlist.add, domain.domain,
+                                    chat_watcher(message.chat_id))
+        except (BadDomain, WatchlistFull) as error:
+            await message.reply_text(str(error))
+            return
+        await message.reply_text(messages.WATCH_ADDED.format(domain))
+
+    async def command_propagation(self, update: Update,
+                                  context: ContextTypes.context) -> None:
+        """Check the propagation of the record across the public resolvers.
+        The message is updated while the resolvers answer, but not more
+        often than PROPAGATION_EDIT_INTERVAL, and finally the summary is
+        shown."""
+        message = update.message
+        if not self._allow(message.chat_id, 'propagation'):
+            await message.reply_text(self._limited_message(message.chat_id))
+            return
+        if not 1 <= len(context.args) <= self.MAX_INPUT_ARGUMENTS:
+            await message.reply_text(messages.PROPAGATION_USAGE)
+            return
+        try:
+            domain = Domain(context.args[0])
+        except BadDomain as error:
+            await message.reply_text(str(error))
+            return
+        record = domain.dig_records(context.args[1:])[0]
+        servers = len(set(PROPAGATION_SERVERS))
+        results = []
+
+        def render(finished: bool) -> str:
+            return domain.propagation_tg_message(
+                record, domain.propagation_summary(results), servers,
+                finished)
+
+        text = render(False)
+        sent = await message.reply_text(text)
+        edited_at = time.monotonic()
+        async for result in domain.propagation(record):
+            results.append(result)
+            if time.monotonic() - edited_at < PROPAGATION_EDIT_INTERVAL:
+                continue
+            text = await self._edit_propagation(sent, text, render(False))
+            edited_at = time.monotonic()
+        await self._edit_propagation(sent, text, render(True))
+
+    @staticmethod
+    async def _edit_propagation(sent, text: str, new_text: str) -> str:
+        """Edit the propagation check message, returns its current text."""
+        if new_text == text:
+            # Telegram rejects the edit which doesn't change the message.
+            BOT_EDITS_SKIPPED.inc()
+            return text
+        try:
+            await sent.edit_text(new_text)
+        except BadRequest:
+            return text
+        return new_text
+
+    async def command_ptr(self, update: Update,
+                          context: ContextTypes.context) -> None:
+        """Send the PTR records of the IP address or of all the addresses
+        of the network."""
+        message = update.message
+        if not self._allow(message.chat_id, 'ptr'):
+            await message.reply_text(self._limited_message(message.chat_id))
+            return
+        if len(context.args) != 1:
+            await message.reply_text(messages.PTR_USAGE)
+            return
+        try:
+            network = parse_network(context.args[0], PTR_BOT_MAX_ADDRESSES)
+        except BadNetwork as error:
+            await message.reply_text(str(error))
+            return
+        results = [result async for result in ptr_sweep(network)]
+        await message.reply_text(ptr_tg_message(network, results))
+
+    @staticmethod
+    async def command_unwatch(update: Update,
+                              context: ContextTypes.context) -> None:
+        """Stop watching the domain."""
+        message = update.message
+        if len(context.args) != 1:
+            await message.reply_text(messages.UNWATCH_USAGE)
+            return
+        try:
+            domain = Domain(context.args[0])
+        except BadDomain as error:
+            await message.reply_text(str(error))
+            return
+        if await asyncio.to_thread(watchlist.remove, domain.domain,
+                                   chat_watcher(message.chat_id)):
+            await message.reply_text(messages.WATCH_REMOVED.format(domain))
+        else:
+            await message.reply_text(messages.WATCH_NOT_FOUND.format(domain))
+
+    @staticmethod
+    async def command_watchlist(update: Update,
+                                context: ContextTypes.context) -> None:
+        """Send the watched domains of the chat with their expiration
+        dates."""
+        watched = await asyncio.to_thread(
+            watchlist.watched, chat_watcher(update.message.chat_id))
+        if not watched:
+            await update.message.reply_text(messages.WATCHLIST_EMPTY)
+            return
+        lines = [messages.WATCHLIST_LABEL]
+        for state in watched:
+            expires = messages.WATCHLIST_NOT_CHECKED
+            if state['checked_at'] is not None:
+                expires = format_date(state['expiration_date'])
+            lines.append(messages.WATCHLIST_ITEM.format(
+                Domain.domain_decode(state['domain']), expires))
+        await update.message.reply_text('\n'.join(lines))
+
     @staticmethod
     async def command_help(update: Update, context: ContextTypes.context
                            ) -> None:
@@ -96,15 +293,16 @@ class WDTelegramBot:
         domain, record = input_message
         return domain, record
 
-    @staticmethod
-    async def __send_whois_information(update_message, domain: Domain) -> None:
+    async def __send_whois_information(self, update_message,
+                                       domain: Domain) -> None:
         """Trying to make a whois query and sends the user message with
         result."""
         try:
-            whois_output = domain.whois_tg_message()
-            await update_message.reply_html(whois_output,
-                                            disable_web_page_preview=True)
-        except whois.exceptions.UnknownTld as error:
+            whois_output = await self._whois_message(domain)
+            with span('telegram.send', message='whois'):
+                await update_message.reply_html(
+                    whois_output, disable_web_page_preview=True)
+        except WhoisUnknownTld as error:
             logging.info(messages.ERROR_LOG.format(
                 update_message.chat.username,
                 update_message.text,
@@ -112,9 +310,10 @@ class WDTelegramBot:
             await update_message.reply_html(messages.UNKNOWN_TLD,
                                             disable_web_page_preview=True)
         except (
-                whois.exceptions.WhoisPrivateRegistry,
-                whois.exceptions.FailedParsingWhoisOutput,
-                whois.exceptions.WhoisCommandFailed
+                WhoisParseError,
+                WhoisQueryError,
+                WhoisBusy,
+                WhoisTimeout
         ) as error:
             logging.info(messages.ERROR_LOG.format(
                 update_message.chat.username,
@@ -129,30 +328,42 @@ class WDTelegramBot:
     ) -> None:
         """Trying to make a dig query and sends the user message with
         result."""
-        dig_output = await domain.dig_tg_message(record)
+        dig_output = await self._dig_message(domain, record)
 
         reply_markup = None
         if len(domain.domain) <= MAX_DOMAIN_LEN_TO_BUTTONS:
             reply_markup = InlineKeyboardMarkup.from_row(
                 self.create_dig_keyboard(str(domain)))
 
-        await update_message.reply_html(
-            dig_output,
-            disable_web_page_preview=True,
-            reply_markup=reply_markup
-        )
+        with span('telegram.send', message='dig'):
+            message = await update_message.reply_html(
+                dig_output,
+                disable_web_page_preview=True,
+                reply_markup=reply_markup
+            )
+        self._remember(message, dig_output)
 
     async def wd_main(
             self, update: Update, context: ContextTypes.context) -> None:
         """
         The main function for handle user message requests and return
         Whois & Dig information.
+        Whois and dig queries run concurrently, their messages are sent as
+        soon as they are ready.
         If message not new (was edited the old message), makes only dig query.
         """
         info = update.message
         if update.edited_message:
             info = update.edited_message
 
+        if not self._allow(info.chat_id, 'message'):
+            # The chat is told about the limit once until it is allowed again.
+            bucket = self.rate_limiter.bucket(info.chat_id)
+            if not bucket.warned:
+                bucket.warned = True
+                await info.reply_text(self._limited_message(info.chat_id))
+            return
+
         try:
             domain, record_type = self.__get_domain_and_record(info.text)
             domain = Domain(domain)
@@ -165,30 +376,117 @@ class WDTelegramBot:
                 messages.BAD_DOMAIN_LOG))
             await info.reply_text(str(error))
         else:
-            if not update.edited_message:
-                await self.__send_whois_information(info, domain)
+            if update.edited_message:
+                await self.__send_dig_information(info, domain, record_type)
+                return
+            # Dig is sent as soon as it is ready, without waiting for the
+            # whois which is usually slower.
+            await asyncio.gather(
+                self.__send_whois_information(info, domain),
+                self.__send_dig_information(info, domain, record_type))
 
-            await self.__send_dig_information(info, domain, record_type)
+    @staticmethod
+    def _traced(name: str, handler):
+        """Handler which processes every update as the traced request."""
+        @functools.wraps(handler)
+        async def traced_handler(update: Update,
+                                 context: ContextTypes.context) -> None:
+            chat = update.effective_chat
+            with request(name, chat_id=chat.id if chat else None):
+                await handler(update, context)
+
+        return traced_handler
 
     def _collect_bot_handlers(self):
         """Adds bot handlers to telegram application instance."""
         self.application.add_error_handler(self.error_handler)
         self.application.add_handlers(
             (
-                CommandHandler(['start', 'help'], self.command_help),
-                MessageHandler(filters.TEXT, self.wd_main),
-                CallbackQueryHandler(self.dig_buttons)
+                CommandHandler(['start', 'help'], self._traced(
+                    'bot.help', self.command_help)),
+                CommandHandler('watch', self._traced(
+                    'bot.watch', self.command_watch)),
+                CommandHandler('unwatch', self._traced(
+                    'bot.unwatch', self.command_unwatch)),
+                CommandHandler('watchlist', self._traced(
+                    'bot.watchlist', self.command_watchlist)),
+                CommandHandler('propagation', self._traced(
+                    'bot.propagation', self.command_propagation)),
+                CommandHandler('ptr', self._traced(
+                    'bot.ptr', self.command_ptr)),
+                MessageHandler(filters.TEXT, self._traced(
+                    'bot.message', self.wd_main)),
+                CallbackQueryHandler(self._traced(
+                    'bot.button', self.dig_buttons))
             )
         )
 
+    @staticmethod
+    async def post_init(application: Application) -> None:
+        """Starts the metrics server on METRICS_PORT, if it is set, and the
+        watchlist scheduler which notifies chats by this bot."""
+        if METRICS_PORT:
+            await start_metrics_server(METRICS_PORT)
+            logging.info(messages.METRICS_SERVER.format(METRICS_PORT))
+        watchlist.telegram_bot = application.bot
+        watchlist.start()
+
+    @staticmethod
+    async def post_shutdown(application: Application) -> None:
+        await watchlist.stop()
+        resolver.close()
+
     def run_telegram_pooling(self) -> None:
         """Collects telegram handlers and starts pooling."""
         self._collect_bot_handlers()
         self.application.run_polling()
 
+    async def start_webhook(self) -> None:
+        """Collects telegram handlers, starts processing of the updates and
+        sets the webhook, so Telegram sends updates to BOT_WEBHOOK_URL.
+        The updates are put by the ASGI application (`wd_api.webhook`)."""
+        self._collect_bot_handlers()
+        await self.application.initialize()
+        await self.post_init(self.application)
+        await self.application.start()
+        await self.application.bot.set_webhook(
+            BOT_WEBHOOK_URL, secret_token=BOT_WEBHOOK_SECRET or None,
+            allowed_updates=Update.ALL_TYPES)
+        logging.info(messages.WEBHOOK_SET.format(BOT_WEBHOOK_URL))
+
+    async def stop_webhook(self) -> None:
+        await self.application.stop()
+        await self.application.shutdown()
+        await self.post_shutdown(self.application)
+
+    async def put_update(self, data: dict) -> None:
+        """Queue the update received by the webhook, it is processed in the
+        background, so the webhook answers Telegram at once."""
+        await self.application.update_queue.put(
+            Update.de_json(data, self.application.bot))
+
+    def run_telegram_webhook(self) -> None:
+        """Serves the webhook on BOT_WEBHOOK_HOST:BOT_WEBHOOK_PORT."""
+        import uvicorn
+
+        from wd_api.webhook import create_webhook_app
+        uvicorn.run(create_webhook_app(self), host=BOT_WEBHOOK_HOST,
+                    port=BOT_WEBHOOK_PORT, log_config=None)
+
+
+def build_application() -> Application:
+    """Telegram application which processes up to BOT_CONCURRENT_UPDATES
+    updates at once, so one slow query doesn't hold the other chats."""
+    return (Application.builder().token(TOKEN)
+            .concurrent_updates(BOT_CONCURRENT_UPDATES or False)
+            .post_init(WDTelegramBot.post_init)
+            .post_shutdown(WDTelegramBot.post_shutdown).build())
+
 
 if __name__ == '__main__':
     configure_logging()
-    application = Application.builder().token(TOKEN).build()
-    wd_bot = WDTelegramBot(application)
-    wd_bot.run_telegram_pooling()
+    wd_bot = WDTelegramBot(build_application())
+    if BOT_MODE == 'webhook':
+        wd_bot.run_telegram_webhook()
+    else:
+        wd_bot.run_telegram_pooling()
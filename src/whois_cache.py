@@ -0,0 +1,208 @@
+import datetime
+import json
+import threading
+import time
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Optional, Tuple
+
+from cache import SQLiteCache, TTLCache
+from constants import (WHOIS_CACHE_DISK_SIZE, WHOIS_CACHE_MAX_STALE,
+                       WHOIS_CACHE_PATH, WHOIS_CACHE_SIZE, WHOIS_CACHE_TTL)
+from exceptions import (RdapError, WhoisParseError, WhoisQueryError,
+                        WhoisTimeout, WhoisUnknownTld)
+from metrics import SUBPROCESSES, WHOIS_DURATION, register_cache
+
+# Errors of the whois query which mean the result can't be got.
+WHOIS_ERRORS = (
+    WhoisParseError,
+    WhoisQueryError,
+    WhoisUnknownTld,
+    RdapError,
+)
+
+# Errors after which the stale cached result is better than nothing.
+TRANSIENT_WHOIS_ERRORS = (
+    WhoisQueryError,
+    WhoisTimeout,
+    RdapError,
+)
+
+
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {'__datetime__': value.isoformat()}
+    raise TypeError(f'Unexpected type {type(value)}')
+
+
+def _decode(value: dict):
+    if '__datetime__' in value:
+        return datetime.datetime.fromisoformat(value['__datetime__'])
+    return value
+
+
+def whois_program_query(domain: str) -> Optional[dict]:
+    """Record of the domain by the `whois` library (blocking, runs the
+    `whois` program), None if the domain isn't registered. The library is
+    imported on the first query, its errors are raised as the own ones."""
+    import whois
+
+    SUBPROCESSES.inc(program='whois')
+    try:
+        query = whois.query(domain, force=True)
+    except whois.exceptions.UnknownTld as error:
+        raise WhoisUnknownTld(str(error)) from error
+    except (whois.exceptions.WhoisCommandFailed,
+            whois.exceptions.WhoisQuotaExceeded) as error:
+        raise WhoisQueryError(str(error)) from error
+    except (whois.exceptions.WhoisPrivateRegistry,
+            whois.exceptions.FailedParsingWhoisOutput,
+            whois.exceptions.UnknownDateFormat) as error:
+        raise WhoisParseError(str(error)) from error
+    finally:
+        SUBPROCESSES.dec(program='whois')
+    return dict(vars(query)) if query else None
+
+
+class WhoisCache:
+    """
+    Cache of whois query results in front of the whois lookups. Results of
+    the different sources are kept under the different keys: `domain` for
+    WHOIS and `rdap:domain` for RDAP.
+    Results are kept in the LRU memory tier backed by SQLite store, so they
+    survive restarts and are shared by all the processes on the host. Result
+    is fresh during `ttl` seconds, after that it is queried again, but if the
+    whois program fails, the stale result is served for `max_stale` more
+    seconds.
+    """
+
+    def __init__(self, path: str = WHOIS_CACHE_PATH,
+                 max_size: int = WHOIS_CACHE_SIZE,
+                 ttl: int = WHOIS_CACHE_TTL,
+                 max_stale: int = WHOIS_CACHE_MAX_STALE,
+                 disk_size: int = WHOIS_CACHE_DISK_SIZE) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.memory = TTLCache(max_size)
+        # The store shared by all the processes, entries are evicted from it
+        # by the same rules as from memory.
+        self.disk: Optional[SQLiteCache] = None
+        if path:
+            self.disk = SQLiteCache(
+                path, disk_size, table='whois_results',
+                dumps=lambda entry: json.dumps(entry, default=_encode),
+                loads=lambda text: json.loads(text, object_hook=_decode))
+        self.disk_hits = 0
+        self.stale_hits = 0
+        self._lock = threading.Lock()
+
+    def get(self, domain: str) -> Optional[Tuple[float, Optional[dict]]]:
+        """Get (stored_at, record) from memory or disk, record is None for
+        not registered domains."""
+        with self._lock:
+            entry = self.memory.get(domain)
+            if entry is not None:
+                return entry
+            if self.disk is None:
+                return None
+            stored = self.disk.get(domain)
+            if stored is None:
+                return None
+            entry = (stored[0], stored[1])
+            expires_in = entry[0] + self.ttl + self.max_stale - time.time()
+            self.memory.set(domain, entry, expires_in)
+            self.disk_hits += 1
+            return entry
+
+    def set(self, domain: str, record: Optional[dict]) -> None:
+        entry = (time.time(), record)
+        with self._lock:
+            self.memory.set(domain, entry, self.ttl + self.max_stale)
+            if self.disk is not None:
+                self.disk.set(domain, entry, self.ttl + self.max_stale)
+
+    def get_fresh(self, domain: str
+                  ) -> Tuple[bool, Optional[SimpleNamespace]]:
+        """Get the fresh result from memory without touching the disk and
+        the whois program, returns (found, result)."""
+        with self._lock:
+            entry = self.memory.peek(domain)
+            if entry is None or time.time() - entry[0] >= self.ttl:
+                return False, None
+            self.memory.get(domain)
+        return True, self._to_result(entry[1])
+
+    def _cached(self, domain: str, force: bool
+                ) -> Tuple[Optional[tuple], bool]:
+        """Cached entry of the domain and whether it is fresh."""
+        entry = None if force else self.get(domain)
+        return entry, entry is not None and time.time() - entry[0] < self.ttl
+
+    def _stale(self, domain: str, entry: Optional[tuple],
+               error: Exception) -> Optional[SimpleNamespace]:
+        """Stale result after the transient error, the error is raised if
+        there is no result."""
+        if entry is None:
+            entry = self.get(domain)
+        if entry is None:
+            raise error
+        self.stale_hits += 1
+        return self._to_result(entry[1])
+
+    @staticmethod
+    def _observe(domain: str, source: str, started: float,
+                 result: str) -> None:
+        WHOIS_DURATION.observe(time.monotonic() - started,
+                               tld=domain.rsplit('.', 1)[-1], source=source,
+                               result=result)
+
+    async def query_async(
+            self, domain: str,
+            lookup: Callable[[str], Awaitable[Optional[dict]]],
+            force: bool = False, source: str = 'whois'
+    ) -> Optional[SimpleNamespace]:
+        """Cached asynchronous `lookup` which returns the record of the
+        domain in the fields of `whois.query` result. `source` - the cache
+        key prefix and the metrics label of the lookup."""
+        key = self.key(domain, source)
+        entry, fresh = self._cached(key, force)
+        if fresh:
+            return self._to_result(entry[1])
+
+        started = time.monotonic()
+        try:
+            record = await lookup(domain)
+        except (*WHOIS_ERRORS, WhoisTimeout) as error:
+            self._observe(domain, source, started, type(error).__name__)
+            if not isinstance(error, TRANSIENT_WHOIS_ERRORS):
+                raise
+            return self._stale(key, entry, error)
+        self._observe(domain, source, started, 'ok')
+
+        self.set(key, record)
+        return self._to_result(record)
+
+    @staticmethod
+    def key(domain: str, source: str = 'whois') -> str:
+        """Cache key of the domain result got from the source."""
+        return domain if source == 'whois' else f'{source}:{domain}'
+
+    @staticmethod
+    def _to_result(record: Optional[dict]) -> Optional[SimpleNamespace]:
+        """Fresh copy of the record with attribute access like the result
+        of `whois.query`, so callers may modify it."""
+        if record is None:
+            return None
+        return SimpleNamespace(**{
+            key: list(value) if isinstance(value, list) else value
+            for key, value in record.items()
+        })
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        stats.update(disk_hits=self.disk_hits, stale_hits=self.stale_hits)
+        return stats
+
+
+whois_cache = WhoisCache()
+register_cache('whois', whois_cache.stats)
@@ -0,0 +1,388 @@
+import asyncio
+import datetime
+import json
+import logging
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import messages
+from constants import (WHOIS_MAX_REFERRALS, WHOIS_MAX_RESPONSE_SIZE,
+                       WHOIS_PORT, WHOIS_SERVER, WHOIS_SERVER_CONCURRENCY,
+                       WHOIS_SERVER_INTERVAL, WHOIS_SERVERS_PATH,
+                       WHOIS_SERVERS_TTL, WHOIS_TIMEOUT)
+from exceptions import WhoisQueryError, WhoisTimeout, WhoisUnknownTld
+
+IANA_SERVER: str = 'whois.iana.org'
+
+# Seed of the TLD -> WHOIS-server map (from IANA root zone database), other
+# TLDs are asked from IANA on first use.
+WHOIS_SERVERS: Dict[str, str] = {
+    'com': 'whois.verisign-grs.com',
+    'net': 'whois.verisign-grs.com',
+    'org': 'whois.pir.org',
+    'info': 'whois.nic.info',
+    'biz': 'whois.nic.biz',
+    'ru': 'whois.tcinet.ru',
+    'su': 'whois.tcinet.ru',
+    'xn--p1ai': 'whois.tcinet.ru',
+    'io': 'whois.nic.io',
+    'me': 'whois.nic.me',
+    'co': 'whois.nic.co',
+    'xyz': 'whois.nic.xyz',
+    'app': 'whois.nic.google',
+    'dev': 'whois.nic.google',
+    'us': 'whois.nic.us',
+    'uk': 'whois.nic.uk',
+    'de': 'whois.denic.de',
+    'fr': 'whois.nic.fr',
+    'eu': 'whois.eu',
+    'nl': 'whois.domain-registry.nl',
+    'pl': 'whois.dns.pl',
+    'it': 'whois.nic.it',
+    'kz': 'whois.nic.kz',
+    'by': 'whois.cctld.by',
+    'ua': 'whois.ua',
+    'jp': 'whois.jprs.jp',
+    'cn': 'whois.cnnic.cn',
+    'ca': 'whois.cira.ca',
+}
+
+# Servers which need the special query instead of the bare domain.
+QUERY_FORMATS: Dict[str, str] = {
+    'whois.verisign-grs.com': 'domain {}',
+    'whois.denic.de': '-T dn,ace {}',
+    'whois.jprs.jp': '{}/e',
+}
+
+# Keys of the response lines for every field, in order of preference.
+FIELDS: Dict[str, Tuple[str, ...]] = {
+    'registrar': ('registrar', 'sponsoring registrar', 'registrar name',
+                  'registrar organization'),
+    'creation_date': ('creation date', 'created', 'created on',
+                      'registered on', 'registered', 'registration date',
+                      'domain registration date', 'registration time'),
+    'expiration_date': ('registry expiry date', 'expiration date',
+                        'registrar registration expiration date',
+                        'expiry date', 'expires', 'expires on', 'paid-till',
+                        'expire date', 'expiration time', 'renewal date'),
+    'last_updated': ('updated date', 'last updated', 'last modified',
+                     'changed', 'modified', 'last-update'),
+    'status': ('domain status', 'status', 'state'),
+    'name_servers': ('name server', 'nserver', 'nameserver', 'name servers',
+                     'nameservers'),
+    'registrant': ('registrant organization', 'registrant name',
+                   'registrant', 'org'),
+    'registrant_country': ('registrant country',),
+    'dnssec': ('dnssec',),
+    'referral': ('registrar whois server', 'whois server', 'referralserver',
+                 'refer', 'whois'),
+}
+FIELD_BY_KEY: Dict[str, Tuple[str, int]] = {
+    key: (field, rank)
+    for field, keys in FIELDS.items() for rank, key in enumerate(keys)
+}
+
+NOT_FOUND_REGEXP = re.compile(
+    r'^\s*(no match|not found|no entries found|no data found|'
+    r'no object found|domain not found|status:\s*(free|available)|'
+    r'%+ no entries found|the queried object does not exist)',
+    re.IGNORECASE | re.MULTILINE)
+QUOTA_REGEXP = re.compile(
+    r'(quota exceeded|limit exceeded|too many (requests|queries)|'
+    r'exceeded the maximum)', re.IGNORECASE)
+LINE_REGEXP = re.compile(r'^\s*([A-Za-z][\w /.-]*?)\s*(?:\.{2,})?:\s*(.*)$')
+EMAIL_REGEXP = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+')
+
+DATE_FORMATS: Tuple[str, ...] = (
+    '%Y-%m-%d %H:%M:%S', '%Y.%m.%d %H:%M:%S', '%Y-%m-%d', '%Y.%m.%d',
+    '%Y/%m/%d', '%d.%m.%Y', '%d-%m-%Y', '%d/%m/%Y', '%d-%b-%Y', '%d %b %Y',
+    '%Y%m%d',
+)
+
+
+def _strptime(value: str) -> Optional[datetime.datetime]:
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_date(value: str) -> Optional[datetime.datetime]:
+    """Parse the date of the WHOIS response to naive UTC datetime."""
+    value = value.strip()
+    iso = re.sub(r'(\.\d+)?Z$', '+00:00', value.replace(' UTC', 'Z'))
+    try:
+        date = datetime.datetime.fromisoformat(iso)
+    except ValueError:
+        date = _strptime(value) or _strptime(value.split(' ')[0])
+        if date is None:
+            return None
+    if date.tzinfo is not None:
+        date = date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return date
+
+
+def parse_fields(text: str) -> Dict[str, List[str]]:
+    """Values of the known fields of the response. Value may be on the
+    next indented lines after the key (`Name servers:` of some registries)."""
+    fields: Dict[str, List[Tuple[int, str]]] = {}
+    block: Optional[Tuple[str, int]] = None
+    for line in text.splitlines():
+        if line.startswith(('%', '#', '>>>')):
+            block = None
+            continue
+        match = LINE_REGEXP.match(line)
+        if match:
+            key, value = match.group(1).lower(), match.group(2).strip()
+            block = FIELD_BY_KEY.get(key)
+            if block is not None and value:
+                fields.setdefault(block[0], []).append((block[1], value))
+                if block[0] != 'name_servers':
+                    block = None
+            continue
+        value = line.strip()
+        if not value:
+            block = None
+        elif block is not None and line[:1].isspace():
+            fields.setdefault(block[0], []).append((block[1], value))
+    # Values of the most preferred key only.
+    return {
+        field: [value for rank, value in values
+                if rank == min(rank for rank, _ in values)]
+        for field, values in fields.items()
+    }
+
+
+def parse_response(domain: str, tld: str, text: str) -> Optional[dict]:
+    """Parse the WHOIS response into the fields of the `whois` library
+    result, returns None if the domain isn't registered."""
+    fields = parse_fields(text)
+    if NOT_FOUND_REGEXP.search(text) and not fields.get('expiration_date'):
+        return None
+
+    def first(field: str) -> Optional[str]:
+        values = fields.get(field)
+        return values[0] if values else None
+
+    statuses = sorted({
+        status.split(' http')[0].strip() for status in fields.get('status', [])
+    })
+    name_servers = []
+    for value in fields.get('name_servers', []):
+        name_server = value.split()[0].strip(' .').lower()
+        if name_server and name_server not in name_servers:
+            name_servers.append(name_server)
+    dnssec = first('dnssec')
+    return {
+        'name': domain,
+        'tld': tld.replace('.', '_'),
+        'registrar': first('registrar'),
+        'registrant_country': first('registrant_country'),
+        'creation_date': parse_date(first('creation_date') or ''),
+        'expiration_date': parse_date(first('expiration_date') or ''),
+        'last_updated': parse_date(first('last_updated') or ''),
+        'status': statuses[0] if statuses else None,
+        'statuses': statuses,
+        'dnssec': bool(dnssec) and 'unsigned' not in dnssec.lower(),
+        'name_servers': sorted(name_servers),
+        'registrant': first('registrant'),
+        'emails': sorted(set(EMAIL_REGEXP.findall(text))),
+    }
+
+
+def merge_records(registry: dict, registrar: Optional[dict]) -> dict:
+    """Registry data is authoritative, the registrar response only fills in
+    the missing fields (like registrant of thin registries)."""
+    if not registrar:
+        return registry
+    merged = dict(registry)
+    for key, value in registrar.items():
+        if not merged.get(key):
+            merged[key] = value
+    merged['emails'] = sorted(set(registry['emails'] + registrar['emails']))
+    return merged
+
+
+class ServerLimiter:
+    """Limits the amount of concurrent connections to the WHOIS-server and
+    keeps at least `interval` seconds between the connections."""
+
+    def __init__(self, concurrency: int, interval: float) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.interval = interval
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._next_slot = 0.0
+
+    async def __aenter__(self) -> None:
+        await self._semaphore.acquire()
+        now = time.monotonic()
+        delay = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except BaseException:
+                self._semaphore.release()
+                raise
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._semaphore.release()
+
+
+class WhoisClient:
+    """
+    Asynchronous WHOIS client (RFC 3912). The WHOIS-server of the TLD is
+    taken from the map seeded by WHOIS_SERVERS and learned from IANA, the
+    map is saved to WHOIS_SERVERS_PATH. Referrals of thin registries to the
+    registrar WHOIS-servers are followed.
+    """
+
+    def __init__(self, servers_path: str = WHOIS_SERVERS_PATH,
+                 timeout: float = WHOIS_TIMEOUT,
+                 server: str = WHOIS_SERVER) -> None:
+        self.servers_path = servers_path
+        self.timeout = timeout
+        self.server = server
+        # tld: (server, learned at), seed servers never expire.
+        self.servers: Dict[str, Tuple[str, float]] = {
+            tld: (server, float('inf'))
+            for tld, server in WHOIS_SERVERS.items()
+        }
+        self._loaded = False
+        self._limiters: Dict[str, ServerLimiter] = {}
+
+    def _load(self) -> None:
+        """Load the learned servers on first use."""
+        self._loaded = True
+        if not self.servers_path or not Path(self.servers_path).exists():
+            return
+        try:
+            learned = json.loads(Path(self.servers_path).read_text())
+        except (OSError, ValueError) as error:
+            logging.warning(messages.WHOIS_SERVERS_LOAD_ERROR.format(error))
+            return
+        for tld, (server, learned_at) in learned.items():
+            self.servers.setdefault(tld, (server, learned_at))
+
+    def _save(self) -> None:
+        if not self.servers_path:
+            return
+        learned = {tld: entry for tld, entry in self.servers.items()
+                   if entry[1] != float('inf')}
+        try:
+            path = Path(self.servers_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(learned, indent=1))
+        except OSError as error:
+            logging.warning(messages.WHOIS_SERVERS_SAVE_ERROR.format(error))
+
+    def _limiter(self, server: str) -> ServerLimiter:
+        limiter = self._limiters.get(server)
+        if limiter is None or limiter.loop is not asyncio.get_running_loop():
+            limiter = self._limiters[server] = ServerLimiter(
+                WHOIS_SERVER_CONCURRENCY, WHOIS_SERVER_INTERVAL)
+        return limiter
+
+    async def ask(self, server: str, query: str) -> str:
+        """Send the query to the WHOIS-server (`host` or `host:port`) and
+        read the whole response."""
+        host, _, port = server.partition(':')
+        query = QUERY_FORMATS.get(host, '{}').format(query)
+        async with self._limiter(server):
+            try:
+                reader, writer = await asyncio.open_connection(
+                    host, int(port) if port.isdigit() else WHOIS_PORT)
+            except OSError as error:
+                raise WhoisQueryError(f'{server}: {error}') from error
+            try:
+                writer.write(query.encode() + b'\r\n')
+                await writer.drain()
+                response = await reader.read(WHOIS_MAX_RESPONSE_SIZE)
+                while response and len(response) < WHOIS_MAX_RESPONSE_SIZE:
+                    chunk = await reader.read(
+                        WHOIS_MAX_RESPONSE_SIZE - len(response))
+                    if not chunk:
+                        break
+                    response += chunk
+            except OSError as error:
+                raise WhoisQueryError(f'{server}: {error}') from error
+            finally:
+                writer.close()
+        text = response.decode('utf-8', errors='replace')
+        if not text.strip():
+            raise WhoisQueryError(messages.WHOIS_EMPTY_RESPONSE.format(server))
+        if QUOTA_REGEXP.search(text) and len(text) < 1024:
+            raise WhoisQueryError(f'{server}: {text.strip()}')
+        return text
+
+    async def server_for(self, domain: str) -> Tuple[str, str]:
+        """WHOIS-server of the domain and the (longest) known TLD of it."""
+        if not self._loaded:
+            self._load()
+        labels = domain.lower().rstrip('.').split('.')
+        for index in range(1, len(labels)):
+            tld = '.'.join(labels[index:])
+            entry = self.servers.get(tld)
+            if entry is not None and (
+                    time.time() - entry[1] < WHOIS_SERVERS_TTL):
+                return entry[0], tld
+        tld = labels[-1]
+        return await self.refresh(tld), tld
+
+    async def refresh(self, tld: str) -> str:
+        """Ask IANA for the WHOIS-server of the TLD and remember it."""
+        fields = parse_fields(await self.ask(IANA_SERVER, tld))
+        servers = fields.get('referral')
+        if not servers:
+            entry = self.servers.get(tld)
+            if entry is not None:
+                return entry[0]
+            raise WhoisUnknownTld(messages.WHOIS_UNKNOWN_TLD.format(tld))
+        self.servers[tld] = (servers[0].lower(), time.time())
+        self._save()
+        return servers[0].lower()
+
+    async def _query(self, domain: str) -> Optional[dict]:
+        if self.server:
+            text = await self.ask(self.server, domain)
+            return parse_response(domain, domain.rsplit('.', 1)[-1], text)
+
+        server, tld = await self.server_for(domain)
+        text = await self.ask(server, domain)
+        record = parse_response(domain, tld, text)
+        visited = {server}
+        for _ in range(WHOIS_MAX_REFERRALS):
+            if record is None:
+                break
+            referral = next(
+                (value.lower() for value in parse_fields(text).get(
+                    'referral', [])
+                 if value.lower() not in visited), None)
+            if not referral:
+                break
+            referral = re.sub(r'^(r?whois://)', '', referral).strip('/')
+            visited.add(referral)
+            try:
+                text = await self.ask(referral, domain)
+            except (WhoisQueryError, OSError) as error:
+                # Registry data is enough, registrars are often unavailable.
+                logging.info(messages.WHOIS_REFERRAL_ERROR.format(
+                    referral, error))
+                break
+            record = merge_records(record, parse_response(domain, tld, text))
+        return record
+
+    async def query(self, domain: str) -> Optional[dict]:
+        """WHOIS record of the domain in the fields of the `whois` library
+        result, None if the domain isn't registered."""
+        try:
+            return await asyncio.wait_for(self._query(domain), self.timeout)
+        except asyncio.TimeoutError:
+            raise WhoisTimeout(messages.WHOIS_TIMEOUT) from None
+
+
+whois_client = WhoisClient()
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+import messages
+from constants import WHOIS_QUEUE_SIZE, WHOIS_TIMEOUT, WHOIS_WORKERS
+from exceptions import WhoisBusy, WhoisTimeout
+from metrics import CallbackMetric
+
+
+class WhoisPool:
+    """
+    Dedicated thread pool for blocking whois queries, so they don't hold
+    the event loop or the default executor of the API.
+    At most `workers` queries run at once and `queue_size` more may wait for
+    a free worker, further queries are rejected with `WhoisBusy` at once.
+    A query which runs longer than `timeout` raises `WhoisTimeout`, but still
+    holds its worker until the whois program exits.
+    """
+
+    def __init__(self, workers: int = WHOIS_WORKERS,
+                 queue_size: int = WHOIS_QUEUE_SIZE,
+                 timeout: float = WHOIS_TIMEOUT) -> None:
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.timeout = timeout
+        self.rejected = 0
+        self.timeouts = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='whois')
+
+    @property
+    def pending(self) -> int:
+        """Amount of running and waiting queries."""
+        return self._pending
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Run the blocking `func` in the pool and await its result."""
+        with self._lock:
+            if self._pending >= self.capacity:
+                self.rejected += 1
+                raise WhoisBusy(messages.WHOIS_BUSY)
+            self._pending += 1
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise WhoisTimeout(messages.WHOIS_TIMEOUT) from None
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+whois_pool = WhoisPool()
+CallbackMetric('wd_whois_in_flight', 'Running and waiting whois queries.',
+               'gauge', (), lambda: {(): whois_pool.pending})
+CallbackMetric('wd_whois_rejected_total',
+               'Whois queries rejected by the pool.', 'counter', ('reason',),
+               lambda: {('busy',): whois_pool.rejected,
+                        ('timeout',): whois_pool.timeouts})
@@ -0,0 +1,27 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules of the project import each other from `src`, the stand-in servers
+# of the benchmarks give the canned and signed DNS answers.
+sys.path.insert(0, str(ROOT / 'src'))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from exceptions import DNSTimeout  # noqa: E402
+from resolver import DNS_PORT, build_query, resolver  # noqa: E402
+from standins import dns_answer  # noqa: E402
+
+
+@pytest.fixture
+def standin_dns(monkeypatch):
+    """Canned answers of the DNS stand-in instead of the DNS-servers, the
+    servers which start with `timeout` don't answer."""
+    async def exchange(name, record, server, port=DNS_PORT, dnssec=False):
+        if server.startswith('timeout'):
+            raise DNSTimeout(f'{server} timed out')
+        return dns_answer(build_query(0, name, record, dnssec), tcp=True)
+
+    monkeypatch.setattr(resolver, 'exchange', exchange)
@@ -0,0 +1,117 @@
+import asyncio
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import batch
+from batch import bounded_map, read_lines
+from constants import BATCH_MAX_DOMAINS
+from wd_api import api
+from wd_api.main import app
+
+
+def _collect(iterator):
+    async def collect():
+        return [item async for item in iterator]
+
+    return asyncio.run(collect())
+
+
+def test_bounded_map_concurrency():
+    running = []
+    peak = []
+
+    async def func(item):
+        running.append(item)
+        peak.append(len(running))
+        await asyncio.sleep(0.01 * (item % 3))
+        running.remove(item)
+        return item * 2
+
+    results = _collect(bounded_map(func, range(20), 4))
+    assert sorted(results) == [item * 2 for item in range(20)]
+    assert max(peak) == 4
+
+
+def test_bounded_map_async_iterable():
+    async def items():
+        for item in range(5):
+            await asyncio.sleep(0)
+            yield item
+
+    async def func(item):
+        return item
+
+    assert sorted(_collect(bounded_map(func, items(), 2))) == list(range(5))
+
+
+def test_bounded_map_error():
+    async def func(item):
+        if item == 3:
+            raise ValueError(item)
+        return item
+
+    with pytest.raises(ValueError):
+        _collect(bounded_map(func, range(10), 2))
+
+
+def test_read_lines():
+    file = io.BytesIO(b'example.com\n\n# comment\n  example.org  \r\n')
+    assert list(read_lines(file)) == ['example.com', 'example.org']
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """API client which checks the domains without DNS and whois."""
+    async def check_domain(domain, records, dns, whois, force):
+        return {'domain': str(domain), 'result': True, 'records': records}
+
+    monkeypatch.setattr(batch, 'check_domain', check_domain)
+    return TestClient(app)
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_batch_api(client):
+    response = client.post('/api/v1/batch', json={
+        'domains': ['example.com', 'bad domain', 'EXAMPLE.com'],
+        'records': ['A', 'MX']})
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    results = _lines(response)
+    # Bad domains go first, the duplicates are checked once.
+    assert results[0] == {'domain': 'bad domain', 'result': False,
+                          'message': 'Bad domain'}
+    assert results[1:] == [{'domain': 'example.com', 'result': True,
+                            'records': ['A', 'MX']}]
+
+
+def test_batch_api_max_domains(client):
+    response = client.post('/api/v1/batch', json={
+        'domains': ['example.com'] * (BATCH_MAX_DOMAINS + 1)})
+    assert response.status_code == 422
+
+
+def test_batch_file_api(client):
+    response = client.post('/api/v1/batch/file?records=TXT',
+                           content=b'example.com\n# comment\nexample.org\n')
+    assert sorted(result['domain'] for result in _lines(response)) == [
+        'example.com', 'example.org']
+    assert all(result['records'] == ['TXT'] for result in _lines(response))
+
+
+def test_batch_file_api_too_large(client, monkeypatch):
+    monkeypatch.setattr(api, 'BATCH_MAX_FILE_SIZE', 16)
+    response = client.post('/api/v1/batch/file', content=b'x' * 17)
+    assert response.status_code == 413
+
+    def chunks():
+        yield b'example.com\n'
+        yield b'example.org\n'
+
+    # Without Content-Length the size is checked while the body is read.
+    response = client.post('/api/v1/batch/file', content=chunks())
+    assert response.status_code == 413
@@ -0,0 +1,141 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+import cache
+from cache import SQLiteCache, TTLCache
+
+
+def test_locked_file_doesnt_block(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = SQLiteCache(path, 10)
+    cache.set('kept', [1, 2], 60)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute('BEGIN IMMEDIATE')
+    try:
+        started = time.monotonic()
+        # WAL readers don't wait for the writer, the LRU touch is skipped.
+        assert cache.get('kept') == [1, 2]
+        cache.set('skipped', 1, 60)
+        assert time.monotonic() - started < 1
+        assert cache.busy == 2
+    finally:
+        other.execute('ROLLBACK')
+        other.close()
+    assert cache.get('skipped') is None
+    cache.set('stored', 1, 60)
+    assert cache.get('stored') == 1
+
+
+def test_locked_file_len_and_clear(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    SQLiteCache(path, 10).set('kept', 1, 60)
+    # The new connection fails to delete the expired entries.
+    cache = SQLiteCache(path, 10)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute('BEGIN IMMEDIATE')
+    try:
+        assert len(cache) == 0
+        cache.clear()
+        assert cache.busy == 2
+    finally:
+        other.execute('ROLLBACK')
+        other.close()
+    assert len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_sqlite_eviction(tmp_path, monkeypatch):
+    monkeypatch.setattr(SQLiteCache, 'EVICTION_SLACK', 0.1)
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'), 100)
+    counts = []
+    execute = cache._execute
+
+    def count_execute(sql, parameters=()):
+        if sql.startswith('SELECT COUNT(*)'):
+            counts.append(sql)
+        return execute(sql, parameters)
+
+    monkeypatch.setattr(cache, '_execute', count_execute)
+    for index in range(300):
+        cache.set(index, index, 60)
+        cache.get(0)
+    # The rows are counted on the first insert and once per slack.
+    assert len(counts) < 30
+    assert 90 <= len(cache) <= 100
+    assert cache.evictions == 300 - len(cache)
+    # The least recently used entries are evicted.
+    assert cache.get(0) == 0 and cache.get(1) is None
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_ttl_cache_expiration(clock):
+    memory = TTLCache(10)
+    memory.set('key', 'value', 5)
+    assert memory.get('key') == 'value'
+    clock[0] += 5
+    assert memory.get('key', 'missing') == 'missing'
+    assert (memory.hits, memory.misses, memory.expirations) == (1, 1, 1)
+    memory.set('key', 'value', 0)
+    assert len(memory) == 0
+
+
+def test_ttl_cache_lru():
+    memory = TTLCache(2)
+    memory.set('first', 1, 60)
+    memory.set('second', 2, 60)
+    memory.get('first')
+    memory.set('third', 3, 60)
+    assert memory.peek('second') is None
+    assert (memory.peek('first'), memory.peek('third')) == (1, 3)
+    assert memory.evictions == 1
+
+
+def test_single_flight():
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'value', 60
+
+    async def main():
+        memory = TTLCache(10)
+        results = await asyncio.gather(
+            *(memory.fetch('key', factory) for _ in range(5)))
+        cached = await memory.fetch('key', factory)
+        forced = await memory.fetch('key', factory, force=True)
+        return memory, results, cached, forced
+
+    memory, results, cached, forced = asyncio.run(main())
+    assert results == ['value'] * 5 and cached == forced == 'value'
+    assert len(calls) == 2
+    assert memory.single_flight.coalesced == 4
+    assert len(memory.single_flight) == 0
+
+
+def test_single_flight_error():
+    async def factory():
+        await asyncio.sleep(0.01)
+        raise ValueError('failed')
+
+    async def main():
+        memory = TTLCache(10)
+        results = await asyncio.gather(
+            *(memory.fetch('key', factory) for _ in range(3)),
+            return_exceptions=True)
+        return memory, results
+
+    memory, results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    # Errors are not cached.
+    assert memory.peek('key') is None
@@ -0,0 +1,80 @@
+import csv
+import json
+import socket
+
+import pytest
+
+import wd_cli
+from standins import start_standins
+
+DOMAINS = [f'domain{index}.example.com' for index in range(250)]
+
+
+def _write_inputs(path, lines):
+    path.write_text(''.join(f'{line}\n' for line in lines))
+    return str(path)
+
+
+def _ndjson(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.fixture(scope='module')
+def dns_server():
+    """DNS stand-in in its own process, so the worker processes of the
+    sharded run can query it."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    process = start_standins('127.0.0.1', port, 0)
+    yield f'127.0.0.1#{port}'
+    process.terminate()
+    process.join()
+
+
+def test_sharded(tmp_path, dns_server):
+    inputs = _write_inputs(tmp_path / 'domains.txt', [*DOMAINS, 'bad'])
+    output = tmp_path / 'out.ndjson'
+    wd_cli.main([inputs, '--dns', dns_server, '--workers', '2',
+                 '-c', '20', '-o', str(output)])
+    results = _ndjson(output)
+    assert sorted(result['domain'] for result in results) == sorted(
+        [*DOMAINS, 'bad'])
+    answers = next(result for result in results
+                   if result['domain'] == DOMAINS[0])['dig']['data']
+    assert [answer['content'] for answer in answers['A'][dns_server]] == [
+        '192.0.2.1', '192.0.2.2']
+
+
+def test_checkpoint_resume(tmp_path, standin_dns):
+    inputs = tmp_path / 'domains.txt'
+    output = tmp_path / 'out.csv'
+    checkpoint = tmp_path / 'out.done'
+    arguments = [str(inputs), '--dns', '192.0.2.53', '-r', 'A', 'MX',
+                 '-f', 'csv', '-o', str(output),
+                 '--checkpoint', str(checkpoint)]
+
+    _write_inputs(inputs, DOMAINS[:3])
+    wd_cli.main(arguments)
+    # The interrupted run is continued with the new domains of the input.
+    _write_inputs(inputs, DOMAINS[:5])
+    wd_cli.main(arguments)
+
+    with open(output, newline='') as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ['domain', 'result', 'message', 'A', 'MX']
+    assert sorted(row[0] for row in rows[1:]) == sorted(DOMAINS[:5])
+    assert rows[1][3] == '192.0.2.1 | 192.0.2.2'
+    assert sorted(checkpoint.read_text().split()) == sorted(DOMAINS[:5])
+
+
+def test_checkpoint_skips_checked(tmp_path, standin_dns, capsys):
+    inputs = _write_inputs(tmp_path / 'domains.txt', DOMAINS[:4])
+    checkpoint = tmp_path / 'out.done'
+    checkpoint.write_text(f'{DOMAINS[0]}\n{DOMAINS[1]}\n')
+    output = tmp_path / 'out.ndjson'
+    wd_cli.main([inputs, '--dns', '192.0.2.53', '-o', str(output),
+                 '--checkpoint', str(checkpoint)])
+    assert sorted(result['domain'] for result in _ndjson(output)) == (
+        DOMAINS[2:4])
+    assert capsys.readouterr().err.strip().endswith('2')
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from constants import COMMON_RECORDS, DEFAULT_TYPE, DIG_ALL_PRESET
+from wd import Domain
+
+SERVERS = ('192.0.2.53', '198.51.100.53')
+
+
+def _dig(record, servers=SERVERS, **kwargs):
+    return asyncio.run(Domain('example.com').dig(
+        record, servers, backend='native', force=True, **kwargs))
+
+
+@pytest.mark.parametrize('record, records', [
+    ('mx', ['MX']),
+    (['A', 'mx', 'A', 'UNKNOWN'], ['A', 'MX']),
+    (['UNKNOWN'], [DEFAULT_TYPE]),
+    (DIG_ALL_PRESET.lower(), list(COMMON_RECORDS)),
+])
+def test_dig_records(record, records):
+    assert Domain.dig_records(record) == records
+
+
+def test_single_record(standin_dns):
+    output = _dig('A')
+    assert output['record'] == 'A' and 'records' not in output
+    assert set(output['data']) == set(SERVERS)
+    assert [answer['content'] for answer in output['data'][SERVERS[0]]] == [
+        '192.0.2.1', '192.0.2.2']
+    assert output['servers'][SERVERS[0]]['status'] == 'NOERROR'
+
+
+def test_many_records(standin_dns):
+    output = _dig(['A', 'MX', 'TXT'])
+    assert output['records'] == ['A', 'MX', 'TXT']
+    assert set(output['data']) == set(output['servers']) == {
+        'A', 'MX', 'TXT'}
+    for record in output['records']:
+        assert set(output['data'][record]) == set(SERVERS)
+    assert output['data']['MX'][SERVERS[1]][0]['content'] == (
+        '10 mx1.example.net.')
+
+
+def test_all_preset(standin_dns):
+    output = _dig(DIG_ALL_PRESET)
+    assert output['records'] == list(COMMON_RECORDS)
+    assert set(output['data']) == set(COMMON_RECORDS)
+
+
+def test_server_timeout(standin_dns):
+    output = _dig(['A', 'AAAA'], ('192.0.2.53', 'timeout.test'))
+    for record in ('A', 'AAAA'):
+        assert output['data'][record]['timeout.test'] == []
+        assert output['servers'][record]['timeout.test']['timeout']
+        assert output['data'][record]['192.0.2.53']
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from dig_parser import DigOutputParser, rdata_content, unescape
+from resolver import RCODE_VALUES, DNSResponse
+
+OUTPUT = (
+    b';; Got answer:\n'
+    b';; ->>HEADER<<- opcode: QUERY, status: NOERROR, id: 4242\n'
+    b'\n'
+    b'example.com.\t\t300\tIN\tA\t93.184.216.34\n'
+    b'example.com.\t\t60\tIN\tTXT\t"v=spf1 -all" "second"\n'
+    b'broken line\n'
+    b';; Query time: 1 msec\n'
+)
+
+
+@pytest.mark.parametrize('rdata, content', [
+    ('93.184.216.34', '93.184.216.34'),
+    ('"foo" "bar"', 'foo bar'),
+    ('"v=spf1 include:_spf.example.com ~all"',
+     'v=spf1 include:_spf.example.com ~all'),
+    ('"a \\"quoted\\" word"', 'a "quoted" word'),
+    ('"semi\\059colon" "x"', 'semi;colon x'),
+    ('"\\208\\191\\209\\128\\208\\184"', 'при'),
+    ('0 issue "letsencrypt.org"', '0 issue letsencrypt.org'),
+])
+def test_rdata_content(rdata, content):
+    assert rdata_content(rdata) == content
+
+
+def test_unescape_without_escapes():
+    assert unescape('plain') == 'plain'
+
+
+def test_feed():
+    parser = DigOutputParser()
+    for line in OUTPUT.splitlines(keepends=True):
+        parser.feed(line)
+    assert parser.rcode == RCODE_VALUES['NOERROR']
+    assert [(answer.name, answer.ttl, answer.rtype, answer.rdata)
+            for answer in parser.answers] == [
+        ('example.com.', 300, 'A', '93.184.216.34'),
+        ('example.com.', 60, 'TXT', '"v=spf1 -all" "second"'),
+    ]
+    assert parser.skipped == 1
+
+
+def test_status():
+    parser = DigOutputParser()
+    parser.feed(b';; ->>HEADER<<- opcode: QUERY, status: NXDOMAIN, id: 1\n')
+    assert parser.rcode == RCODE_VALUES['NXDOMAIN']
+    assert parser.answers == []
+
+
+@pytest.mark.parametrize('chunk_size', [DigOutputParser.CHUNK_SIZE, 7])
+def test_read(monkeypatch, chunk_size):
+    async def read():
+        stream = asyncio.StreamReader()
+        stream.feed_data(OUTPUT)
+        stream.feed_eof()
+        return await DigOutputParser().read(stream)
+
+    # Lines split between the chunks are parsed once they are complete.
+    monkeypatch.setattr(DigOutputParser, 'CHUNK_SIZE', chunk_size)
+    parser = asyncio.run(read())
+    assert [answer.rdata for answer in parser.answers] == [
+        '93.184.216.34', '"v=spf1 -all" "second"']
+    assert parser.rcode == RCODE_VALUES['NOERROR'] and parser.skipped == 1
+
+
+def test_feed_data():
+    parser = DigOutputParser()
+    parser.feed_data(OUTPUT.replace(b'\n', b'\r\n'))
+    assert len(parser.answers) == 2 and parser.skipped == 1
+
+
+def test_authority():
+    parser = DigOutputParser()
+    parser.feed_data(
+        b';; ->>HEADER<<- opcode: QUERY, status: NXDOMAIN, id: 1\n'
+        b';; AUTHORITY SECTION:\n'
+        b'example.com.\t\t900\tIN\tSOA\tns.example.com. '
+        b'hostmaster.example.com. 1 7200 3600 1209600 300\n')
+    assert parser.answers == [] and len(parser.authority) == 1
+    # The negative answer is cached by the SOA minimum.
+    response = DNSResponse(0, parser.rcode, False, parser.answers,
+                           parser.authority)
+    assert response.status == 'NXDOMAIN' and response.negative_ttl() == 300
+    parser.feed(b';; ANSWER SECTION:\n')
+    assert parser.feed(b'example.com.\t300\tIN\tA\t192.0.2.1\n').rdata == (
+        '192.0.2.1')
+    assert len(parser.answers) == 1
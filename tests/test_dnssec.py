@@ -0,0 +1,183 @@
+import asyncio
+import struct
+
+import pytest
+
+import dnssec
+import messages
+from resolver import RCODE_VALUES, build_query
+from standins import dns_answer, trust_anchor
+
+# RFC 8032 section 7.1, test 1: the empty message.
+ED25519_KEY = bytes.fromhex(
+    'd75a980182b10ab7d54bfed3c964073a0ee172f3daa62325af021a68f707511a')
+ED25519_SIGNATURE = bytes.fromhex(
+    'e5564300c360ac729086e2cc806e828a84877f1eb8e5d974d873e065224901555fb88'
+    '21590a33bacc61e39701cf9b46bd25bf5f0595bbe24655141438e7a100b')
+
+# RFC 6979 appendix A.2.5 and A.2.6: the message `sample`, the key is x
+# and y of the public point, the signature is r and s.
+P256_KEY = bytes.fromhex(
+    '60fed4ba255a9d31c961eb74c6356d68c049b8923b61fa6ce669622e60f29fb6'
+    '7903fe1008b8bc99a41ae9e95628bc64f2f1b20c2d7e9f5177a3c294d4462299')
+P256_SIGNATURE = bytes.fromhex(
+    'efd48b2aacb6a8fd1140dd9cd45e81d69d2c877b56aaf991c34d0ea84eaf3716'
+    'f7cb1c942d657c41d436c7a1b6e29f65f3e900dbb9aff4064dc4ab2f843acda8')
+P384_KEY = bytes.fromhex(
+    'ec3a4e415b4e19a4568618029f427fa5da9a8bc4ae92e02e06aae5286b300c64'
+    'def8f0ea9055866064a254515480bc13'
+    '8015d9b72d7d57244ea8ef9ac0c621896708a59367f9dfb9f54ca84b3f1c9db1'
+    '288b231c3ae0d4fe7344fd2533264720')
+P384_SIGNATURE = bytes.fromhex(
+    '94edbb92a5ecb8aad4736e56c691916b3f88140666ce9fa73d64c4ea95ad133c'
+    '81a648152e44acf96e36dd1e80fabe46'
+    '99ef4aeb15f178cea1fe40db2603138f130e740a19624526203b6351d0a3a94f'
+    'a329c145786e679e7b82c71a38628ac8')
+
+# RSA key of 1024 bits in the DNSKEY form (RFC 3110): exponent 65537 and
+# the modulus; the signatures of `sample` are made by `openssl dgst -sign`.
+RSA_KEY = b'\x03\x01\x00\x01' + bytes.fromhex(
+    'e1774dd94cdd33523a583e8320192431d6c900fe02d7345b85204dd74d327955'
+    '2bdf12c32d392723f9974f5647ca6b6edba9a2b7b38cf817645f65d455c5758e'
+    '1f6886c809ac9ab00730205a570e03e922286eab4baf1adcab482530ee2c9929'
+    'a1922a690631aef49a7aa9be5b8ac22a2fcb5dff1981fb217ccb1de35975ccb5')
+RSA_SIGNATURES = {
+    5: bytes.fromhex(
+        'cc479ad2805857416499dae5388ccc2f0c5e6ffcdf06b30a42f06bb79aec35d5'
+        'bead41701f24c3756c25f2ee8959564c89f6850db3366772dda8aae9c65ae0a2'
+        '27e3558e213bea6518b2458c102a03adab6c9d4621b9f84c7e1a4e2661bf0944'
+        'd67fddb2fdfab788715ff661b6ad3a63cb2a8f9cf9cd660df6a242438980ef2c'),
+    8: bytes.fromhex(
+        'bad029546d38d4e92fc86151743978b96aae29cd526fe6e4ce1d2a1c26f746f8'
+        'c080b32ca13b00bba203c499c72c19b2cd9223784d1996961569d7b8f972cf00'
+        '74d2a8b9324c67b8e3d8b2c1530c89aba39578678f0752f7cb40cfa91264a805'
+        'e801ff9aa825bf852d35b74e73c95bbeffac9894621ed7ea523dc4c65c78ea00'),
+    10: bytes.fromhex(
+        '46984dda2b4cbdeb785f90d7c71293726392efa8729422234c7204a0e5b127b0'
+        'fd031d696a8989e0d8e1d009b9fe048db2d365ebf5f0edff77fcb67c87006d26'
+        'e8e18913994f36716a5c0421699f9b67e915a1f2b4bf59333157e9c72ba2e608'
+        '9ec798d00f825352b3c9c34854f438c586bafd3ac3d0ba08f8544cf9cb816fdd'),
+}
+
+VECTORS = [
+    (15, ED25519_KEY, ED25519_SIGNATURE, b''),
+    (13, P256_KEY, P256_SIGNATURE, b'sample'),
+    (14, P384_KEY, P384_SIGNATURE, b'sample'),
+    *((algorithm, RSA_KEY, signature, b'sample')
+      for algorithm, signature in RSA_SIGNATURES.items()),
+]
+
+
+def _flip(data: bytes, index: int) -> bytes:
+    return data[:index] + bytes([data[index] ^ 1]) + data[index + 1:]
+
+
+@pytest.mark.parametrize('algorithm, key, signature, data', VECTORS)
+def test_valid_signature(algorithm, key, signature, data):
+    assert dnssec.ALGORITHMS[algorithm](key, signature, data)
+
+
+@pytest.mark.parametrize('algorithm, key, signature, data', VECTORS)
+def test_wrong_data(algorithm, key, signature, data):
+    assert not dnssec.ALGORITHMS[algorithm](key, signature, data + b'!')
+
+
+@pytest.mark.parametrize('algorithm, key, signature, data', VECTORS)
+def test_wrong_signature(algorithm, key, signature, data):
+    assert not dnssec.ALGORITHMS[algorithm](
+        key, _flip(signature, len(signature) - 1), data)
+
+
+@pytest.mark.parametrize('algorithm, key, signature, data', VECTORS)
+def test_short_signature(algorithm, key, signature, data):
+    assert not dnssec.ALGORITHMS[algorithm](key, signature[:-1], data)
+
+
+@pytest.mark.parametrize('rcode', ['SERVFAIL', 'REFUSED'])
+def test_error_answer_is_indeterminate(monkeypatch, rcode):
+    async def exchange(name, record, host, port, dnssec=False):
+        query = build_query(0, name, record, dnssec)
+        flags = 0x8000 | RCODE_VALUES[rcode]
+        return query[:2] + struct.pack('!H', flags) + query[4:]
+
+    monkeypatch.setattr(dnssec.resolver, 'exchange', exchange)
+    result = asyncio.run(dnssec.validate(
+        'example.com', ('A',), dns=('192.0.2.1',), force=True))
+    assert result['status'] == dnssec.INDETERMINATE
+    assert result['records']['A']['status'] == dnssec.INDETERMINATE
+    assert [zone['status'] for zone in result['zones']] == [
+        dnssec.INDETERMINATE]
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    """Answers of the signed stand-in zones instead of the DNS-servers."""
+    async def exchange(name, record, host, port, dnssec=False):
+        return dns_answer(build_query(0, name, record, dnssec), tcp=True)
+
+    monkeypatch.setattr(dnssec.resolver, 'exchange', exchange)
+
+
+def _validate(domain, records=('A',)):
+    return asyncio.run(dnssec.validate(
+        domain, records, dns=('192.0.2.1',), force=True,
+        trust_anchors=(trust_anchor(),)))
+
+
+@pytest.mark.parametrize('domain, status, zones', [
+    ('signed.test', dnssec.VALIDATED,
+     [dnssec.VALIDATED, dnssec.VALIDATED, dnssec.VALIDATED]),
+    ('www.signed.test', dnssec.VALIDATED,
+     [dnssec.VALIDATED, dnssec.VALIDATED, dnssec.VALIDATED]),
+    ('bogus.test', dnssec.BOGUS,
+     [dnssec.VALIDATED, dnssec.VALIDATED, dnssec.BOGUS]),
+    ('insecure.test', dnssec.INSECURE,
+     [dnssec.VALIDATED, dnssec.VALIDATED, dnssec.INSECURE]),
+])
+def test_chain(standin, domain, status, zones):
+    result = _validate(domain)
+    assert result['status'] == status
+    assert [zone['status'] for zone in result['zones']] == zones
+    assert [zone['zone'] for zone in result['zones']][:2] == ['.', 'test.']
+
+
+def test_proof_of_no_records(standin):
+    result = _validate('signed.test', ('A', 'MX'))
+    assert result['status'] == dnssec.VALIDATED
+    assert result['records']['MX'] == {
+        'status': dnssec.VALIDATED, 'reason': messages.DNSSEC_NO_RECORDS}
+
+
+def test_wrong_trust_anchor(standin):
+    tag, algorithm, digest_type, digest = trust_anchor().split()
+    wrong = f'{tag} {algorithm} {digest_type} {digest[:-1]}' + (
+        '0' if digest[-1] != '0' else '1')
+    result = asyncio.run(dnssec.validate(
+        'signed.test', ('A',), dns=('192.0.2.1',), force=True,
+        trust_anchors=(wrong,)))
+    assert result['status'] == dnssec.BOGUS
+    assert result['zones'][0]['reason'] == messages.DNSSEC_NO_KEYS
+
+
+def test_truncated_rrsig_is_bogus():
+    owner = dnssec.to_name('example.com')
+    record = dnssec.Record(owner, 1, 300, b'\xc0\x00\x02\x01')
+    # The signer name is cut in the middle of its first label.
+    rrsig = dnssec.RRSIG_FIXED.pack(
+        1, 13, 2, 300, 2 ** 32 - 1, 0, 0) + b'\x07exam'
+    signature = dnssec.Record(owner, dnssec.TYPE_RRSIG, 300, rrsig)
+    assert not dnssec.verify_rrset(
+        owner, 1, [record], [signature], [b'\x01\x01\x03\x0d' + P256_KEY],
+        dnssec.to_name('com'), 1)
+
+
+@pytest.mark.parametrize('rdata', [b'', b'\x01\x00\x00', b'\x01\x00\x00\x00'
+                                   b'\x00\x14'])
+def test_truncated_nsec3_proves_nothing(monkeypatch, rdata):
+    monkeypatch.setattr(dnssec, 'verify_rrset', lambda *args: True)
+    zone = dnssec.to_name('example.com')
+    nsec3 = dnssec.Record(
+        (b'0p9mhaveqvm6t7vbl5lop2u3t2rp3tom',) + zone, dnssec.TYPE_NSEC3,
+        300, rdata)
+    assert dnssec._denial(
+        (b'www',) + zone, 1, [nsec3], (), zone, 1) == (None, 0)
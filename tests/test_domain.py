@@ -0,0 +1,45 @@
+import pytest
+
+from exceptions import BadDomain
+from wd import Domain
+
+
+@pytest.mark.parametrize('input_site, domain', [
+    ('example.com', 'example.com'),
+    ('https://WWW.Example.com/path?q=1', 'www.example.com'),
+    ('user@mail.example.org', 'mail.example.org'),
+    ('пример.рф', 'xn--e1afmkfd.xn--p1ai'),
+    ('http://xn--e1afmkfd.xn--p1ai/', 'xn--e1afmkfd.xn--p1ai'),
+    ('no domain', None),
+    ('example.c', None),
+])
+def test_normalize(input_site, domain):
+    assert Domain.normalize(input_site) == domain
+
+
+def test_bad_domain():
+    with pytest.raises(BadDomain):
+        Domain('no domain')
+
+
+def test_domain_codecs():
+    assert Domain.domain_encode('example.com') == 'example.com'
+    assert Domain.domain_decode('xn--e1afmkfd.xn--p1ai') == 'пример.рф'
+    assert Domain.domain_decode('example.com') == 'example.com'
+
+
+def test_from_many():
+    domains, bad = Domain.from_many([
+        'Example.com', 'bad', 'https://example.com/', 'пример.рф',
+        'xn--e1afmkfd.xn--p1ai', '', 'example.org'])
+    assert [domain.domain for domain in domains] == [
+        'example.com', 'xn--e1afmkfd.xn--p1ai', 'example.org']
+    assert all(isinstance(domain, Domain) for domain in domains)
+    assert bad == ['bad', '']
+
+
+def test_from_many_matches_domain():
+    inputs = ['WWW.Example.com', 'mail.example.org/', 'пример.рф']
+    domains, _ = Domain.from_many(inputs)
+    assert [str(domain) for domain in domains] == [
+        str(Domain(input_site)) for input_site in inputs]
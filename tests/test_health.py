@@ -0,0 +1,86 @@
+import pytest
+
+import health
+from constants import DNS_BREAKER_COOLDOWN, DNS_BREAKER_FAILURES
+from health import (CLOSED, HALF_OPEN, OPEN, UpstreamHealth,
+                    UpstreamRegistry)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(health.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def _fail(upstream: UpstreamHealth, times: int) -> None:
+    for _ in range(times):
+        upstream.record_failure(TimeoutError())
+
+
+def test_breaker_opens_after_failures(clock):
+    upstream = UpstreamHealth('192.0.2.1')
+    _fail(upstream, DNS_BREAKER_FAILURES - 1)
+    assert upstream.state == CLOSED
+    _fail(upstream, 1)
+    assert upstream.state == OPEN
+    assert not upstream.available()
+
+
+def test_success_resets_failures(clock):
+    upstream = UpstreamHealth('192.0.2.1')
+    _fail(upstream, DNS_BREAKER_FAILURES - 1)
+    upstream.record_success(0.01)
+    _fail(upstream, DNS_BREAKER_FAILURES - 1)
+    assert upstream.state == CLOSED
+
+
+def test_half_open(clock):
+    upstream = UpstreamHealth('192.0.2.1')
+    _fail(upstream, DNS_BREAKER_FAILURES)
+    clock[0] += DNS_BREAKER_COOLDOWN
+    assert upstream.state == HALF_OPEN
+    assert upstream.available()
+    # The first failure of the half-open server opens the breaker again.
+    _fail(upstream, 1)
+    assert upstream.state == OPEN
+    clock[0] += DNS_BREAKER_COOLDOWN
+    upstream.record_success(0.01)
+    assert upstream.state == CLOSED
+
+
+def test_latency_and_failure_rate():
+    upstream = UpstreamHealth('192.0.2.1')
+    upstream.record_success(0.1)
+    assert upstream.latency == 0.1
+    upstream.record_success(0.2)
+    assert 0.1 < upstream.latency < 0.2
+    _fail(upstream, 1)
+    assert 0 < upstream.failure_rate < 1
+    assert (upstream.queries, upstream.failures) == (3, 1)
+
+
+def test_rank(clock):
+    registry = UpstreamRegistry()
+    registry.get('slow').record_success(0.5)
+    registry.get('fast').record_success(0.01)
+    _fail(registry.get('down'), DNS_BREAKER_FAILURES)
+    assert registry.rank(['slow', 'down', 'fast', 'new']) == [
+        'new', 'fast', 'slow']
+
+
+def test_all_down_are_available(clock):
+    registry = UpstreamRegistry()
+    _fail(registry.get('down'), DNS_BREAKER_FAILURES)
+    assert registry.available(['down']) == ['down']
+
+
+def test_registry_is_bounded():
+    registry = UpstreamRegistry(max_size=2)
+    first = registry.get('first')
+    registry.get('second')
+    registry.get('first')
+    registry.get('third')
+    assert [item['server'] for item in registry.stats()] == [
+        'first', 'third']
+    assert registry.get('first') is first
@@ -0,0 +1,74 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import metrics
+from metrics import (CONTENT_TYPE, CallbackMetric, Counter, Gauge, Histogram,
+                     Registry)
+from wd import Domain
+from wd_api.main import app
+
+
+def test_counter():
+    registry = Registry()
+    counter = Counter('test_total', 'Test counter.', ('handler',),
+                      registry=registry)
+    counter.inc(handler='dig')
+    counter.inc(2, handler='dig')
+    counter.inc(handler='say "hi"\n')
+    assert registry.render() == (
+        '# HELP test_total Test counter.\n'
+        '# TYPE test_total counter\n'
+        'test_total{handler="dig"} 3\n'
+        'test_total{handler="say \\"hi\\"\\n"} 1\n')
+
+
+def test_gauge_without_labels():
+    registry = Registry()
+    gauge = Gauge('test_in_flight', 'Test gauge.', registry=registry)
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    assert registry.render().splitlines()[-1] == 'test_in_flight 1'
+    gauge.set(0.5)
+    assert registry.render().splitlines()[-1] == 'test_in_flight 0.5'
+
+
+def test_histogram():
+    registry = Registry()
+    histogram = Histogram('test_seconds', 'Test histogram.', ('server',),
+                          buckets=(0.1, 1), registry=registry)
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, server='192.0.2.1')
+    lines = registry.render().splitlines()
+    assert lines[1] == '# TYPE test_seconds histogram'
+    assert lines[2:] == [
+        'test_seconds_bucket{server="192.0.2.1",le="0.1"} 1',
+        'test_seconds_bucket{server="192.0.2.1",le="1"} 2',
+        'test_seconds_bucket{server="192.0.2.1",le="+Inf"} 3',
+        'test_seconds_sum{server="192.0.2.1"} 5.55',
+        'test_seconds_count{server="192.0.2.1"} 3',
+    ]
+
+
+def test_callback_metric():
+    registry = Registry()
+    CallbackMetric('test_size', 'Test callback.', 'gauge', ('cache',),
+                   lambda: {('dig',): 10, ('whois',): 2}, registry=registry)
+    assert registry.render().splitlines()[2:] == [
+        'test_size{cache="dig"} 10', 'test_size{cache="whois"} 2']
+
+
+def test_dig_duration(standin_dns):
+    asyncio.run(Domain('example.com').dig(
+        'A', ('192.0.2.53',), backend='native', force=True))
+    # Servers which are not in DIG_METRIC_SERVERS share one label.
+    assert 'wd_dig_duration_seconds_count{server="other",backend="native",' \
+        'status="NOERROR"}' in metrics.REGISTRY.render()
+
+
+def test_metrics_route():
+    response = TestClient(app).get('/metrics')
+    assert response.headers['content-type'] == CONTENT_TYPE
+    assert '# TYPE wd_dig_duration_seconds histogram' in response.text
+    assert 'wd_cache_size{cache="dig"}' in response.text
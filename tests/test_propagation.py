@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from wd import Domain
+from wd_api.main import app
+
+
+def _result(server, status='NOERROR', *contents):
+    return {'server': server, 'status': status, 'answers': [
+        {'ttl': str(300 - index), 'content': content}
+        for index, content in enumerate(contents)]}
+
+
+def test_summary_groups():
+    summary = Domain.propagation_summary([
+        _result('a', 'NOERROR', '192.0.2.1', '192.0.2.2'),
+        # Order and TTLs of the answers don't matter.
+        _result('b', 'NOERROR', '192.0.2.2', '192.0.2.1'),
+        _result('c', 'NOERROR', '192.0.2.9'),
+        _result('d', 'TIMEOUT'),
+        _result('e', 'NXDOMAIN'),
+        _result('f', 'NOERROR', '192.0.2.1', '192.0.2.2', '192.0.2.1'),
+    ])
+    assert summary['total'] == 6 and summary['answered'] == 5
+    assert not summary['consistent']
+    assert summary['groups'][0] == {
+        'status': 'NOERROR', 'answers': ['192.0.2.1', '192.0.2.2'],
+        'servers': ['a', 'b', 'f']}
+    assert len(summary['groups']) == 3
+    assert summary['failed'] == ['d']
+
+
+def test_summary_consistent():
+    summary = Domain.propagation_summary([
+        _result('a', 'NOERROR', '192.0.2.1'), _result('b', 'ERROR'),
+        _result('c', 'NOERROR', '192.0.2.1')])
+    assert summary['consistent'] and summary['failed'] == ['b']
+
+
+def test_summary_empty():
+    summary = Domain.propagation_summary([])
+    assert summary == {'total': 0, 'answered': 0, 'consistent': False,
+                       'groups': [], 'failed': []}
+
+
+def test_propagation(standin_dns):
+    async def run():
+        return [result async for result in Domain('example.com').propagation(
+            'A', ['192.0.2.53', 'timeout.propagation', '192.0.2.53'],
+            force=True)]
+
+    results = asyncio.run(run())
+    assert sorted(result['server'] for result in results) == [
+        '192.0.2.53', 'timeout.propagation']
+    summary = Domain.propagation_summary(results)
+    assert summary['failed'] == ['timeout.propagation']
+    assert summary['groups'][0]['answers'] == ['192.0.2.1', '192.0.2.2']
+
+
+def test_propagation_events(standin_dns):
+    response = TestClient(app).get('/api/v1/dig/propagation', params={
+        'domain': 'example.com', 'record': 'MX',
+        'dns': ['192.0.2.53', '198.51.100.53']})
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = [
+        (block.split('\n')[0][len('event: '):],
+         json.loads(block.split('\n')[1][len('data: '):]))
+        for block in response.text.strip().split('\n\n')]
+    assert [event for event, _ in events] == ['result', 'result', 'summary']
+    summary = events[-1][1]
+    assert summary['record'] == 'MX' and summary['consistent']
+    assert summary['groups'][0]['servers'] == [
+        result['server'] for _, result in events[:2]]
@@ -0,0 +1,85 @@
+import asyncio
+import ipaddress
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import messages
+from exceptions import BadNetwork
+from ptr import parse_network, ptr_sweep, ptr_tg_message
+from wd_api.main import app
+
+SERVERS = ('192.0.2.53',)
+
+
+@pytest.mark.parametrize('value, network', [
+    ('192.0.2.7', '192.0.2.7/32'),
+    (' 192.0.2.7/30 ', '192.0.2.4/30'),
+    ('2001:db8::1/126', '2001:db8::/126'),
+])
+def test_parse_network(value, network):
+    assert parse_network(value) == ipaddress.ip_network(network)
+
+
+@pytest.mark.parametrize('value', ['192.0.2.300', 'example.com', ''])
+def test_bad_network(value):
+    with pytest.raises(BadNetwork):
+        parse_network(value)
+
+
+def test_network_too_big():
+    with pytest.raises(BadNetwork) as error:
+        parse_network('192.0.2.0/24', max_addresses=128)
+    assert str(error.value) == messages.NETWORK_TOO_BIG.format(128)
+
+
+def _sweep(network, dns=SERVERS):
+    async def run():
+        return [result async for result in ptr_sweep(
+            parse_network(network), dns, force=True)]
+
+    return asyncio.run(run())
+
+
+def test_sweep(standin_dns):
+    results = _sweep('192.0.2.0/30')
+    assert sorted(result['ip'] for result in results) == [
+        '192.0.2.0', '192.0.2.1', '192.0.2.2', '192.0.2.3']
+    result = next(result for result in results if result['ip'] == '192.0.2.1')
+    assert result == {'ip': '192.0.2.1', 'name': '1.2.0.192.in-addr.arpa',
+                      'result': True, 'server': '192.0.2.53',
+                      'status': 'NOERROR', 'ptr': ['host.example.net.']}
+
+
+def test_sweep_without_answers(standin_dns):
+    result, = _sweep('192.0.2.1', ('timeout.ptr',))
+    assert not result['result'] and result['ptr'] == []
+    assert result['status'] == 'TIMEOUT'
+
+
+def test_tg_message():
+    network = parse_network('192.0.2.0/30')
+    message = ptr_tg_message(network, [
+        {'ip': '192.0.2.10', 'result': True, 'ptr': ['b.example.net.']},
+        {'ip': '192.0.2.9', 'result': True, 'ptr': ['a.example.net.']},
+        {'ip': '192.0.2.1', 'result': True, 'ptr': []},
+        {'ip': '192.0.2.2', 'result': False, 'ptr': []},
+    ]).splitlines()
+    assert message[0] == messages.PTR_TG_LABEL.format(network, 2, 4)
+    # Addresses are sorted as addresses, not as strings.
+    assert message[2:4] == ['192.0.2.9 → a.example.net.',
+                            '192.0.2.10 → b.example.net.']
+    assert message[-1] == messages.PTR_FAILED.format(1).strip()
+
+
+def test_ptr_api(standin_dns):
+    client = TestClient(app)
+    response = client.get('/api/v1/ptr', params={
+        'network': '192.0.2.0/31', 'dns': list(SERVERS)})
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert sorted(json.loads(line)['ip'] for line in
+                  response.text.splitlines()) == ['192.0.2.0', '192.0.2.1']
+    response = client.get('/api/v1/ptr', params={'network': 'bad'})
+    assert response.json() == {
+        'message': messages.BAD_NETWORK.format('bad'), 'result': False}
@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limit
+from metrics import BOT_EDITS_SKIPPED
+from rate_limit import RateLimiter
+from wd import Domain
+from wd_telegram_bot import WDTelegramBot
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_burst_and_refill(clock):
+    limiter = RateLimiter(rate=0.5, burst=3)
+    assert [limiter.allow(1) for _ in range(4)] == [True, True, True, False]
+    assert limiter.limited == 1
+    assert limiter.bucket(1).retry_after() == pytest.approx(2)
+    # Other chats have their own buckets.
+    assert limiter.allow(2)
+    clock[0] += 2
+    assert limiter.allow(1) and not limiter.allow(1)
+
+
+def test_least_recently_used_keys_are_dropped(clock):
+    limiter = RateLimiter(rate=0.1, burst=1, max_keys=2)
+    assert limiter.allow(1) and limiter.allow(2) and limiter.allow(3)
+    # The bucket of the first chat is dropped, so it is full again.
+    assert limiter.allow(1)
+    assert not limiter.allow(3)
+
+
+def test_disabled_limit(clock):
+    limiter = RateLimiter(rate=0, burst=1)
+    assert all(limiter.allow(1) for _ in range(100))
+
+
+class FakeQuery:
+    def __init__(self, text):
+        self.data = 'example.com A'
+        self.message = SimpleNamespace(chat_id=1, message_id=2, text=text)
+        self.edits = []
+
+    async def answer(self, text=None):
+        pass
+
+    async def edit_message_text(self, text, reply_markup=None):
+        self.edits.append(text)
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    calls = []
+
+    async def dig_tg_message(self, record):
+        calls.append(record)
+        await asyncio.sleep(0.01)
+        return f'{self.domain} {record}'
+
+    monkeypatch.setattr(Domain, 'dig_tg_message', dig_tg_message)
+    bot = WDTelegramBot(None)
+    bot.calls = calls
+    return bot
+
+
+def test_same_queries_are_coalesced(bot):
+    async def run():
+        return await asyncio.gather(*(
+            bot._dig_message(Domain('example.com'), record)
+            for record in ('A', 'a', 'A', 'MX')))
+
+    assert asyncio.run(run()) == [
+        'example.com A', 'example.com A', 'example.com A', 'example.com MX']
+    assert sorted(bot.calls) == ['A', 'MX']
+    assert bot.single_flight.coalesced == 2
+
+
+def _skipped_edits():
+    return sum(value for _, _, value in BOT_EDITS_SKIPPED.samples())
+
+
+def test_unchanged_edit_is_skipped(bot):
+    skipped = _skipped_edits()
+    query = FakeQuery('old text')
+    update = SimpleNamespace(callback_query=query)
+    asyncio.run(bot.dig_buttons(update, None))
+    assert query.edits == ['example.com A']
+    asyncio.run(bot.dig_buttons(update, None))
+    assert query.edits == ['example.com A']
+    assert _skipped_edits() == skipped + 1
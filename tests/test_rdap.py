@@ -0,0 +1,46 @@
+import pytest
+
+from rdap import epp_status, parse_domain
+from standins import rdap_answer, whois_answer
+from whois_client import parse_response
+
+
+@pytest.mark.parametrize('status, epp', [
+    ('active', 'ok'),
+    ('client transfer prohibited', 'clientTransferProhibited'),
+    ('server hold', 'serverHold'),
+])
+def test_epp_status(status, epp):
+    assert epp_status(status) == epp
+
+
+def test_rdap_domain():
+    record = parse_domain('example.com', 'com', rdap_answer('example.com'))
+    whois = parse_response('example.com', 'com',
+                           whois_answer('example.com').decode())
+    # RDAP and WHOIS of the same domain give the same record.
+    for field in ('name', 'registrar', 'creation_date', 'last_updated',
+                  'statuses', 'name_servers', 'dnssec'):
+        assert record[field] == whois[field], field
+
+
+def test_rdap_nested_entities():
+    record = parse_domain('example.org', 'org', {
+        'entities': [{
+            'roles': ['registrar'],
+            'entities': [{
+                'roles': ['registrant', 'abuse'],
+                'vcardArray': ['vcard', [
+                    ['fn', {}, 'text', 'Owner'],
+                    ['adr', {'cc': 'UA'}, 'text', ['', '', '', '', '', '',
+                                                   '']],
+                    ['email', {}, 'text', 'owner@example.org'],
+                ]],
+            }],
+        }],
+    })
+    assert record['name'] == 'example.org'
+    assert (record['registrant'], record['registrant_country']) == (
+        'Owner', 'UA')
+    assert record['emails'] == ['owner@example.org']
+    assert record['registrar'] is None
@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from exceptions import DNSTimeout
+from resolver import resolver
+from wd import Domain
+from wd_api.main import app
+
+SERVERS = ('192.0.2.53',)
+SERIAL = 2024010101
+
+
+def _authority(domain='www.example.com'):
+    return asyncio.run(Domain(domain).authority(SERVERS, force=True))
+
+
+def test_soa_serial():
+    assert Domain._soa_serial([
+        'ns1.example.net. host.example.net. 5 7200 3600 1209600 300']) == 5
+    assert Domain._soa_serial(['192.0.2.1', 'bad soa']) is None
+
+
+def test_authority(standin_dns):
+    authority = _authority()
+    assert authority['zone'] == 'www.example.com'
+    assert authority['consistent'] and authority['serials'] == [SERIAL]
+    assert sorted((server['name'], server['address'])
+                  for server in authority['name_servers']) == [
+        ('ns1.example.net', '192.0.2.1'), ('ns1.example.net', '192.0.2.2'),
+        ('ns2.example.net', '192.0.2.1'), ('ns2.example.net', '192.0.2.2')]
+
+
+def test_authority_nameserver_timeout(standin_dns, monkeypatch):
+    exchange = resolver.exchange
+
+    async def exchange_or_timeout(name, record, server, *args, **kwargs):
+        if server == '192.0.2.2':
+            raise DNSTimeout(f'{server} timed out')
+        return await exchange(name, record, server, *args, **kwargs)
+
+    monkeypatch.setattr(resolver, 'exchange', exchange_or_timeout)
+    authority = _authority()
+    assert not authority['consistent']
+    assert authority['serials'] == [SERIAL]
+    assert {server['status'] for server in authority['name_servers']
+            if server['address'] == '192.0.2.2'} == {'TIMEOUT'}
+
+
+def test_authority_without_zone(standin_dns, monkeypatch):
+    async def no_answers(self, record, dns, force):
+        return []
+
+    monkeypatch.setattr(Domain, '_first_answers', no_answers)
+    assert _authority() == {'zone': None, 'result': False,
+                            'name_servers': [], 'serials': [],
+                            'consistent': False}
+
+
+@pytest.fixture
+def whois(monkeypatch):
+    async def report_whois(self, force=False, source=None):
+        return {'result': True, 'domain': self.domain}
+
+    monkeypatch.setattr(Domain, '_report_whois', report_whois)
+
+
+def test_report(standin_dns, whois):
+    async def run():
+        return [part async for part in Domain('example.com').report(
+            ['A', 'MX'], SERVERS, force=True)]
+
+    parts = dict(asyncio.run(run()))
+    assert set(parts) == {'whois', 'dig', 'authority'}
+    assert parts['dig']['records'] == ['A', 'MX']
+    assert parts['authority']['consistent']
+
+
+def test_report_api(standin_dns, whois):
+    client = TestClient(app)
+    request = {'domain': 'example.com', 'record': 'A', 'dns': SERVERS[0]}
+    report = client.post('/api/v1/report', json=request).json()
+    assert report['domain'] == 'example.com' and report['result']
+    assert report['dig']['record'] == 'A'
+    assert report['whois']['result'] and report['authority']['consistent']
+
+    response = client.post('/api/v1/report', json={**request, 'stream': True})
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line['part'] for line in lines) == [
+        'authority', 'dig', 'whois']
+    assert all(line['domain'] == 'example.com' for line in lines)
@@ -0,0 +1,157 @@
+import asyncio
+import struct
+
+import pytest
+
+from exceptions import DNSQueryError
+from resolver import (EDNS_FLAG_DO, FLAG_CD, FLAG_RD, FLAG_TC, HEADER,
+                      QUESTION_FIXED, RCODE_VALUES, RECORD_TYPES, RR_FIXED,
+                      Resolver, _query_question, _response_question,
+                      build_query, encode_name, parse_response, read_name)
+from standins import dns_answer
+
+
+def test_encode_name():
+    assert encode_name('www.Example.com.') == b'\x03www\x07Example\x03com\x00'
+    assert encode_name('.') == b'\x00'
+    with pytest.raises(DNSQueryError):
+        encode_name('a' * 64 + '.com')
+
+
+@pytest.mark.parametrize('dnssec', [False, True])
+def test_build_query(dnssec):
+    query = build_query(0x1234, 'example.com', 'MX', dnssec)
+    query_id, flags, qdcount, ancount, nscount, arcount = (
+        HEADER.unpack_from(query))
+    assert (query_id, qdcount, ancount, nscount, arcount) == (
+        0x1234, 1, 0, 0, 1)
+    assert flags == (FLAG_RD | FLAG_CD if dnssec else FLAG_RD)
+    name, offset = read_name(query, HEADER.size)
+    assert name == 'example.com.'
+    assert QUESTION_FIXED.unpack_from(query, offset) == (
+        RECORD_TYPES['MX'], 1)
+    offset += QUESTION_FIXED.size
+    # OPT record of the root name.
+    assert query[offset] == 0
+    rtype, _, ttl, length = RR_FIXED.unpack_from(query, offset + 1)
+    assert rtype == RECORD_TYPES['OPT'] and length == 0
+    assert bool(ttl & EDNS_FLAG_DO) == dnssec
+
+
+def test_parse_answers():
+    response = parse_response(dns_answer(
+        build_query(7, 'example.com', 'A'), tcp=True))
+    assert (response.id, response.status, response.truncated) == (
+        7, 'NOERROR', False)
+    assert [repr(answer) for answer in response.answers] == [
+        'example.com.\t300\tIN\tA\t192.0.2.1',
+        'example.com.\t300\tIN\tA\t192.0.2.2',
+    ]
+
+
+@pytest.mark.parametrize('record, rdata', [
+    ('TXT', '"v=spf1 include:_spf.example.net " "~all"'),
+    ('MX', '10 mx1.example.net.'),
+    ('CAA', '0 issue "letsencrypt.org"'),
+    ('AAAA', '2001:db8::1'),
+])
+def test_parse_rdata(record, rdata):
+    response = parse_response(dns_answer(
+        build_query(1, 'example.com', record), tcp=True))
+    assert response.answers[0].rtype == record
+    assert response.answers[0].rdata == rdata
+
+
+def test_parse_negative_answer():
+    response = parse_response(dns_answer(
+        build_query(1, 'nx.example.com', 'A'), tcp=True))
+    assert response.rcode == RCODE_VALUES['NXDOMAIN']
+    assert response.answers == []
+    # Minimum of the SOA TTL (900) and its MINIMUM field (300).
+    assert response.negative_ttl() == 300
+
+
+def test_parse_truncated_flag():
+    query = build_query(1, 'example.com', 'A')
+    response = dns_answer(query, tcp=True)
+    flags = struct.unpack_from('!H', response, 2)[0] | FLAG_TC
+    response = response[:2] + struct.pack('!H', flags) + response[4:]
+    assert parse_response(response).truncated
+
+
+@pytest.mark.parametrize('cut', [5, HEADER.size + 3, -3])
+def test_parse_malformed(cut):
+    response = dns_answer(build_query(1, 'example.com', 'A'), tcp=True)
+    with pytest.raises(DNSQueryError):
+        parse_response(response[:cut])
+
+
+def test_compression_loop():
+    # The name is the pointer to itself.
+    response = HEADER.pack(1, 0x8180, 1, 0, 0, 0) + b'\xc0\x0c' + (
+        QUESTION_FIXED.pack(1, 1))
+    with pytest.raises(DNSQueryError):
+        parse_response(response)
+
+
+def test_question_match():
+    response = dns_answer(build_query(1, 'Example.COM.', 'A'), tcp=True)
+    assert _response_question(response) == _query_question(
+        'Example.COM.', 'A')
+    assert _response_question(response) != _query_question(
+        'example.com', 'AAAA')
+    assert _response_question(b'\x00' * 5) is None
+
+
+def test_upstreams_are_bounded():
+    async def run():
+        resolver = Resolver(max_upstreams=2)
+        first = resolver._get_upstream('127.0.0.1', 5301)
+        first_transport = await first._get_transport()
+        resolver._get_upstream('127.0.0.1', 5302)
+        assert resolver._get_upstream('127.0.0.1', 5301) is first
+        # The least recently used upstream is the second one now.
+        resolver._get_upstream('127.0.0.1', 5303)
+        assert list(resolver._upstreams) == [
+            ('127.0.0.1', 5301), ('127.0.0.1', 5303)]
+        assert not first_transport.is_closing()
+        resolver._get_upstream('127.0.0.1', 5304)
+        assert first_transport.is_closing()
+        resolver.close()
+
+    asyncio.run(run())
+
+
+def test_retired_upstream_waits_for_pending_queries():
+    async def run():
+        # DNS-server which never answers.
+        server, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            asyncio.DatagramProtocol, local_addr=('127.0.0.1', 0))
+        port = server.get_extra_info('sockname')[1]
+        upstream = Resolver()._get_upstream('127.0.0.1', port)
+        query = asyncio.ensure_future(
+            upstream.exchange('example.com', 'A', 0.01))
+        while not upstream._pending:
+            await asyncio.sleep(0)
+        transport = upstream._transport
+        upstream.retire()
+        assert not transport.is_closing()
+        query.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await query
+        assert transport.is_closing()
+        server.close()
+
+    asyncio.run(run())
+
+
+def test_upstream_of_closed_loop_is_replaced():
+    resolver = Resolver()
+
+    async def get():
+        return resolver._get_upstream('127.0.0.1', 5301)
+
+    first = asyncio.run(get())
+    second = asyncio.run(get())
+    assert first is not second and first._retired
+    assert list(resolver._upstreams.values()) == [second]
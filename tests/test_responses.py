@@ -0,0 +1,38 @@
+import msgpack
+import orjson
+from fastapi.testclient import TestClient
+
+from wd_api.main import app
+from wd_api.responses import MSGPACK_MEDIA_TYPE
+
+SETTINGS = '/api/v1/dig/settings'
+
+
+def test_json_by_default():
+    response = TestClient(app).get(SETTINGS)
+    assert response.headers['content-type'] == 'application/json'
+    assert response.headers['vary'] == 'Accept'
+    assert orjson.loads(response.content)['allowed_records']
+
+
+def test_msgpack():
+    client = TestClient(app)
+    response = client.get(SETTINGS, headers={
+        'Accept': f'{MSGPACK_MEDIA_TYPE}, application/json;q=0.5'})
+    assert response.headers['content-type'] == MSGPACK_MEDIA_TYPE
+    assert response.headers['vary'] == 'Accept'
+    assert msgpack.unpackb(response.content) == client.get(SETTINGS).json()
+
+
+def test_msgpack_error_response():
+    response = TestClient(app).post('/api/v1/dig', json={
+        'domain': 'no domain'}, headers={'Accept': MSGPACK_MEDIA_TYPE})
+    assert msgpack.unpackb(response.content) == {
+        'message': 'Bad domain', 'result': False}
+
+
+def test_negotiation_doesnt_leak():
+    client = TestClient(app)
+    client.get(SETTINGS, headers={'Accept': MSGPACK_MEDIA_TYPE})
+    response = client.get(SETTINGS)
+    assert response.headers['content-type'] == 'application/json'
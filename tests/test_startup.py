@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+from bench_startup import ENTRY_POINTS, import_times
+
+# Max import time (ms) of the entry points, the same as in bench_startup.
+BUDGET: float = 300
+REPEAT: int = 3
+
+
+@pytest.mark.parametrize('module, lazy_modules', ENTRY_POINTS.items())
+def test_lazy_imports(module, lazy_modules):
+    imported = {name for name, _, _ in import_times(module)}
+    assert not [name for name in lazy_modules if name in imported]
+
+
+# Wall-clock time depends on the machine and its load, so the budget is
+# checked only on demand.
+@pytest.mark.skipif(not os.getenv('STARTUP_BUDGET_TEST'),
+                    reason='set STARTUP_BUDGET_TEST to check the budget')
+@pytest.mark.parametrize('module', ENTRY_POINTS)
+def test_import_budget(module):
+    best = min(import_times(module)[-1][2] for _ in range(REPEAT))
+    assert best / 1000 <= BUDGET
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import batch
+import tracing
+from wd_api.main import app
+
+
+class ListExporter:
+    """Keeps the finished requests instead of exporting them."""
+
+    def __init__(self):
+        self.traces = []
+
+    def put(self, trace):
+        self.traces.append(trace)
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    exporter = ListExporter()
+    monkeypatch.setattr(tracing, 'RECORDING', True)
+    monkeypatch.setattr(tracing, 'TRACING_SAMPLE_RATE', 1)
+    monkeypatch.setattr(tracing, 'exporter', exporter)
+    return exporter.traces
+
+
+def test_streamed_request_ends_with_body(exported, monkeypatch):
+    async def check_domain(domain, records, dns, whois, force):
+        with tracing.span('check', domain=str(domain)):
+            return {'domain': str(domain), 'result': True}
+
+    monkeypatch.setattr(batch, 'check_domain', check_domain)
+    response = TestClient(app).post('/api/v1/batch', json={
+        'domains': ['example.com', 'example.org']})
+    assert len(response.text.splitlines()) == 2
+    trace, = exported
+    assert trace.request_id == response.headers['x-request-id']
+    assert trace.root.attributes['status_code'] == 200
+    # Spans of the streamed body are the children of the request.
+    assert sorted(span.attributes['domain'] for span in trace.spans) == [
+        'example.com', 'example.org']
+    assert {span.parent_id for span in trace.spans} == {trace.root.span_id}
+    assert max(span.end for span in trace.spans) <= trace.root.end
+
+
+def test_span_nesting(exported):
+    async def child():
+        with tracing.span('task'):
+            await asyncio.sleep(0)
+
+    async def run():
+        with tracing.request('request', route='/test') as root:
+            with tracing.span('stage', step=1) as stage:
+                stage.set(step=2)
+                # Tasks take the current span with their context.
+                await asyncio.gather(child(), child())
+            assert tracing.request_id() == root.trace.request_id
+            left = asyncio.ensure_future(child())
+        await left
+        return root
+
+    root = asyncio.run(run())
+    trace, = exported
+    spans = {span.name: span for span in trace.spans}
+    assert [span.name for span in trace.spans] == ['task', 'task', 'stage']
+    assert spans['stage'].parent_id == root.span_id
+    assert spans['stage'].attributes == {'step': 2}
+    assert {span.parent_id for span in trace.spans
+            if span.name == 'task'} == {spans['stage'].span_id}
+    # The span of the task left running after the request isn't recorded.
+    assert len(trace.spans) == 3
+
+
+def test_span_error(exported):
+    with pytest.raises(ValueError):
+        with tracing.request('request'):
+            with tracing.span('stage'):
+                raise ValueError('broken')
+    trace, = exported
+    assert trace.root.error == trace.spans[0].error == 'ValueError'
+
+
+def test_no_spans_outside_of_requests(exported):
+    assert tracing.span('stage') is tracing.NO_SPAN
+    assert tracing.request_id() is None
+
+
+@pytest.mark.parametrize('client_id, kept', [
+    ('0123456789abcdef0123456789abcdef', True),
+    ('not-an-id', False),
+    (None, False),
+])
+def test_request_id(client_id, kept):
+    with tracing.request('request', client_id) as root:
+        request_id = tracing.request_id()
+    assert request_id == root.trace.request_id
+    assert tracing.REQUEST_ID_PATTERN.fullmatch(request_id)
+    assert (request_id == client_id) == kept
+
+
+def test_nested_request_is_span(exported):
+    with tracing.request('outer') as outer:
+        with tracing.request('inner') as inner:
+            pass
+    assert inner.parent_id == outer.span_id
+    assert [trace.root.name for trace in exported] == ['outer']
+
+
+def _trace():
+    with tracing.request('request', route='/test') as root:
+        with tracing.span('stage', cached=True, time=1.5, server=None):
+            pass
+    return root.trace
+
+
+def test_json_exporter(monkeypatch, tmp_path):
+    monkeypatch.setattr(tracing, 'RECORDING', True)
+    path = tmp_path / 'traces' / 'traces.ndjson'
+    exporter = tracing.JsonExporter(str(path))
+    exporter.put(_trace())
+    exporter.close()
+    record, = [json.loads(line) for line in path.read_text().splitlines()]
+    assert record['name'] == 'request'
+    assert record['attributes'] == {'route': '/test'}
+    span, = record['spans']
+    assert span['name'] == 'stage' and span['parent_id'] is not None
+    assert record['dropped_spans'] == 0
+
+
+def test_otlp_exporter(monkeypatch):
+    monkeypatch.setattr(tracing, 'RECORDING', True)
+    trace = _trace()
+    posted = []
+
+    class Client:
+        def post(self, url, json):
+            posted.append((url, json))
+            return self
+
+        def raise_for_status(self):
+            pass
+
+    exporter = tracing.OtlpExporter('http://collector.test/v1/traces')
+    exporter.client = Client()
+    exporter.export([trace])
+    (url, body), = posted
+    assert url == 'http://collector.test/v1/traces'
+    root, stage = body['resourceSpans'][0]['scopeSpans'][0]['spans']
+    assert root['traceId'] == stage['traceId'] == trace.request_id
+    assert root['kind'] == tracing.OtlpExporter.KIND_SERVER
+    assert 'parentSpanId' not in root
+    assert stage['parentSpanId'] == root['spanId']
+    assert stage['attributes'] == [
+        {'key': 'cached', 'value': {'boolValue': True}},
+        {'key': 'time', 'value': {'doubleValue': 1.5}}]
+    assert int(stage['endTimeUnixNano']) >= int(stage['startTimeUnixNano'])
+
+
+def test_slow_request_is_logged(exported, monkeypatch, caplog):
+    monkeypatch.setattr(tracing, 'TRACING_SLOW_THRESHOLD', 0.0001)
+    monkeypatch.setattr(tracing, 'TRACING_SLOW_SAMPLE_RATE', 1)
+    with tracing.request('slow'):
+        with tracing.span('stage'):
+            time.sleep(0.001)
+    assert 'slow' in caplog.text and 'stage' in caplog.text
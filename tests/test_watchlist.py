@@ -0,0 +1,205 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+
+import messages
+import watchlist
+from callback_client import create_client
+from constants import (WATCHLIST_INTERVALS, WATCHLIST_NOTIFY_DAYS,
+                       WATCHLIST_UNKNOWN_INTERVAL)
+from exceptions import BadCallbackUrl
+from wd_api.main import app
+
+NOW = 1_700_000_000
+DAY = 86400
+# Public address, the check doesn't resolve it.
+CALLBACK_URL = 'https://93.184.216.34/hook'
+
+
+@pytest.mark.parametrize('days, interval', [
+    (None, WATCHLIST_UNKNOWN_INTERVAL),
+    (365, WATCHLIST_INTERVALS[0][1]),
+    (60, WATCHLIST_INTERVALS[1][1]),
+    (10, WATCHLIST_INTERVALS[2][1]),
+    (3, WATCHLIST_INTERVALS[3][1]),
+    (-5, WATCHLIST_INTERVALS[-1][1]),
+])
+def test_check_interval(days, interval):
+    expiration_date = None if days is None else NOW + days * DAY
+    assert watchlist.check_interval(expiration_date, NOW) == interval
+
+
+def _whois(days=100, statuses=('ok',), name_servers=('ns1.example.com',)):
+    return {'result': True, 'expiration_date': NOW + days * DAY,
+            'statuses': list(statuses), 'name_servers': list(name_servers)}
+
+
+def _state(whois, notified_days=None):
+    _, state = watchlist.compare('example.com', {}, whois, NOW)
+    return {**state, 'checked_at': NOW, 'notified_days': notified_days}
+
+
+def _kinds(events):
+    return [kind for kind, _ in events]
+
+
+def test_first_check_has_no_change_events():
+    events, state = watchlist.compare('example.com', {}, _whois(), NOW)
+    assert events == []
+    assert state['registered'] and state['statuses'] == ['ok']
+
+
+def test_changes():
+    state = _state(_whois())
+    events, _ = watchlist.compare('example.com', state, _whois(
+        days=465, statuses=('ok', 'transferProhibited'),
+        name_servers=('ns2.example.com',)), NOW)
+    assert _kinds(events) == ['expiration', 'statuses', 'name_servers']
+    events, new_state = watchlist.compare(
+        'example.com', state, {'result': False}, NOW)
+    assert _kinds(events) == ['registration']
+    assert events[0][1] == messages.WATCH_NOT_REGISTERED.format(
+        'example.com')
+    assert not new_state['registered']
+
+
+def test_expiration_is_notified_once_per_threshold():
+    first = max(WATCHLIST_NOTIFY_DAYS)
+    state = _state(_whois(days=first - 1))
+    events, state = watchlist.compare(
+        'example.com', state, _whois(days=first - 1), NOW)
+    assert _kinds(events) == ['expires']
+    assert state['notified_days'] == first
+    state['checked_at'] = NOW
+    events, _ = watchlist.compare(
+        'example.com', state, _whois(days=first - 1), NOW)
+    assert events == []
+
+
+def test_expired():
+    state = _state(_whois(days=-1))
+    events, state = watchlist.compare(
+        'example.com', state, _whois(days=-1), NOW)
+    assert _kinds(events) == ['expired']
+    assert state['notified_days'] == 0
+
+
+@pytest.mark.parametrize('url', [
+    'http://127.0.0.1/hook',
+    'http://localhost:8080/hook',
+    'http://[::1]/hook',
+    'http://169.254.169.254/latest/meta-data',
+    'http://[fe80::1]/hook',
+    'http://10.0.0.1/hook',
+    'http://192.168.1.1/hook',
+    'http://172.16.0.1/hook',
+    'ftp://93.184.216.34/hook',
+])
+def test_internal_callback_url_is_refused(url):
+    with pytest.raises(BadCallbackUrl):
+        watchlist.check_callback_url(url)
+
+
+def test_public_callback_url():
+    watchlist.check_callback_url(CALLBACK_URL)
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    """Watchlist of the API in the temporary database."""
+    monkeypatch.setattr(watchlist.watchlist, 'path',
+                        str(tmp_path / 'watchlist.sqlite3'))
+    monkeypatch.setattr(watchlist.watchlist, '_db', None)
+    return watchlist.watchlist
+
+
+def test_token(db):
+    token = db.create_token(CALLBACK_URL)
+    assert token and db.create_token(CALLBACK_URL) is None
+    assert db.check_token(CALLBACK_URL, token)
+    assert not db.check_token(CALLBACK_URL, token + 'x')
+    assert not db.check_token(CALLBACK_URL, None)
+    assert not db.check_token('https://93.184.216.35/hook', token)
+
+
+def test_api_token(db):
+    client = TestClient(app)
+    watch = {'domain': 'example.com', 'callback_url': CALLBACK_URL}
+    response = client.post('/api/v1/watchlist', json=watch)
+    assert response.status_code == 200
+    token = response.json()['token']
+
+    # The next requests of the callback URL need its token.
+    for headers in ({}, {'X-Watch-Token': 'wrong'}):
+        assert client.post('/api/v1/watchlist', json={
+            **watch, 'domain': 'example.org'}, headers=headers
+        ).status_code == 403
+        assert client.get('/api/v1/watchlist', params={
+            'callback_url': CALLBACK_URL}, headers=headers
+        ).status_code == 403
+        response = client.request('DELETE', '/api/v1/watchlist', json=watch,
+                                  headers=headers)
+        assert response.status_code == 403
+        assert response.json()['message'] == messages.WATCH_FORBIDDEN
+
+    headers = {'X-Watch-Token': token}
+    response = client.get('/api/v1/watchlist', headers=headers,
+                          params={'callback_url': CALLBACK_URL})
+    assert [state['domain'] for state in response.json()] == ['example.com']
+    response = client.request('DELETE', '/api/v1/watchlist', json=watch,
+                              headers=headers)
+    assert response.json()['result']
+
+
+@pytest.fixture
+def callback_server():
+    """HTTP server on the loopback which records the Host headers."""
+    hosts = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            hosts.append(self.headers['Host'])
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1], hosts
+    server.shutdown()
+    server.server_close()
+
+
+def test_callback_connects_to_checked_address(callback_server):
+    port, hosts = callback_server
+    resolved = []
+
+    async def resolve(host, port):
+        resolved.append(host)
+        return ['127.0.0.1']
+
+    async def post():
+        async with create_client(resolve, 5) as client:
+            return await client.post(f'http://callback.test:{port}/hook')
+
+    assert asyncio.run(post()).status_code == 200
+    assert resolved == ['callback.test']
+    assert hosts == [f'callback.test:{port}']
+
+
+def test_callback_to_internal_address_is_not_sent(callback_server):
+    port, hosts = callback_server
+
+    async def post():
+        async with create_client(watchlist.callback_addresses, 5) as client:
+            await client.post(f'http://localhost:{port}/hook')
+
+    with pytest.raises(BadCallbackUrl):
+        asyncio.run(post())
+    assert hosts == []
@@ -0,0 +1,104 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import wd_telegram_bot
+from watchlist import watchlist
+from wd_api import webhook
+from wd_telegram_bot import WDTelegramBot, build_application
+
+PATH = webhook.BOT_WEBHOOK_PATH
+
+
+class FakeBot:
+    """Bot which is started and stopped with the webhook application."""
+
+    def __init__(self):
+        self.events = []
+        self.updates = []
+
+    async def start_webhook(self):
+        self.events.append('start')
+
+    async def stop_webhook(self):
+        self.events.append('stop')
+
+    async def put_update(self, data):
+        self.updates.append(data)
+
+
+def test_webhook_app(monkeypatch):
+    monkeypatch.setattr(webhook, 'BOT_WEBHOOK_SECRET', 'secret')
+    bot = FakeBot()
+    with TestClient(webhook.create_webhook_app(bot)) as client:
+        assert bot.events == ['start']
+        for headers in ({}, {'X-Telegram-Bot-Api-Secret-Token': 'wrong'}):
+            response = client.post(PATH, json={'update_id': 1},
+                                   headers=headers)
+            assert response.status_code == 403
+        response = client.post(
+            PATH, json={'update_id': 2},
+            headers={'X-Telegram-Bot-Api-Secret-Token': 'secret'})
+        assert response.status_code == 200
+    assert bot.events == ['start', 'stop']
+    assert bot.updates == [{'update_id': 2}]
+
+
+class FakeApplication:
+    """Telegram application which records the calls."""
+
+    def __init__(self):
+        self.calls = []
+        self.bot = self
+
+    def add_error_handler(self, handler):
+        pass
+
+    def add_handlers(self, handlers):
+        self.calls.append('handlers')
+
+    async def initialize(self):
+        self.calls.append('initialize')
+
+    async def start(self):
+        self.calls.append('start')
+
+    async def stop(self):
+        self.calls.append('stop')
+
+    async def shutdown(self):
+        self.calls.append('shutdown')
+
+    async def set_webhook(self, url, secret_token=None, allowed_updates=None):
+        self.calls.append(('set_webhook', url, secret_token))
+
+
+@pytest.fixture
+def application(monkeypatch):
+    async def stop():
+        pass
+
+    monkeypatch.setattr(watchlist, 'start', lambda: None)
+    monkeypatch.setattr(watchlist, 'stop', stop)
+    monkeypatch.setattr(wd_telegram_bot, 'METRICS_PORT', 0)
+    monkeypatch.setattr(wd_telegram_bot, 'BOT_WEBHOOK_URL',
+                        'https://bot.example.com' + PATH)
+    monkeypatch.setattr(wd_telegram_bot, 'BOT_WEBHOOK_SECRET', 'secret')
+    return FakeApplication()
+
+
+def test_bot_sets_webhook(application):
+    bot = WDTelegramBot(application)
+    with TestClient(webhook.create_webhook_app(bot)):
+        pass
+    assert application.calls == [
+        'handlers', 'initialize', 'start',
+        ('set_webhook', 'https://bot.example.com' + PATH, 'secret'),
+        'stop', 'shutdown']
+
+
+def test_concurrent_updates(monkeypatch):
+    monkeypatch.setattr(wd_telegram_bot, 'TOKEN', '123:token')
+    monkeypatch.setattr(wd_telegram_bot, 'BOT_CONCURRENT_UPDATES', 16)
+    assert build_application().concurrent_updates == 16
+    monkeypatch.setattr(wd_telegram_bot, 'BOT_CONCURRENT_UPDATES', 0)
+    assert not build_application().concurrent_updates
@@ -0,0 +1,60 @@
+import datetime
+
+import pytest
+
+from standins import whois_answer
+from whois_client import merge_records, parse_date, parse_response
+
+
+@pytest.mark.parametrize('value, date', [
+    ('2000-01-01T00:00:00Z', datetime.datetime(2000, 1, 1)),
+    ('2023-01-01T03:00:00+03:00', datetime.datetime(2023, 1, 1)),
+    # Fractions of seconds are dropped.
+    ('2001-02-03T04:05:06.789Z', datetime.datetime(2001, 2, 3, 4, 5, 6)),
+    ('2020-05-06 UTC', datetime.datetime(2020, 5, 6)),
+    ('06.05.2020', datetime.datetime(2020, 5, 6)),
+    ('06-May-2020', datetime.datetime(2020, 5, 6)),
+    ('unknown', None),
+])
+def test_parse_date(value, date):
+    assert parse_date(value) == date
+
+
+def test_whois_response():
+    record = parse_response('example.com', 'com',
+                            whois_answer('example.com').decode())
+    assert record['registrar'] == 'Example Registrar, Inc.'
+    assert record['creation_date'] == datetime.datetime(2000, 1, 1)
+    assert record['last_updated'] == datetime.datetime(2023, 1, 1)
+    assert record['expiration_date'] > datetime.datetime.utcnow()
+    assert record['statuses'] == ['clientTransferProhibited']
+    assert record['name_servers'] == ['ns1.example.net', 'ns2.example.net']
+    assert record['dnssec'] is False
+
+
+def test_whois_not_found():
+    assert parse_response('nxexample.com', 'com',
+                          whois_answer('nxexample.com').decode()) is None
+
+
+def test_name_servers_on_next_lines():
+    record = parse_response('example.ua', 'ua', (
+        'domain:  example.ua\n'
+        'Name servers:\n'
+        '    ns1.example.net 192.0.2.1\n'
+        '    ns2.example.net.\n'
+        '\n'
+        'registrar: Example\n'))
+    assert record['name_servers'] == ['ns1.example.net', 'ns2.example.net']
+    assert record['registrar'] == 'Example'
+
+
+def test_merge_records():
+    registry = {'registrar': 'Registry', 'registrant': None,
+                'emails': ['b@example.com']}
+    registrar = {'registrar': 'Registrar', 'registrant': 'Owner',
+                 'emails': ['a@example.com', 'b@example.com']}
+    assert merge_records(registry, registrar) == {
+        'registrar': 'Registry', 'registrant': 'Owner',
+        'emails': ['a@example.com', 'b@example.com']}
+    assert merge_records(registry, None) is registry